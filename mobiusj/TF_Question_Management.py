@@ -1,16 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import feature4
+import db
+import catalog
 
 DB_FILENAME = feature4.DB_FILENAME
 
 def get_db():
-    settings_file = feature4.config.load_settings_path()
-    with open(settings_file, "r", encoding="utf-8") as f:
-        settings = feature4.json.load(f)
-    db_path = feature4.get_db_path(settings.get("data_path", ""))
-    return sqlite3.connect(db_path)
+    # 共享连接，由 db 模块管理，不要手动 close
+    conn = db.get_conn()
+    if conn is None:
+        raise RuntimeError("数据库不可用")
+    return conn
 
 def TF_question_management():
     win = tk.Toplevel()
@@ -31,28 +32,16 @@ def TF_question_management():
     var_module_name = tk.StringVar()
     var_tag_name = tk.StringVar()
 
-    # 级联下拉框数据
+    # 级联下拉框数据（取自共享目录缓存）
     def get_module_types():
-        with get_db() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT DISTINCT module_type FROM modules")
-            return [row[0] for row in cur.fetchall()]
+        return list(dict.fromkeys(m['module_type'] for m in catalog.modules()))
     def get_module_names(module_type=None):
-        with get_db() as conn:
-            cur = conn.cursor()
-            if module_type:
-                cur.execute("SELECT module_name FROM modules WHERE module_type=?", (module_type,))
-            else:
-                cur.execute("SELECT module_name FROM modules")
-            return [row[0] for row in cur.fetchall()]
+        return [m['module_name'] for m in catalog.modules() if not module_type or m['module_type'] == module_type]
     def get_tag_names(module_name=None):
-        with get_db() as conn:
-            cur = conn.cursor()
-            if module_name:
-                cur.execute("SELECT tag_name FROM tags WHERE module_id=(SELECT module_id FROM modules WHERE module_name=?)", (module_name,))
-            else:
-                cur.execute("SELECT tag_name FROM tags")
-            return [row[0] for row in cur.fetchall()]
+        if module_name:
+            module_id = next((m['module_id'] for m in catalog.modules() if m['module_name'] == module_name), None)
+            return [t['tag_name'] for t in catalog.tags() if t['module_id'] == module_id]
+        return [t['tag_name'] for t in catalog.tags()]
 
     # 级联逻辑
     def on_module_type_change(*_):
@@ -85,6 +74,16 @@ def TF_question_management():
     tag_name_cb.grid(row=0, column=5, padx=5)
     tag_name_cb['values'] = get_tag_names()
 
+    # 其他窗口修改了模块/标签时同步下拉框，保留当前选择
+    def on_catalog_changed(changes):
+        if catalog.MODULES not in changes and catalog.TAGS not in changes:
+            return
+        module_type_cb['values'] = get_module_types()
+        module_name_cb['values'] = get_module_names(var_module_type.get() or None)
+        tag_name_cb['values'] = get_tag_names(var_module_name.get())
+
+    catalog.subscribe_widget(win, on_catalog_changed)
+
     # 查询按钮
     def refresh_table():
         for row in tree.get_children():
@@ -244,7 +243,7 @@ def TF_question_management():
             if var_ans.get() not in ("1", "0"):
                 messagebox.showwarning("提示", "请选择答案")
                 return
-            with get_db() as conn:
+            with db.transaction(get_db()) as conn:
                 cur = conn.cursor()
                 cur.execute("SELECT tag_id FROM tags WHERE tag_name=?", (var_tag.get(),))
                 tag_row = cur.fetchone()
@@ -261,7 +260,6 @@ def TF_question_management():
                     "INSERT INTO TF_tag_relations (tag_id, TF_question_id) VALUES (?, ?)",
                     (tag_id, tf_id)
                 )
-                conn.commit()
             messagebox.showinfo("成功", "修改成功")
             dialog.destroy()
             refresh_table()
@@ -269,11 +267,10 @@ def TF_question_management():
         def on_delete():
             if not messagebox.askyesno("确认", "确定要删除该判断题吗？"):
                 return
-            with get_db() as conn:
+            with db.transaction(get_db()) as conn:
                 cur = conn.cursor()
                 cur.execute("DELETE FROM TF_tag_relations WHERE TF_question_id=?", (tf_id,))
                 cur.execute("DELETE FROM TF_questions WHERE TF_question_id=?", (tf_id,))
-                conn.commit()
             messagebox.showinfo("成功", "已删除该判断题")
             dialog.destroy()
             refresh_table()
@@ -439,7 +436,7 @@ def TF_question_management():
             if not valid_rows:
                 messagebox.showwarning("提示", "请至少填写一行完整数据（模块类型、模块、标签、题干、答案）")
                 return
-            with get_db() as conn:
+            with db.transaction(get_db()) as conn:
                 cur = conn.cursor()
                 # 获取当前最大TF_question_id
                 cur.execute("SELECT TF_question_id FROM TF_questions ORDER BY TF_question_id DESC LIMIT 1")
@@ -462,7 +459,6 @@ def TF_question_management():
                                 (tf_id, v['text'].get()[:100], int(v['ans'].get())))
                     # 插入TF_tag_relations
                     cur.execute("INSERT INTO TF_tag_relations (tag_id, TF_question_id) VALUES (?, ?)", (tag_id, tf_id))
-                conn.commit()
             messagebox.showinfo("成功", "批量添加成功！")
             text_input.delete("1.0", tk.END)
             clear_dynamic_rows()
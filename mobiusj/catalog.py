@@ -0,0 +1,242 @@
+# catalog.py
+# 共享目录缓存：模块、标签、题目-标签关系在进程内只加载一次，
+# 写库成功后由调用方增量更新，并把变化的类型和ID通知已打开的窗口，各窗口只刷新变化的部分
+import threading
+import tkinter as tk
+
+import db
+
+# 变更事件类型
+MODULES = "modules"
+TAGS = "tags"
+ITEMS = "items"
+
+_lock = threading.RLock()
+_loaded_generation = None
+_modules = {}   # module_id -> {"module_id", "module_name", "module_type"}
+_tags = {}      # tag_id -> {"tag_id", "module_id", "tag_name", "tag_intro", "item_count"}
+_items = {}     # item_id -> {"tags": [tag_id, ...], "tag_level": item_level}
+_listeners = []
+
+def ensure_loaded():
+    """首次使用或数据路径切换后加载一次，其余时候直接返回。"""
+    if _loaded_generation == db.generation():
+        return True
+    return reload()
+
+def reload():
+    """从数据库重新读取全部目录数据（用于“刷新”按钮或路径切换）。"""
+    global _modules, _tags, _items, _loaded_generation
+    conn = db.get_conn()
+    if conn is None:
+        return False
+    generation = db.generation()
+    cursor = conn.cursor()
+    cursor.execute("SELECT module_id, module_name, module_type FROM modules")
+    modules = {
+        row[0]: {"module_id": row[0], "module_name": row[1], "module_type": row[2]}
+        for row in cursor.fetchall()
+    }
+    cursor.execute("""
+        SELECT t.tag_id, t.module_id, t.tag_name, t.tag_intro, COALESCE(n.item_count, 0)
+        FROM tags t
+        LEFT JOIN tag_item_counts n ON t.tag_id = n.tag_id
+    """)
+    tags = {
+        row[0]: {"tag_id": row[0], "module_id": row[1], "tag_name": row[2], "tag_intro": row[3], "item_count": row[4]}
+        for row in cursor.fetchall()
+    }
+    cursor.execute("SELECT item_id, item_level FROM items")
+    items = {row[0]: {"tags": [], "tag_level": row[1]} for row in cursor.fetchall()}
+    cursor.execute("SELECT item_id, tag_id FROM item_tag_relations")
+    for item_id, tag_id in cursor.fetchall():
+        if item_id in items:
+            items[item_id]["tags"].append(tag_id)
+    with _lock:
+        _modules, _tags, _items = modules, tags, items
+        _loaded_generation = generation
+    _notify({MODULES: None, TAGS: None, ITEMS: None})
+    return True
+
+# ---------- 读取（均返回副本，调用方可随意修改） ----------
+
+def modules():
+    ensure_loaded()
+    with _lock:
+        return [dict(m) for m in _modules.values()]
+
+def get_module(module_id):
+    ensure_loaded()
+    with _lock:
+        m = _modules.get(module_id)
+        return dict(m) if m else None
+
+def tags():
+    ensure_loaded()
+    with _lock:
+        return [dict(t) for t in _tags.values()]
+
+def get_tag(tag_id):
+    ensure_loaded()
+    with _lock:
+        t = _tags.get(tag_id)
+        return dict(t) if t else None
+
+def items():
+    ensure_loaded()
+    with _lock:
+        return {item_id: {"tags": list(data["tags"]), "tag_level": data["tag_level"]} for item_id, data in _items.items()}
+
+def get_item(item_id):
+    ensure_loaded()
+    with _lock:
+        data = _items.get(item_id)
+        return {"tags": list(data["tags"]), "tag_level": data["tag_level"]} if data else None
+
+def apply_item_changes(target, changes):
+    """
+    把一次变更通知中的题目变化同步到调用方持有的 items() 副本 target（原地修改），
+    只复制变化的题目；重新加载时整体替换。返回变化的题目ID集合，None 表示全部。
+    """
+    item_ids = changes.get(ITEMS, set())
+    if item_ids is None:
+        target.clear()
+        target.update(items())
+        return None
+    for item_id in item_ids:
+        data = get_item(item_id)
+        if data is None:
+            target.pop(item_id, None)
+        else:
+            target[item_id] = data
+    return item_ids
+
+# ---------- 写库成功后的增量更新（需在主线程调用） ----------
+
+def put_module(module):
+    with _lock:
+        _modules[module["module_id"]] = {
+            "module_id": module["module_id"],
+            "module_name": module["module_name"],
+            "module_type": module["module_type"],
+        }
+    _notify({MODULES: {module["module_id"]}})
+
+def drop_module(module_id):
+    with _lock:
+        _modules.pop(module_id, None)
+    _notify({MODULES: {module_id}})
+
+def put_tag(tag):
+    with _lock:
+        old = _tags.get(tag["tag_id"])
+        _tags[tag["tag_id"]] = {
+            "tag_id": tag["tag_id"],
+            "module_id": tag["module_id"],
+            "tag_name": tag["tag_name"],
+            "tag_intro": tag["tag_intro"],
+            "item_count": old["item_count"] if old else 0,
+        }
+    _notify({TAGS: {tag["tag_id"]}})
+
+def drop_tag(tag_id):
+    with _lock:
+        _tags.pop(tag_id, None)
+    _notify({TAGS: {tag_id}})
+
+def _put_item(item_id, tag_level, tag_ids):
+    # 返回题量有变化的标签
+    with _lock:
+        old = _items.get(item_id)
+        old_tags = set(old["tags"]) if old else set()
+        new_tags = list(dict.fromkeys(tag_ids))
+        _adjust_counts(old_tags - set(new_tags), -1)
+        _adjust_counts(set(new_tags) - old_tags, 1)
+        _items[item_id] = {"tags": new_tags, "tag_level": tag_level}
+    return old_tags ^ set(new_tags)
+
+def _drop_item(item_id):
+    with _lock:
+        old = _items.pop(item_id, None)
+        if old:
+            _adjust_counts(set(old["tags"]), -1)
+    return set(old["tags"]) if old else set()
+
+def _item_changes(item_ids, tag_ids):
+    changes = {ITEMS: set(item_ids)}
+    if tag_ids:
+        changes[TAGS] = set(tag_ids)
+    return changes
+
+def put_item(item_id, tag_level, tag_ids):
+    """题目写入后同步难度与标签，并按差集调整标签题量（与数据库触发器保持一致）。"""
+    _notify(_item_changes([item_id], _put_item(item_id, tag_level, tag_ids)))
+
+def drop_item(item_id):
+    _notify(_item_changes([item_id], _drop_item(item_id)))
+
+def refresh_item(item_id):
+    """只重读一道题目（写库后不方便算出最终标签时使用）。"""
+    refresh_items([item_id])
+
+def refresh_items(item_ids):
+    """重读若干道题目，只发一次变更通知（导入队列合并刷新时使用）。"""
+    conn = db.get_conn(show_error=False)
+    if conn is None or not item_ids:
+        return
+    cursor = conn.cursor()
+    changed_tags = set()
+    for item_id in item_ids:
+        cursor.execute("SELECT item_level FROM items WHERE item_id=?", (item_id,))
+        row = cursor.fetchone()
+        if row is None:
+            changed_tags |= _drop_item(item_id)
+            continue
+        cursor.execute("SELECT tag_id FROM item_tag_relations WHERE item_id=?", (item_id,))
+        changed_tags |= _put_item(item_id, row[0], [r[0] for r in cursor.fetchall()])
+    _notify(_item_changes(item_ids, changed_tags))
+
+def _adjust_counts(tag_ids, delta):
+    for tag_id in tag_ids:
+        tag = _tags.get(tag_id)
+        if tag:
+            tag["item_count"] += delta
+
+# ---------- 变更通知 ----------
+
+def subscribe(callback):
+    """
+    订阅目录变更，callback(changes) 中 changes 为 {类型: 变化的ID集合}，
+    只包含本次变化的类型；ID集合为 None 表示整体重新加载。窗口据此只更新变化的部分。
+    返回取消订阅的函数。
+    """
+    with _lock:
+        _listeners.append(callback)
+    def unsubscribe():
+        with _lock:
+            if callback in _listeners:
+                _listeners.remove(callback)
+    return unsubscribe
+
+def subscribe_widget(widget, callback):
+    """订阅并在窗口销毁时自动取消。"""
+    unsubscribe = subscribe(callback)
+    def on_destroy(event):
+        if event.widget is widget:
+            unsubscribe()
+    widget.bind("<Destroy>", on_destroy, add="+")
+    return unsubscribe
+
+def _notify(changes):
+    with _lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        try:
+            callback(changes)
+        except tk.TclError:
+            # 窗口已关闭但未收到 Destroy 事件
+            with _lock:
+                if callback in _listeners:
+                    _listeners.remove(callback)
+        except Exception as e:
+            print(f"[目录] 刷新订阅窗口时出错: {e}")
@@ -2,7 +2,10 @@
 import os
 import sys
 import json
+import copy
 import secrets
+import tempfile
+import threading
 
 # 获取程序所在目录（开发环境或打包后都适用）
 if getattr(sys, 'frozen', False):
@@ -14,31 +17,125 @@ else:
 
 SETTINGS_FILE = os.path.join(APP_DIR, "settings.json")
 
+# 数据库性能模式：打开连接时按顺序执行的 PRAGMA
+# local   —— 数据放在本机磁盘：WAL 日志，读写互不阻塞，提交时不必每次完整 fsync
+# network —— 数据放在网盘/同步文件夹：WAL 依赖共享内存，在这类目录上不可靠，退回回滚日志与完整同步
+# 默认用 network：数据常放在共享目录，本地模式在 SMB 等网络路径上可能损坏数据库，需在设置中确认后再切换
+DB_PROFILES = {
+    "local": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,      # 负数表示 KiB，约 16MB 页缓存
+        "mmap_size": 268435456,    # 256MB
+        "temp_store": "MEMORY",
+    },
+    "network": {
+        "busy_timeout": 15000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_DB_PROFILE = "network"
+
+# 题目图片的存储编码（保存时在后台线程执行）
+# png           —— 原样保存 PNG
+# png_optimized —— 无损 PNG，去掉全不透明图片的 Alpha 通道并最大压缩
+# png_palette   —— 量化为 256 色调色板 PNG，截图类题目体积最小，颜色有轻微损失
+# webp          —— WebP（默认无损），文件后缀为 .webp
+IMAGE_CODECS = ("png", "png_optimized", "png_palette", "webp")
+DEFAULT_IMAGE_STORAGE = {
+    "codec": "png_optimized",
+    "content_store": True,     # 按内容哈希存入 item_img_store，相同图片只存一份；False 时写 item_img_path/{题目ID}.png
+    "packed": False,           # 内容存储写入打包文件（见 image_pack.py），而不是每张图一个文件
+    "grayscale_text": False,   # 近似灰度（纯文字）的题目图片转为灰度存储
+    "webp_lossless": True,
+    "webp_quality": 90,
+}
+
+# 进程内图片缓存（缩略图、原图、PhotoImage）的内存预算，单位 MB
+DEFAULT_IMAGE_CACHE_MB = 256
+
+# 本地导入服务（浏览器插件推送题目）
+DEFAULT_IMPORT_SERVER = {
+    "host": "127.0.0.1",
+    "port": 27777,
+    "max_body_mb": 64,         # 单个请求体上限，超出返回 413
+    "decode_workers": 2,       # 解析请求、校验图片、写入暂存文件的线程数
+    "max_queue": 200,          # 导入队列中待处理的条目达到该数量时返回 429
+    "retry_after": 5,          # 429 响应中建议客户端等待的秒数
+}
+
+DEFAULT_SETTINGS = {
+    "data_path": "",
+    "subjects": [],
+    "subject_param": ""
+}
+
 # 如果 settings.json 不存在，则自动创建
 def ensure_settings_file():
     if not os.path.exists(SETTINGS_FILE):
-        default_config = {
-            "data_path": "",
-            "subjects": [],
-            "subject_param": ""
-        }
+        default_config = copy.deepcopy(DEFAULT_SETTINGS)
+        default_config["db_performance"] = {"profile": DEFAULT_DB_PROFILE}
+        default_config["image_storage"] = dict(DEFAULT_IMAGE_STORAGE)
         save_settings(default_config)
 
-# 读取配置
+# 进程内配置缓存：按文件 mtime/大小判断是否需要重新解析，保存时直接更新。
+# 可重入锁：修改配置时在同一把锁内完成读取、修改、写入，并发修改不会互相覆盖
+_settings_lock = threading.RLock()
+_settings_cache = None
+_settings_stamp = None
+
+def _file_stamp():
+    try:
+        st = os.stat(SETTINGS_FILE)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+# 读取配置（返回副本，调用方可以随意修改）
 def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {
-        "data_path": "",
-        "subjects": [],
-        "subject_param": ""
-    }
-
-# 写入配置
+    global _settings_cache, _settings_stamp
+    stamp = _file_stamp()
+    with _settings_lock:
+        if stamp is None:
+            return copy.deepcopy(DEFAULT_SETTINGS)
+        if _settings_cache is None or stamp != _settings_stamp:
+            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+                _settings_cache = json.load(f)
+            _settings_stamp = stamp
+        return copy.deepcopy(_settings_cache)
+
+# 写入配置：先写临时文件再替换，其他线程读到的总是完整文件
 def save_settings(settings):
-    with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(settings, f, indent=4)
+    global _settings_cache, _settings_stamp
+    with _settings_lock:
+        fd, tmp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=APP_DIR)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(settings, f, ensure_ascii=False, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, SETTINGS_FILE)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        _settings_cache = copy.deepcopy(settings)
+        _settings_stamp = _file_stamp()
+
+# 新增：修改单个配置项
+def update_settings(**changes):
+    with _settings_lock:
+        settings = load_settings()
+        settings.update(changes)
+        save_settings(settings)
+    return settings
 
 # 新增：获取设置文件路径
 def load_settings_path():
@@ -46,10 +143,91 @@ def load_settings_path():
 
 # 新增：获取或创建本地接口 token
 def get_or_create_token():
-    settings = load_settings()
-    token = settings.get("token")
-    if not token:
-        token = secrets.token_urlsafe(16)
-        settings["token"] = token
+    with _settings_lock:
+        settings = load_settings()
+        token = settings.get("token")
+        if not token:
+            token = secrets.token_urlsafe(16)
+            settings["token"] = token
+            save_settings(settings)
+    return token
+
+# 新增：数据库性能配置
+# settings.json 中的 "db_performance": {"profile": "local" 或 "network", 以及可选的单项覆盖，如 "busy_timeout": 8000}
+def get_db_pragmas(settings=None):
+    if settings is None:
+        settings = load_settings()
+    section = settings.get("db_performance") or {}
+    profile = section.get("profile", DEFAULT_DB_PROFILE)
+    pragmas = dict(DB_PROFILES.get(profile, DB_PROFILES[DEFAULT_DB_PROFILE]))
+    for key in pragmas:
+        if key in section:
+            pragmas[key] = section[key]
+    return pragmas
+
+def set_db_profile(profile):
+    if profile not in DB_PROFILES:
+        raise ValueError(f"未知的数据库性能模式: {profile}")
+    with _settings_lock:
+        settings = load_settings()
+        section = dict(settings.get("db_performance") or {})
+        section["profile"] = profile
+        settings["db_performance"] = section
         save_settings(settings)
-    return token
\ No newline at end of file
+
+# 新增：题目图片存储配置
+# settings.json 中的 "image_storage": {"codec": ..., "grayscale_text": ..., "webp_lossless": ..., "webp_quality": ...}
+def get_image_storage(settings=None):
+    if settings is None:
+        settings = load_settings()
+    section = settings.get("image_storage") or {}
+    storage = dict(DEFAULT_IMAGE_STORAGE)
+    for key in storage:
+        if key in section:
+            storage[key] = section[key]
+    if storage["codec"] not in IMAGE_CODECS:
+        storage["codec"] = DEFAULT_IMAGE_STORAGE["codec"]
+    return storage
+
+def set_image_storage(**changes):
+    if "codec" in changes and changes["codec"] not in IMAGE_CODECS:
+        raise ValueError(f"未知的图片存储格式: {changes['codec']}")
+    with _settings_lock:
+        settings = load_settings()
+        section = dict(settings.get("image_storage") or {})
+        section.update(changes)
+        settings["image_storage"] = section
+        save_settings(settings)
+
+# 新增：图片内存缓存预算（settings.json 中的 "image_cache_mb"）
+def get_image_cache_mb(settings=None):
+    if settings is None:
+        settings = load_settings()
+    try:
+        value = int(settings.get("image_cache_mb", DEFAULT_IMAGE_CACHE_MB))
+    except (TypeError, ValueError):
+        value = DEFAULT_IMAGE_CACHE_MB
+    return max(value, 16)
+
+def set_image_cache_mb(value):
+    value = int(value)
+    if value < 16:
+        raise ValueError("图片缓存至少为 16MB")
+    update_settings(image_cache_mb=value)
+
+# 新增：本地导入服务配置（settings.json 中的 "import_server"，只需写要覆盖的项）
+def get_import_server(settings=None):
+    if settings is None:
+        settings = load_settings()
+    section = settings.get("import_server") or {}
+    options = dict(DEFAULT_IMPORT_SERVER)
+    for key, default in DEFAULT_IMPORT_SERVER.items():
+        if key not in section:
+            continue
+        try:
+            options[key] = type(default)(section[key])
+        except (TypeError, ValueError):
+            pass
+    for key in ("max_body_mb", "decode_workers", "max_queue", "retry_after"):
+        options[key] = max(options[key], 1)
+    return options
@@ -0,0 +1,195 @@
+# db.py
+# 数据访问层：统一解析数据库路径、按线程缓存连接、提供事务上下文
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from tkinter import messagebox
+
+import config
+import migrations
+
+DB_FILENAME = "mobius_data.sqlite3"
+# 每个连接缓存的预编译语句数量（sqlite3 按 SQL 文本复用语句）
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_lock = threading.Lock()
+# 已确认存在的数据库文件路径，路径不变时不再重复 stat
+_verified_path = None
+# 数据路径切换时递增，各线程据此丢弃旧连接
+_generation = 0
+# 各线程已打开的连接：id(conn) -> (conn, 所属线程)。reset() 据此关闭所有线程的连接，
+# 否则空闲的后台线程一直占着旧连接，切换日志模式（离开 WAL 需要独占数据库）会失败
+_connections = {}
+
+def get_db_path(show_error=True):
+    """
+    根据 settings.json 中的 data_path 返回数据库文件路径。
+    未设置数据路径或文件不存在时返回 None，show_error 为 True 时弹窗提示。
+    """
+    global _verified_path
+    settings = config.load_settings()
+    data_path = settings.get("data_path", "")
+    if not data_path:
+        if show_error:
+            messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
+        return None
+    db_path = os.path.join(data_path, DB_FILENAME)
+    if db_path == _verified_path:
+        return db_path
+    if not os.path.exists(db_path):
+        if show_error:
+            messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
+        return None
+    _verified_path = db_path
+    return db_path
+
+def _open_connection(db_path):
+    # isolation_level=None：不再隐式开启事务，写操作统一走 transaction()
+    # check_same_thread=False 只是为了 reset() 能关闭其他线程的连接，连接仍按线程各用各的
+    conn = sqlite3.connect(
+        db_path,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    _local.pragma_failures = apply_pragmas(conn)
+    # 旧数据库就地升级到最新结构（计数表、索引等）
+    migrations.migrate(conn)
+    return conn
+
+def apply_pragmas(conn, pragmas=None):
+    """
+    按 settings.json 的 db_performance 配置设置连接参数，单项失败不影响打开连接。
+    返回未生效的设置说明列表；journal_mode 切换不了时 SQLite 不报错而是返回原模式，也算失败。
+    """
+    if pragmas is None:
+        pragmas = config.get_db_pragmas()
+    failures = []
+    for key, value in pragmas.items():
+        if not key.isidentifier():
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            continue
+        if isinstance(value, str) and not value.isalnum():
+            continue
+        try:
+            rows = conn.execute(f"PRAGMA {key} = {value}").fetchall()
+        except sqlite3.Error as e:
+            failures.append(f"{key}={value}: {e}")
+            continue
+        if key == "journal_mode" and rows and str(rows[0][0]).lower() != str(value).lower():
+            failures.append(f"{key}={value}: 数据库仍为 {rows[0][0]}（可能有其他连接正在使用数据库）")
+    for failure in failures:
+        print(f"[数据库] 设置 PRAGMA {failure} 失败")
+    return failures
+
+def pragma_failures():
+    """当前线程的连接打开时未生效的 PRAGMA 设置。"""
+    return list(getattr(_local, "pragma_failures", []))
+
+def get_conn(show_error=True):
+    """
+    返回当前线程的数据库连接（同一线程内复用，不要手动 close）。
+    数据库不可用时返回 None。
+    """
+    db_path = get_db_path(show_error)
+    if not db_path:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        if _local.path == db_path and _local.generation == _generation:
+            return conn
+        close_thread_connection()
+    try:
+        conn = _open_connection(db_path)
+    except Exception as e:
+        if show_error:
+            messagebox.showerror("错误", f"打开数据库失败: {e}")
+        return None
+    _local.conn = conn
+    _local.path = db_path
+    _local.generation = _generation
+    _local.depth = 0
+    current = threading.current_thread()
+    with _lock:
+        # 顺带关闭已退出线程留下的连接
+        for key, (other, thread) in list(_connections.items()):
+            if not thread.is_alive():
+                _close_quietly(other)
+                del _connections[key]
+        _connections[id(conn)] = (conn, current)
+    return conn
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def reset():
+    """
+    数据路径或性能模式变更后调用：丢弃已校验路径并关闭所有线程的连接，各线程在下次取连接时重新打开。
+    其他线程正在事务中的连接不关闭，由该线程在下次取连接时按版本号自行关闭。
+    """
+    global _verified_path, _generation
+    close_thread_connection()
+    with _lock:
+        _verified_path = None
+        _generation += 1
+        for key, (conn, thread) in list(_connections.items()):
+            if conn.in_transaction:
+                continue
+            _close_quietly(conn)
+            del _connections[key]
+
+def generation():
+    """数据路径切换次数，缓存据此判断是否需要重新加载。"""
+    return _generation
+
+def close_thread_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        with _lock:
+            _connections.pop(id(conn), None)
+        _close_quietly(conn)
+    _local.conn = None
+
+@contextmanager
+def transaction(conn):
+    """
+    写操作事务：正常结束提交，异常回滚并继续抛出。
+    嵌套调用时使用 SAVEPOINT，只回滚内层。
+    """
+    depth = getattr(_local, "depth", 0)
+    if conn.in_transaction:
+        name = f"mobius_sp{depth}"
+        conn.execute(f"SAVEPOINT {name}")
+        _local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {name}")
+            conn.execute(f"RELEASE {name}")
+            raise
+        else:
+            conn.execute(f"RELEASE {name}")
+        finally:
+            _local.depth = depth
+    else:
+        conn.execute("BEGIN IMMEDIATE")
+        _local.depth = depth + 1
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            _local.depth = depth
+
+def table_exists(conn, table_name):
+    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    return cursor.fetchone() is not None
@@ -4,9 +4,11 @@ import json
 import os
 import sys
 import subprocess
-import sqlite3
 import io
-import config
+import db
+import catalog
+import images
+import image_store
 
 tags_data = []
 items_data = {}
@@ -56,7 +58,8 @@ def ensure_question_entry_window():
             _question_window = None
             question_entry()
 
-def import_question_from_external(question_id, image_bytes):
+def import_question_from_external(question_id, image_bytes=None, img=None):
+    # img 为已在导入服务线程中解码好的图片（批量导入），此时不再传 image_bytes
     ensure_question_entry_window()
     if _question_window is None:
         return
@@ -71,30 +74,32 @@ def import_question_from_external(question_id, image_bytes):
 
     try:
         from PIL import Image, ImageTk
-        img = Image.open(io.BytesIO(image_bytes))
+        if img is None:
+            img = Image.open(io.BytesIO(image_bytes))
+            img.load()
         if _img_frame is not None:
-            max_w, max_h = 560, 800
-            w, h = img.size
-            scale = min(max_w / w, max_h / h, 1)
-            if scale < 1:
-                try:
-                    resample = Image.Resampling.LANCZOS
-                except AttributeError:
-                    resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                img_disp = img.resize((int(w * scale), int(h * scale)), resample)
-            else:
-                img_disp = img
-            tk_img = ImageTk.PhotoImage(img_disp)
+            tk_img = ImageTk.PhotoImage(images.resize_to_fit(img))
             _img_frame.img_label.config(image=tk_img, text="")
             _img_frame.img_label.image = tk_img
-            _img_frame.img_label._original_image = img.copy()
+            # 导入的图片尚未落盘，保留原图供保存时写入并生成缩略图
+            _img_frame.img_label._original_image = img
+            _img_frame.img_label._original_path = None
             _img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
     except Exception:
+        img = None
         if _img_frame is not None:
-            _img_frame.img_label.config(image="", text="图片加载失败")
-            _img_frame.img_label.image = None
-            _img_frame.img_label._original_image = None
-            _img_frame.img_size_var.set("尺寸: -")
+            _img_frame.clear_image("图片加载失败")
+
+    # 按感知哈希检查题库中是否已有近似相同的题目（同一题目换了ID或重新截图）
+    similar = []
+    if img is not None:
+        try:
+            similar = image_store.find_similar(img, exclude_id=question_id)
+        except Exception as e:
+            print(f"[导入] 查找近似重复题目失败: {e}")
+    if similar:
+        ids = "、".join(item_id for item_id, _ in similar[:5])
+        messagebox.showwarning("疑似重复", f"题目 {question_id} 的图片与已有题目近似：{ids}", parent=_question_window)
 
     try:
         if _query_entry is not None:
@@ -102,138 +107,92 @@ def import_question_from_external(question_id, image_bytes):
     except Exception:
         pass
 
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    if not data_path:
-        messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
-        return None
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    if not os.path.exists(db_path):
-        messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
-        return None
-    return db_path
+def open_question_in_entry(question_id):
+    """在录入窗口中打开已入库的题目（导入审阅列表调用），与输入ID后回车相同：自动填充标签、难度和图片。"""
+    ensure_question_entry_window()
+    if _question_id_entry is None:
+        return
+    try:
+        _question_id_entry.delete(0, tk.END)
+        _question_id_entry.insert(0, question_id)
+        _question_id_entry.icursor(tk.END)
+        _question_id_entry.event_generate("<Return>")
+    except tk.TclError:
+        pass
 
 def load_tags_data():
     global tags_data
-    db_path = get_db_path()
-    if not db_path:
-        return
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute("""
-            SELECT tag_id, module_id, tag_name, tag_intro
-            FROM tags
-        """)
-        tags_data = []
-        for row in c.fetchall():
-            tag_id, module_id, tag_name, tag_intro = row
-            # 查询题量
-            c.execute("SELECT COUNT(*) FROM item_tag_relations WHERE tag_id=?", (tag_id,))
-            item_count = c.fetchone()[0]
-            tags_data.append({
-                "tag_id": tag_id,
-                "module_id": module_id,
-                "tag_name": tag_name,
-                "tag_intro": tag_intro,
-                "item_count": item_count,
-                "tag_level": 1
-            })
-        conn.close()
+        # 标签及题量取自共享目录缓存，已加载过则不再查库
+        tags_data = catalog.tags()
+        for tag in tags_data:
+            tag["tag_level"] = 1
     except Exception as e:
         messagebox.showerror("错误", f"读取标签数据时出错: {str(e)}")
 
-def save_tags_data():
-    db_path = get_db_path()
-    if not db_path:
-        return
+def save_tag_data(tag):
+    # 只写入单个标签（新建或修改），成功后同步到共享目录缓存
+    conn = db.get_conn()
+    if conn is None:
+        return False
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        # 清空 tags 表并重新插入
-        c.execute("DELETE FROM tags")
-        for tag in tags_data:
-            c.execute("""
+        with db.transaction(conn):
+            conn.execute("""
                 INSERT INTO tags (tag_id, module_id, tag_name, tag_intro)
                 VALUES (?, ?, ?, ?)
+                ON CONFLICT(tag_id) DO UPDATE SET
+                    module_id=excluded.module_id,
+                    tag_name=excluded.tag_name,
+                    tag_intro=excluded.tag_intro
             """, (tag['tag_id'], tag['module_id'], tag['tag_name'], tag['tag_intro']))
-        conn.commit()
-        conn.close()
-        messagebox.showinfo("成功", "标签数据已保存")
+        catalog.put_tag(tag)
+        return True
     except Exception as e:
         messagebox.showerror("错误", f"保存标签数据时出错: {str(e)}")
+        return False
 
 def load_items_data():
     global items_data
-    db_path = get_db_path()
-    if not db_path:
-        return
-    print(f"[调试] 数据库文件路径: {db_path}")
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM items")
-        items_count = c.fetchone()[0]
-        print(f"[调试] items表数据数量: {items_count}")
-        items_data = {}
-        c.execute("SELECT item_id, item_level FROM items")
-        rows = c.fetchall()
-        print(f"[调试] 读取表: items, 数据: {rows}")
-        for item_id, tag_level in rows:
-            c.execute("SELECT tag_id FROM item_tag_relations WHERE item_id=?", (item_id,))
-            tag_ids = [row[0] for row in c.fetchall()]
-            items_data[item_id] = {
-                'tags': tag_ids,
-                'tag_level': tag_level
-            }
-        conn.close()
+        items_data = catalog.items()
+        print(f"[调试] items数据数量: {len(items_data)}")
     except Exception as e:
         messagebox.showerror("错误", f"读取题目数据时出错: {str(e)}")
 
-def save_items_data():
-    db_path = get_db_path()
-    if not db_path:
-        return
+def save_item_data(question_id):
+    """
+    只写入单道题目：items 行按 item_id 插入或更新难度（保留用途、讲解思路），
+    标签关系与数据库中已有的做差集，只增删变化的部分。
+    """
+    data = items_data[question_id]
+    conn = db.get_conn()
+    if conn is None:
+        return False
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        # 清空 items 和 item_tag_relations 表并重新插入
-        c.execute("DELETE FROM items")
-        c.execute("DELETE FROM item_tag_relations")
-        for question_id, data in items_data.items():
+        with db.transaction(conn):
+            c = conn.cursor()
             c.execute("""
                 INSERT INTO items (item_id, item_level)
                 VALUES (?, ?)
+                ON CONFLICT(item_id) DO UPDATE SET item_level=excluded.item_level
             """, (question_id, data['tag_level']))
-            for tag_id in data['tags']:
-                c.execute("""
-                    INSERT INTO item_tag_relations (item_id, tag_id)
-                    VALUES (?, ?)
-                """, (question_id, tag_id))
-        conn.commit()
-        conn.close()
+            c.execute("SELECT tag_id FROM item_tag_relations WHERE item_id=?", (question_id,))
+            old_tags = {row[0] for row in c.fetchall()}
+            new_tags = set(data['tags'])
+            c.executemany("DELETE FROM item_tag_relations WHERE item_id=? AND tag_id=?",
+                          [(question_id, tag_id) for tag_id in old_tags - new_tags])
+            c.executemany("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)",
+                          [(question_id, tag_id) for tag_id in new_tags - old_tags])
+        catalog.put_item(question_id, data['tag_level'], data['tags'])
+        return True
     except Exception as e:
         messagebox.showerror("错误", f"保存题目数据时出错: {str(e)}")
+        return False
 
 def load_modules_data():
     global modules_data
-    db_path = get_db_path()
-    if not db_path:
-        return
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        # 修改：查询 module_type
-        c.execute("SELECT module_id, module_name, module_type FROM modules")
-        modules_data = []
-        for module_id, module_name, module_type in c.fetchall():
-            modules_data.append({
-                "module_id": module_id,
-                "module_name": module_name,
-                "module_type": module_type
-            })
-        conn.close()
+        modules_data = catalog.modules()
     except Exception as e:
         messagebox.showerror("错误", f"读取模块数据时出错: {str(e)}")
 
@@ -317,42 +276,16 @@ def question_entry():
             update_selected_tags_display()
             update_tags_table(tags_data)
             # 3. 自动加载图片
-            settings = config.load_settings()
-            data_path = settings.get("data_path", "")
-            img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
-            img_path = os.path.join(img_dir, f"{question_id}.png") if img_dir else ""
-            if img_path and os.path.exists(img_path):
-                try:
-                    from PIL import Image, ImageTk
-                    img = Image.open(img_path)
-                    # 触发 ImageFrame 的图片显示
-                    max_w, max_h = 560, 800
-                    w, h = img.size
-                    scale = min(max_w/w, max_h/h, 1)
-                    if scale < 1:
-                        try:
-                            resample = Image.Resampling.LANCZOS
-                        except AttributeError:
-                            resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                        img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                    else:
-                        img_disp = img
-                    tk_img = ImageTk.PhotoImage(img_disp)
-                    img_frame.img_label.config(image=tk_img, text="")
-                    img_frame.img_label.image = tk_img
-                    img_frame.img_label._original_image = img.copy()
-                    img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
-                except Exception as e:
-                    img_frame.img_label.config(image="", text="图片加载失败")
-                    img_frame.img_label.image = None
-                    img_frame.img_label._original_image = None
-                    img_frame.img_size_var.set("尺寸: -")
-            else:
-                # 没有图片则清空
-                img_frame.img_label.config(image="", text="此处为图片粘贴区域")
-                img_frame.img_label.image = None
-                img_frame.img_label._original_image = None
-                img_frame.img_size_var.set("尺寸: -")
+            try:
+                preview = images.load_preview(question_id)
+                if preview:
+                    # 只显示缩略图；未粘贴新图时保存不会重写原图
+                    img_frame.show_preview(*preview)
+                else:
+                    # 没有图片则清空
+                    img_frame.clear_image()
+            except Exception as e:
+                img_frame.clear_image("图片加载失败")
             query_entry.focus_set()
         else:
             query_entry.focus_set()
@@ -391,7 +324,7 @@ def question_entry():
         update_tags_table(filtered_tags)
 
     def update_tags_table(tags, preferred_tag_id=None):
-        print(f"[调试] 数据库文件路径: {get_db_path()}")
+        print(f"[调试] 数据库文件路径: {db.get_db_path()}")
         print(f"[调试] 读取表: tags, 数据: {[tag['tag_name'] for tag in tags]}")
         print(f"update_tags_table called, tags: {[tag['tag_name'] for tag in tags]}")
         print("表格插入前行数：", len(tags_table.get_children()))
@@ -443,9 +376,7 @@ def question_entry():
 
         # 新增：保存图片（如有）
         # 图片保存目录自动为 data_path/item_img_path
-        settings = config.load_settings()
-        data_path = settings.get("data_path", "")
-        img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
+        img_dir = images.get_img_dir()
         if img_dir:
             try:
                 if not os.path.exists(img_dir):
@@ -455,21 +386,17 @@ def question_entry():
                 return
         # 检查 ImageFrame 是否有图片
         img_obj = getattr(img_frame.img_label, '_original_image', None)
-        if img_obj and img_dir:
-            try:
-                img_path = os.path.join(img_dir, f"{question_id}.png")
-                # 直接保存（自动覆盖同名图片）
-                img_obj.save(img_path, format="PNG")
-            except Exception as e:
-                messagebox.showerror("错误", f"图片保存失败: {str(e)}")
-                return
 
         items_data[question_id] = {
             'tags': [tag['tag_id'] for tag in tags_data if tag['tag_name'] in selected_tags],
             'tag_level': int(difficulty_var.get())
         }
-        save_items_data()
-        load_tags_data()
+        if not save_item_data(question_id):
+            return
+        if img_obj and img_dir:
+            # 题目写入成功后再提交图片，避免留下没有题目的孤立图片；
+            # 后台按存储配置压缩并写入（自动覆盖同名图片），失败时弹窗提示
+            image_store.save_item_image(question_id, img_obj, widget=_main_root or root)
         messagebox.showinfo("成功", "题目已保存")
         clear_fields()
 
@@ -482,10 +409,7 @@ def question_entry():
             difficulty_var.set("")
         query_entry.delete(0, tk.END)
         # 清空图片预览区域
-        img_frame.img_label.config(image="", text="此处为图片粘贴区域")
-        img_frame.img_label.image = None
-        img_frame.img_label._original_image = None
-        img_frame.img_size_var.set("尺寸: -")
+        img_frame.clear_image()
         update_selected_tags_display()
         update_tags_table(tags_data)
 
@@ -528,9 +452,9 @@ def question_entry():
                     "tag_level": 1
                 }
 
-                tags_data.append(new_tag)
-                save_tags_data()
-                update_tags_table(tags_data)
+                # 写库成功后由目录变更通知刷新标签表
+                if not save_tag_data(new_tag):
+                    return
                 tag_window.destroy()
                 messagebox.showinfo("成功", "标签已保存")
             except Exception as e:
@@ -583,29 +507,31 @@ def question_entry():
                 if not names:
                     messagebox.showwarning("警告", "请输入至少一个模块名称", parent=dialog)
                     return
-                db_path = get_db_path()
-                if not db_path:
+                conn = db.get_conn()
+                if conn is None:
                     return
                 try:
-                    conn = sqlite3.connect(db_path)
-                    c = conn.cursor()
-                    # 获取当前最大 module_id
-                    c.execute("SELECT MAX(module_id) FROM modules")
-                    max_id = c.fetchone()[0]
-                    next_id = int(max_id) if max_id and max_id.isdigit() else 0
-                    added = []
-                    for module_name in names:
-                        # 检查是否已存在
-                        c.execute("SELECT 1 FROM modules WHERE module_name=?", (module_name,))
-                        if c.fetchone():
-                            continue
-                        next_id += 1
-                        new_id = str(next_id).zfill(4)
-                        # 修改插入语句，增加 module_type
-                        c.execute("INSERT INTO modules (module_id, module_name, module_type) VALUES (?, ?, ?)", (new_id, module_name, module_type))
-                        added.append(module_name)
-                    conn.commit()
-                    conn.close()
+                    with db.transaction(conn):
+                        c = conn.cursor()
+                        # 获取当前最大 module_id
+                        c.execute("SELECT MAX(module_id) FROM modules")
+                        max_id = c.fetchone()[0]
+                        next_id = int(max_id) if max_id and max_id.isdigit() else 0
+                        added = []
+                        added_modules = []
+                        for module_name in names:
+                            # 检查是否已存在
+                            c.execute("SELECT 1 FROM modules WHERE module_name=?", (module_name,))
+                            if c.fetchone():
+                                continue
+                            next_id += 1
+                            new_id = str(next_id).zfill(4)
+                            # 修改插入语句，增加 module_type
+                            c.execute("INSERT INTO modules (module_id, module_name, module_type) VALUES (?, ?, ?)", (new_id, module_name, module_type))
+                            added.append(module_name)
+                            added_modules.append({"module_id": new_id, "module_name": module_name, "module_type": module_type})
+                    for module in added_modules:
+                        catalog.put_module(module)
                     load_modules_data()
                     module_select['values'] = [module['module_name'] for module in modules_data]
                     if module_select['values']:
@@ -649,11 +575,10 @@ def question_entry():
                     messagebox.showerror("错误", "未找到模块", parent=dialog)
                     return
                 module_id = module_obj['module_id']
-                db_path = get_db_path()
-                if not db_path:
+                conn = db.get_conn()
+                if conn is None:
                     return
                 try:
-                    conn = sqlite3.connect(db_path)
                     c = conn.cursor()
                     # 校验是否有关联
                     c.execute("SELECT COUNT(*) FROM tags WHERE module_id=?", (module_id,))
@@ -669,12 +594,11 @@ def question_entry():
                         if cluster_count > 0:
                             msg += f"题簇({cluster_count})"
                         messagebox.showerror("错误", msg, parent=dialog)
-                        conn.close()
                         return
                     # 删除模块
-                    c.execute("DELETE FROM modules WHERE module_id=?", (module_id,))
-                    conn.commit()
-                    conn.close()
+                    with db.transaction(conn):
+                        c.execute("DELETE FROM modules WHERE module_id=?", (module_id,))
+                    catalog.drop_module(module_id)
                     load_modules_data()
                     module_select['values'] = [module['module_name'] for module in modules_data]
                     if module_select['values']:
@@ -734,7 +658,7 @@ def question_entry():
     type_frame.place(x=600, y=0, width=600, height=900)
 
     # img_frame右移
-    from widgets.image_frame import ImageFrame
+    from widgets.image_frame import ImageFrame, treeview_neighbours
     img_frame = ImageFrame(root, width=600, height=900, bd=1, relief=tk.SOLID)
     img_frame.place(x=1200, y=0, width=600, height=900)
 
@@ -808,13 +732,10 @@ def question_entry():
         # 获取该标签下所有题目ID
         tag_id = tag['tag_id']
         item_ids = [item_id for item_id, data in items_data.items() if tag_id in data['tags']]
-        # 获取图片目录
-        settings = config.load_settings()
-        data_path = settings.get("data_path", "")
-        img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
+        # 有图片的题目取自图片索引（一次目录扫描）
+        img_ids = images.image_ids()
         for item_id in item_ids:
-            img_path = os.path.join(img_dir, f"{item_id}.png") if img_dir else ""
-            has_img = "有" if img_path and os.path.exists(img_path) else "无"
+            has_img = "有" if str(item_id) in img_ids else "无"
             table.insert('', 'end', values=(item_id, has_img))
         table.pack(padx=10, pady=5, fill=tk.BOTH, expand=True)
 
@@ -844,39 +765,16 @@ def question_entry():
 
         def preview_image(item_id):
             # 检查图片是否存在
-            settings = config.load_settings()
-            data_path = settings.get("data_path", "")
-            img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
-            if not img_dir:
+            if not images.get_img_dir():
                 return
-            exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
-            img_path = None
-            for ext in exts:
-                candidate = os.path.join(img_dir, f"{item_id}{ext}")
-                if os.path.isfile(candidate):
-                    img_path = candidate
-                    break
-            if img_path:
+            try:
+                preview = images.load_preview(item_id)
+            except Exception as e:
+                preview = None
+            if preview:
                 # 加载到img_frame并预览
                 try:
-                    from PIL import Image, ImageTk
-                    img = Image.open(img_path)
-                    max_w, max_h = 560, 800
-                    w, h = img.size
-                    scale = min(max_w/w, max_h/h, 1)
-                    if scale < 1:
-                        try:
-                            resample = Image.Resampling.LANCZOS
-                        except AttributeError:
-                            resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                        img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                    else:
-                        img_disp = img
-                    tk_img = ImageTk.PhotoImage(img_disp)
-                    img_frame.img_label.config(image=tk_img, text="")
-                    img_frame.img_label.image = tk_img
-                    img_frame.img_label._original_image = img.copy()
-                    img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
+                    img_frame.show_preview(*preview)
                     # 调用预览
                     img_frame.show_image_popup()
                 except Exception as e:
@@ -900,48 +798,11 @@ def question_entry():
             selected = table.selection()
             if selected:
                 item_id = table.item(selected[0], 'values')[0]
-                # 检查图片是否存在并自动预览
-                settings = config.load_settings()
-                data_path = settings.get("data_path", "")
-                img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
-                if not img_dir:
+                # 自动预览：后台读取缩略图，没有图片则清空预览区域
+                if not images.get_img_dir():
                     return
-                exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
-                img_path = None
-                for ext in exts:
-                    candidate = os.path.join(img_dir, f"{item_id}{ext}")
-                    if os.path.isfile(candidate):
-                        img_path = candidate
-                        break
-                if img_path:
-                    # 自动加载到img_frame预览
-                    try:
-                        from PIL import Image, ImageTk
-                        img = Image.open(img_path)
-                        max_w, max_h = 560, 800
-                        w, h = img.size
-                        scale = min(max_w/w, max_h/h, 1)
-                        if scale < 1:
-                            try:
-                                resample = Image.Resampling.LANCZOS
-                            except AttributeError:
-                                resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                            img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                        else:
-                            img_disp = img
-                        tk_img = ImageTk.PhotoImage(img_disp)
-                        img_frame.img_label.config(image=tk_img, text="")
-                        img_frame.img_label.image = tk_img
-                        img_frame.img_label._original_image = img.copy()
-                        img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
-                    except Exception as e:
-                        pass
-                else:
-                    # 没有图片则清空预览区域
-                    img_frame.img_label.config(image="", text="此处为图片粘贴区域")
-                    img_frame.img_label.image = None
-                    img_frame.img_label._original_image = None
-                    img_frame.img_size_var.set("尺寸: -")
+                neighbours = [table.item(row, 'values')[0] for row in treeview_neighbours(table, selected[0])]
+                img_frame.show_item_preview(item_id, prefetch_ids=neighbours)
 
         table.bind("<<TreeviewSelect>>", on_select)
         table.bind("<Double-1>", on_double_click)
@@ -973,9 +834,8 @@ def question_entry():
             tag['module_id'] = module_obj['module_id']
             tag['tag_name'] = new_tag_name
             tag['tag_intro'] = new_intro
-            save_tags_data()
-            load_tags_data()
-            update_tags_table(tags_data, preferred_tag_id=tag['tag_id'])
+            if not save_tag_data(tag):
+                return
             messagebox.showinfo("成功", "标签信息已保存", parent=root)
         save_btn = tk.Button(row4, text="保存", width=15, command=save_tag_info)
         save_btn.pack()
@@ -1026,8 +886,12 @@ def question_entry():
     create_tag_button = tk.Button(tags_frame, text="创建标签", width=10, height=1, command=create_tag)
     create_tag_button.grid(row=0, column=2, padx=10, pady=10)
     def refresh_tags():
-        load_tags_data()
-        update_tags_table(tags_data, preferred_tag_id=tag_current['tag_id'])
+        # 手动刷新：从数据库重新加载共享目录，变更通知会刷新本窗口
+        try:
+            catalog.reload()
+            images.refresh_index()
+        except Exception as e:
+            messagebox.showerror("错误", f"刷新标签数据时出错: {str(e)}")
     refresh_button = tk.Button(tags_frame, text="刷新", width=10, height=1, command=refresh_tags)
     refresh_button.grid(row=0, column=3, padx=10, pady=10)
 
@@ -1064,6 +928,24 @@ def question_entry():
     clear_button = tk.Button(buttons_frame, text="清空", width=20, height=1, command=clear_fields)
     clear_button.pack(side=tk.LEFT, padx=5)
 
+    # 其他窗口修改了模块/标签/题目时同步刷新：题目只同步变化的几道，标签表只在模块或标签变化时重绘
+    def on_catalog_changed(changes):
+        if catalog.MODULES in changes:
+            load_modules_data()
+        if catalog.TAGS in changes:
+            load_tags_data()
+        if catalog.ITEMS in changes:
+            catalog.apply_item_changes(items_data, changes)
+        if catalog.MODULES in changes or catalog.TAGS in changes:
+            filter_tags_keep_selection()
+
+    def filter_tags_keep_selection():
+        query = query_var.get().lower()
+        filtered_tags = [tag for tag in tags_data if query in tag['tag_name'].lower()]
+        update_tags_table(filtered_tags, preferred_tag_id=tag_current['tag_id'])
+
+    catalog.subscribe_widget(root, on_catalog_changed)
+
     _register_question_entry_widgets(root, question_id_entry, img_frame, query_entry)
     update_tags_table(tags_data)
     update_selected_tags_display()
@@ -1,113 +1,72 @@
 import tkinter as tk
 from tkinter import messagebox, Toplevel, ttk
-import os
-import json
-import sqlite3
 import config  # 新增：导入 config 模块
+import db
+import catalog
 import webbrowser
 
 # 全局变量
 tags_data = []
-items_data = []
+items_data = {}
 modules_data = []
 
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    if not data_path:
-        messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
-        return None
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    if not os.path.exists(db_path):
-        messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
-        return None
-    return db_path
-
 def load_tags_data():
     global tags_data
-    db_path = get_db_path()
-    if not db_path:
-        return
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT t.tag_id, t.module_id, m.module_name, t.tag_name, t.tag_intro, m.module_type
-            FROM tags t
-            LEFT JOIN modules m ON t.module_id = m.module_id
-        """)
+        # 标签、模块、题目均取自共享目录缓存
+        modules = {m['module_id']: m for m in catalog.modules()}
         tags_data = []
-        for row in cursor.fetchall():
+        for tag in catalog.tags():
+            module = modules.get(tag['module_id'])
             tags_data.append({
-                "tag_id": row[0],
-                "module_id": row[1],
-                "module_name": row[2] if row[2] else "未知模块",
-                "tag_name": row[3],
-                "tag_intro": row[4],
-                "module_type": row[5] if len(row) > 5 and row[5] else "未知类型"
+                "tag_id": tag['tag_id'],
+                "module_id": tag['module_id'],
+                "module_name": module['module_name'] if module and module['module_name'] else "未知模块",
+                "tag_name": tag['tag_name'],
+                "tag_intro": tag['tag_intro'],
+                "module_type": module['module_type'] if module and module['module_type'] else "未知类型",
+                "item_count": tag['item_count']
             })
-        conn.close()
     except Exception as e:
         messagebox.showerror("错误", f"读取标签数据时出错: {str(e)}")
 
 def load_items_data():
     global items_data
-    db_path = get_db_path()
-    if not db_path:
-        return
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT item_id, item_level FROM items")
-        items = {row[0]: {'tag_level': row[1], 'tags': []} for row in cursor.fetchall()}
-        cursor.execute("SELECT item_id, tag_id FROM item_tag_relations")
-        for item_id, tag_id in cursor.fetchall():
-            if item_id in items:
-                items[item_id]['tags'].append(tag_id)
-        items_data = items
-        conn.close()
+        items_data = catalog.items()
     except Exception as e:
         messagebox.showerror("错误", f"读取题目数据时出错: {str(e)}")
 
 def load_modules_data():
     global modules_data
-    db_path = get_db_path()
-    if not db_path:
-        return
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT module_id, module_name, module_type FROM modules")  # 增加module_type
-        modules_data = []
-        for row in cursor.fetchall():
-            modules_data.append({
-                "module_id": row[0],
-                "module_name": row[1],
-                "module_type": row[2] if len(row) > 2 else "未知类型"
-            })
-        conn.close()
+        modules_data = [{
+            "module_id": m['module_id'],
+            "module_name": m['module_name'],
+            "module_type": m['module_type'] if m['module_type'] else "未知类型"
+        } for m in catalog.modules()]
     except Exception as e:
         messagebox.showerror("错误", f"读取模块数据时出错: {str(e)}")
 
-def save_tags_data():
-    db_path = get_db_path()
-    if not db_path:
-        return
+def save_tag_data(tag):
+    # 只更新被修改的标签，成功后同步到共享目录缓存
+    conn = db.get_conn()
+    if conn is None:
+        return False
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        for tag in tags_data:
-            cursor.execute("""
+        with db.transaction(conn):
+            conn.execute("""
                 UPDATE tags SET
                     module_id = ?,
                     tag_name = ?,
                     tag_intro = ?
                 WHERE tag_id = ?
             """, (tag['module_id'], tag['tag_name'], tag['tag_intro'], tag['tag_id']))
-        conn.commit()
-        conn.close()
+        catalog.put_tag(tag)
+        return True
     except Exception as e:
         messagebox.showerror("错误", f"保存标签数据时出错: {str(e)}")
+        return False
 
 def tag_management():
     try:
@@ -147,21 +106,11 @@ def tag_management():
         def update_tags_table(tags):
             for i in tags_table.get_children():
                 tags_table.delete(i)
-            db_path = get_db_path()
-            if not db_path:
-                return
-            try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                for tag in tags:
-                    cursor.execute("SELECT COUNT(*) FROM item_tag_relations WHERE tag_id = ?", (tag['tag_id'],))
-                    item_count = cursor.fetchone()[0]
-                    tags_table.insert('', 'end', values=(
-                        tag['module_type'], tag['module_name'], item_count, tag['tag_name'], tag['tag_intro']
-                    ))
-                conn.close()
-            except Exception as e:
-                messagebox.showerror("错误", f"统计题量时出错: {str(e)}")
+            # 题量在 load_tags_data 时已随标签一并读出，筛选时不再查库
+            for tag in tags:
+                tags_table.insert('', 'end', values=(
+                    tag['module_type'], tag['module_name'], tag['item_count'], tag['tag_name'], tag['tag_intro']
+                ))
 
         def edit_tag(event):
             selected_item = tags_table.selection()
@@ -173,18 +122,9 @@ def tag_management():
                     edit_tag_window(tag)
 
         def edit_tag_window(tag):
-            # 查询当前标签标记的题目ID数量
-            db_path = get_db_path()
-            item_count = 0
-            if db_path:
-                try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT COUNT(*) FROM item_tag_relations WHERE tag_id = ?", (tag['tag_id'],))
-                    item_count = cursor.fetchone()[0]
-                    conn.close()
-                except Exception:
-                    pass
+            # 当前标签标记的题目ID数量
+            cached = catalog.get_tag(tag['tag_id'])
+            item_count = cached['item_count'] if cached else 0
 
             # 编辑弹层增加模块类型字段，并与模块下拉框联动
             def update_module_select(*args):
@@ -226,36 +166,31 @@ def tag_management():
                 tag['tag_name'] = tag_name
                 tag['tag_intro'] = tag_intro
 
-                save_tags_data()
-                update_tags_table(tags_data)
+                # 写库成功后由目录变更通知刷新表格
+                if not save_tag_data(tag):
+                    return
                 tag_window.destroy()
 
             def show_tag_items():
-                db_path = get_db_path()
-                if not db_path:
+                conn = db.get_conn()
+                if conn is None:
                     return
                 try:
-                    conn = sqlite3.connect(db_path)
                     cursor = conn.cursor()
                     cursor.execute(
                         "SELECT item_id FROM item_tag_relations WHERE tag_id = ?", (tag['tag_id'],)
                     )
                     item_ids = [str(row[0]) for row in cursor.fetchall()]
-                    conn.close()
                 except Exception as e:
                     messagebox.showerror("错误", f"读取题目ID时出错: {str(e)}")
                     return
 
                 # 读取 subject_param
-                settings_file = config.load_settings_path()
                 subject_param = "physics"
-                if os.path.exists(settings_file):
-                    try:
-                        with open(settings_file, "r", encoding="utf-8") as f:
-                            settings = json.load(f)
-                        subject_param = settings.get("subject_param", "physics")
-                    except Exception:
-                        pass
+                try:
+                    subject_param = config.load_settings().get("subject_param", "physics")
+                except Exception:
+                    pass
 
                 items_window = Toplevel(tag_window)
                 items_window.title(f"标签“{tag['tag_name']}”的题目ID")
@@ -298,18 +233,13 @@ def tag_management():
                 if item_count > 0:
                     messagebox.showwarning("无法删除", "有题目标注了此标签，请先处理后再删除。")
                     return
-                db_path = get_db_path()
-                if not db_path:
+                conn = db.get_conn()
+                if conn is None:
                     return
                 try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM tags WHERE tag_id = ?", (tag['tag_id'],))
-                    conn.commit()
-                    conn.close()
-                    # 从 tags_data 中移除
-                    tags_data[:] = [t for t in tags_data if t['tag_id'] != tag['tag_id']]
-                    update_tags_table(tags_data)
+                    with db.transaction(conn):
+                        conn.execute("DELETE FROM tags WHERE tag_id = ?", (tag['tag_id'],))
+                    catalog.drop_tag(tag['tag_id'])
                     messagebox.showinfo("删除成功", "标签已删除。")
                     tag_window.destroy()
                 except Exception as e:
@@ -401,11 +331,10 @@ def tag_management():
             module_type_var.set("所有类型")
             module_var.set("所有模块")
             tag_name_var.set("")
-            load_tags_data()
-            load_items_data()
-            load_modules_data()
-            update_module_options()
-            filter_tags()
+            try:
+                catalog.reload()
+            except Exception as e:
+                messagebox.showerror("错误", f"刷新数据时出错: {str(e)}")
         refresh_btn = tk.Button(filter_frame, text="刷新", command=refresh_all, width=8)
         refresh_btn.grid(row=0, column=6, padx=(2,10), pady=10, sticky="w")
 
@@ -425,6 +354,22 @@ def tag_management():
 
         tags_table.bind("<Double-1>", edit_tag)
 
+        # 其他窗口修改了模块/标签/题目时同步刷新（保留当前筛选条件）
+        # 题目只同步变化的几道；只有题目变化而标签题量未变时不重绘
+        def on_catalog_changed(changes):
+            if catalog.ITEMS in changes:
+                catalog.apply_item_changes(items_data, changes)
+            if catalog.MODULES in changes:
+                load_modules_data()
+                module_type_filter = module_type_var.get()
+                module_select['values'] = ["所有模块"] + [m['module_name'] for m in modules_data
+                                                          if module_type_filter == "所有类型" or m['module_type'] == module_type_filter]
+            if catalog.MODULES in changes or catalog.TAGS in changes:
+                load_tags_data()
+                filter_tags()
+
+        catalog.subscribe_widget(root, on_catalog_changed)
+
         update_tags_table(tags_data)
         root.mainloop()
     except Exception as e:
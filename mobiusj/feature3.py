@@ -1,8 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import config
-import os
+import db
 import webbrowser
 from datetime import datetime
 
@@ -14,23 +13,6 @@ def get_subject_param():
 # 全局变量
 SUBJECT_PARAM = get_subject_param()
 
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    if not data_path:
-        messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
-        return None
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    if not os.path.exists(db_path):
-        messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
-        return None
-    return db_path
-
-def table_exists(conn, table_name):
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-    return cursor.fetchone() is not None
-
 def feature3():
     # 主弹层
     win = tk.Toplevel()
@@ -70,18 +52,15 @@ def feature3():
 
     def refresh_table():
         tree.delete(*tree.get_children())
-        db_path = get_db_path()
-        if not db_path:
+        conn = db.get_conn()
+        if conn is None:
             return
         try:
-            conn = sqlite3.connect(db_path)
-            if not table_exists(conn, "students"):
+            if not db.table_exists(conn, "students"):
                 messagebox.showerror("错误", "数据库缺少 students 表", parent=win)
-                conn.close()
                 return
-            if not table_exists(conn, "student_item_relations"):
+            if not db.table_exists(conn, "student_item_relations"):
                 messagebox.showerror("错误", "数据库缺少 student_item_relations 表", parent=win)
-                conn.close()
                 return
             cursor = conn.cursor()
             name_filter = name_var.get().strip()
@@ -96,9 +75,6 @@ def feature3():
                 tree.insert("", "end", values=(sname, count), tags=(sid,))
         except Exception as e:
             messagebox.showerror("错误", f"数据库查询失败: {e}", parent=win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
     refresh_table()
     # 让外部可刷新表格
     win.refresh_table = refresh_table
@@ -120,36 +96,30 @@ def show_add_student(parent):
         if len(name) > 10:
             messagebox.showerror("错误", "学生姓名不能超过10个字符", parent=add_win)
             return
-        db_path = get_db_path()
-        if not db_path:
+        conn = db.get_conn()
+        if conn is None:
             return
         try:
-            conn = sqlite3.connect(db_path)
-            if not table_exists(conn, "students"):
+            if not db.table_exists(conn, "students"):
                 messagebox.showerror("错误", "数据库缺少 students 表", parent=add_win)
-                conn.close()
                 return
             cursor = conn.cursor()
             cursor.execute("SELECT 1 FROM students WHERE student_name=?", (name,))
             exists = cursor.fetchone()
             if exists:
                 messagebox.showerror("错误", "该学生姓名已存在", parent=add_win)
-                conn.close()
                 return
-            cursor.execute("SELECT MAX(student_id) FROM students")
-            max_id = cursor.fetchone()[0]
-            next_id = str(int(max_id) + 1).zfill(6) if max_id else "000001"
-            cursor.execute("INSERT INTO students (student_id, student_name) VALUES (?, ?)", (next_id, name))
-            conn.commit()
+            with db.transaction(conn):
+                cursor.execute("SELECT MAX(student_id) FROM students")
+                max_id = cursor.fetchone()[0]
+                next_id = str(int(max_id) + 1).zfill(6) if max_id else "000001"
+                cursor.execute("INSERT INTO students (student_id, student_name) VALUES (?, ?)", (next_id, name))
             messagebox.showinfo("成功", "学生添加成功", parent=add_win)
             add_win.destroy()
             if hasattr(parent, "refresh_table"):
                 parent.refresh_table()
         except Exception as e:
             messagebox.showerror("错误", f"添加失败: {e}", parent=add_win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
     tk.Button(add_win, text="保存", command=save_student).pack(pady=10)
 
 def show_student_items(parent, student_id, student_name):
@@ -158,15 +128,13 @@ def show_student_items(parent, student_id, student_name):
     items_win.geometry("1000x400")  # 修改宽度为原来的2倍
     items_win.grab_set()
 
-    db_path = get_db_path()
+    conn = db.get_conn()
     items = []
-    if not db_path:
+    if conn is None:
         return
     try:
-        conn = sqlite3.connect(db_path)
-        if not table_exists(conn, "student_item_relations"):
+        if not db.table_exists(conn, "student_item_relations"):
             messagebox.showerror("错误", "数据库缺少 student_item_relations 表", parent=items_win)
-            conn.close()
             items = []
         else:
             cursor = conn.cursor()
@@ -175,9 +143,6 @@ def show_student_items(parent, student_id, student_name):
     except Exception as e:
         messagebox.showerror("错误", f"数据库查询失败: {e}", parent=items_win)
         items = []
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
     # 简单文字+按钮展示
     scroll_canvas = tk.Canvas(items_win)
@@ -224,20 +189,17 @@ def open_item_url(item_id):
 def delete_student_item(win, student_id, item_id, tree=None):
     if not messagebox.askyesno("确认", "是否解除该题目与学生的关联？", parent=win):
         return
-    db_path = get_db_path()
-    if not db_path:
+    conn = db.get_conn()
+    if conn is None:
         win.destroy()
         return
     try:
-        conn = sqlite3.connect(db_path)
-        if not table_exists(conn, "student_item_relations"):
+        if not db.table_exists(conn, "student_item_relations"):
             messagebox.showerror("错误", "数据库缺少 student_item_relations 表", parent=win)
-            conn.close()
             win.destroy()
             return
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM student_item_relations WHERE student_id=? AND item_id=?", (student_id, item_id))
-        conn.commit()
+        with db.transaction(conn):
+            conn.execute("DELETE FROM student_item_relations WHERE student_id=? AND item_id=?", (student_id, item_id))
         messagebox.showinfo("成功", "已解除关联", parent=win)
         if tree:
             for i in tree.get_children():
@@ -246,9 +208,6 @@ def delete_student_item(win, student_id, item_id, tree=None):
                     break
     except Exception as e:
         messagebox.showerror("错误", f"解除关联失败: {e}", parent=win)
-    finally:
-        if 'conn' in locals():
-            conn.close()
     win.destroy()
 
 
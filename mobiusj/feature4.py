@@ -1,11 +1,15 @@
 import os
 import json
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, ttk
 from tkinter import font
 import sqlite3
 
 import config  # 新增：导入 config 模块
+import db
+import migrations
+import image_cache
+import image_pack
 
 DB_FILENAME = "mobius_data.sqlite3"
 
@@ -128,6 +132,8 @@ def create_empty_db(db_path):
         );
         """)
         conn.commit()
+        # 新库直接升级到最新版本（计数表、索引）
+        migrations.migrate(conn)
     finally:
         conn.close()
 
@@ -178,18 +184,11 @@ def validate_db_structure(db_path):
         conn.close()
 
 def on_set_data_path(folder_selected):
-    settings_file = config.load_settings_path()
     try:
-        if os.path.exists(settings_file):
-            with open(settings_file, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-        else:
-            settings = {"data_path": "", "subjects": [], "subject_param": ""}
-
-        settings["data_path"] = folder_selected
-
-        with open(settings_file, "w", encoding="utf-8") as f:
-            json.dump(settings, f, ensure_ascii=False, indent=4)
+        config.update_settings(data_path=folder_selected)
+        # 数据路径已变更，丢弃旧连接和旧图片打包文件的映射
+        db.reset()
+        image_pack.close_maps()
 
         # 新增：检查并创建item_img_path文件夹
         img_folder = os.path.join(folder_selected, "item_img_path")
@@ -209,13 +208,8 @@ def on_set_data_path(folder_selected):
         messagebox.showerror("错误", f"设置数据路径时出错: {str(e)}")
 
 def on_validate_data_path():
-    settings_file = config.load_settings_path()
     try:
-        if os.path.exists(settings_file):
-            with open(settings_file, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-        else:
-            settings = {"data_path": "", "subjects": [], "subject_param": ""}
+        settings = config.load_settings()
 
         path = settings.get("data_path", "")
         if not path:
@@ -246,33 +240,17 @@ def on_validate_data_path():
         messagebox.showerror("错误", f"校验数据路径时出错: {str(e)}")
 
 def on_save_subject_param(param):
-    settings_file = config.load_settings_path()
     try:
-        if os.path.exists(settings_file):
-            with open(settings_file, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-        else:
-            settings = {"data_path": "", "subjects": [], "subject_param": ""}
-
-        settings["subject_param"] = param
-
-        with open(settings_file, "w", encoding="utf-8") as f:
-            json.dump(settings, f, ensure_ascii=False, indent=4)
-            
+        config.update_settings(subject_param=param)
     except Exception as e:
         messagebox.showerror("错误", f"保存配置失败: {str(e)}")
 
 def create_setting_window():
-    settings_file = config.load_settings_path()
-    if os.path.exists(settings_file):
-        with open(settings_file, "r", encoding="utf-8") as f:
-            settings = json.load(f)
-    else:
-        settings = {"data_path": "", "subjects": [], "subject_param": ""}
+    settings = config.load_settings()
 
     root = tk.Toplevel()
     root.title("设置")
-    root.geometry("600x600")
+    root.geometry("600x820")
     root.resizable(width=False, height=False)
     root.protocol("WM_DELETE_WINDOW", root.destroy)  # 修改：关闭时调用 destroy
 
@@ -314,20 +292,10 @@ def create_setting_window():
 
         settings_file = config.load_settings_path()
         try:
-            if os.path.exists(settings_file):
-                with open(settings_file, "r", encoding="utf-8") as f:
-                    settings = json.load(f)
-            else:
-                settings = {"data_path": "", "subjects": [], "subject_param": ""}
-
             # 单条保存时，直接弹窗错误
-            settings["subject_param"] = param
-
-            with open(settings_file, "w", encoding="utf-8") as f:
-                json.dump(settings, f, ensure_ascii=False, indent=4)
-                f.flush()
-                os.fsync(f.fileno())
+            config.update_settings(subject_param=param)
 
+            # 绕过缓存直接读文件，确认已落盘
             with open(settings_file, "r", encoding="utf-8") as f:
                 saved_settings = json.load(f)
                 if saved_settings.get("subject_param") != param:
@@ -337,9 +305,7 @@ def create_setting_window():
             messagebox.showinfo("信息", f"学科参数已保存: {param}")
             
         except Exception as e:
-            with open(settings_file, "r", encoding="utf-8") as f:
-                current_settings = json.load(f)
-                current_value = current_settings.get("subject_param", "")
+            current_value = config.load_settings().get("subject_param", "")
             current_subject_param_label.config(text=f"当前学科参数: {current_value}")
             subject_param_var.set(current_value)
             
@@ -353,6 +319,94 @@ def create_setting_window():
     save_button = tk.Button(root, text="保存", command=save_subject_param)
     save_button.pack(pady=5)
 
+    # 数据库性能模式：本地磁盘用 WAL，网盘/同步文件夹用回滚日志（默认）
+    profile_names = {"local": "本地磁盘", "network": "网盘/同步文件夹"}
+    current_profile = (settings.get("db_performance") or {}).get("profile", config.DEFAULT_DB_PROFILE)
+    tk.Label(root, text="数据库性能模式:").pack(pady=(20, 5))
+    profile_frame = tk.Frame(root)
+    profile_frame.pack(pady=5)
+    profile_var = tk.StringVar(value=profile_names.get(current_profile, profile_names[config.DEFAULT_DB_PROFILE]))
+    profile_cb = ttk.Combobox(profile_frame, textvariable=profile_var, values=list(profile_names.values()), width=16, state="readonly")
+    profile_cb.pack(side=tk.LEFT, padx=5)
+
+    def save_db_profile():
+        profile = next((k for k, v in profile_names.items() if v == profile_var.get()), None)
+        if profile is None:
+            return
+        try:
+            config.set_db_profile(profile)
+            # 关闭所有线程的连接后重新打开，新的 PRAGMA（包括日志模式）随之生效
+            db.reset()
+            failures = db.pragma_failures() if db.get_conn(show_error=False) is not None else []
+        except Exception as e:
+            messagebox.showerror("错误", f"保存数据库性能模式失败: {str(e)}")
+            return
+        if failures:
+            messagebox.showerror("错误", "数据库性能模式已保存，但以下设置未生效（可重启程序后再试）:\n" + "\n".join(failures))
+        else:
+            messagebox.showinfo("信息", f"数据库性能模式已保存: {profile_var.get()}")
+
+    tk.Button(profile_frame, text="保存", command=save_db_profile).pack(side=tk.LEFT, padx=5)
+
+    # 题目图片存储格式：新保存的图片按此编码，已有图片不变
+    codec_names = {
+        "png": "PNG（原样）",
+        "png_optimized": "PNG（无损压缩）",
+        "png_palette": "PNG（256色）",
+        "webp": "WebP",
+    }
+    image_storage = config.get_image_storage(settings)
+    tk.Label(root, text="图片存储格式:").pack(pady=(20, 5))
+    codec_frame = tk.Frame(root)
+    codec_frame.pack(pady=5)
+    codec_var = tk.StringVar(value=codec_names[image_storage["codec"]])
+    codec_cb = ttk.Combobox(codec_frame, textvariable=codec_var, values=list(codec_names.values()), width=16, state="readonly")
+    codec_cb.pack(side=tk.LEFT, padx=5)
+    grayscale_var = tk.BooleanVar(value=bool(image_storage["grayscale_text"]))
+    tk.Checkbutton(codec_frame, text="纯文字题目存为灰度", variable=grayscale_var).pack(side=tk.LEFT, padx=5)
+
+    def save_image_storage():
+        codec = next((k for k, v in codec_names.items() if v == codec_var.get()), None)
+        if codec is None:
+            return
+        try:
+            config.set_image_storage(codec=codec, grayscale_text=grayscale_var.get())
+            messagebox.showinfo("信息", f"图片存储格式已保存: {codec_var.get()}")
+        except Exception as e:
+            messagebox.showerror("错误", f"保存图片存储格式失败: {str(e)}")
+
+    tk.Button(codec_frame, text="保存", command=save_image_storage).pack(side=tk.LEFT, padx=5)
+
+    # 图片内存缓存：预览缩略图与原图共用，PhotoImage 另按预算的四分之一缓存；超出预算时淘汰最久未用的
+    tk.Label(root, text="图片内存缓存(MB):").pack(pady=(20, 5))
+    cache_frame = tk.Frame(root)
+    cache_frame.pack(pady=5)
+    cache_var = tk.StringVar(value=str(config.get_image_cache_mb(settings)))
+    tk.Spinbox(cache_frame, from_=16, to=4096, increment=16, textvariable=cache_var, width=8).pack(side=tk.LEFT, padx=5)
+    cache_stats_var = tk.StringVar()
+
+    def refresh_cache_stats():
+        st = image_cache.stats()
+        cache_stats_var.set(
+            f"命中 {st['hits']} / 未命中 {st['misses']}（命中率 {st['hit_rate']:.0%}），"
+            f"淘汰 {st['evictions']}，占用 {st['bytes'] / 1048576:.1f}/{st['budget'] / 1048576:.0f} MB，"
+            f"PhotoImage {st['photos']} 个 {st['photo_bytes'] / 1048576:.1f} MB"
+        )
+
+    def save_image_cache():
+        try:
+            config.set_image_cache_mb(int(cache_var.get()))
+            image_cache.set_budget(int(cache_var.get()))
+            refresh_cache_stats()
+            messagebox.showinfo("信息", f"图片内存缓存已保存: {cache_var.get()} MB")
+        except Exception as e:
+            messagebox.showerror("错误", f"保存图片内存缓存失败: {str(e)}")
+
+    tk.Button(cache_frame, text="保存", command=save_image_cache).pack(side=tk.LEFT, padx=5)
+    tk.Button(cache_frame, text="刷新统计", command=refresh_cache_stats).pack(side=tk.LEFT, padx=5)
+    tk.Label(root, textvariable=cache_stats_var, fg="#555").pack(pady=5)
+    refresh_cache_stats()
+
     root.mainloop()
 
 def add_missing_tables(db_path, missing_tables):
@@ -456,6 +510,8 @@ def add_missing_tables(db_path, missing_tables):
             if sql:
                 c.executescript(sql)
         conn.commit()
+        # 补全表后继续之前因缺表而未完成的迁移
+        migrations.migrate(conn)
     finally:
         conn.close()
 
@@ -1,83 +1,69 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import config
-import os
+import db
+import catalog
 import uuid
 import random
-import json
 import webbrowser
 
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    return db_path
-
 def get_modules():
-    db_path = get_db_path()
+    # 取自共享目录缓存
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT module_id, module_name, module_type FROM modules")
-            modules = cur.fetchall()
-            return modules
+        return [(m['module_id'], m['module_name'], m['module_type']) for m in catalog.modules()]
     except Exception as e:
         print("获取模块异常:", e)
         return []
 
 def get_tags_by_module(module_id):
-    db_path = get_db_path()
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT tag_id, tag_name FROM tags WHERE module_id=?", (module_id,))
-            tags = cur.fetchall()
-            return tags
+        return [(t['tag_id'], t['tag_name']) for t in catalog.tags() if t['module_id'] == module_id]
     except Exception as e:
         print("获取标签异常:", e)
         return []
 
 def get_clusters(module_id=None, tag_id=None, cluster_name=None):
-    db_path = get_db_path()
+    conn = db.get_conn(show_error=False)
+    if conn is None:
+        return []
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            sql = """
-                SELECT c.cluster_id, m.module_type, m.module_name, t.tag_name, c.cluster_name, c.cluster_intro
-                FROM clusters c
-                LEFT JOIN modules m ON c.module_id = m.module_id
-                LEFT JOIN tags t ON c.tag_id = t.tag_id
-                WHERE 1=1
-            """
-            params = []
-            if module_id:
-                sql += " AND c.module_id=?"
-                params.append(module_id)
-            if tag_id:
-                sql += " AND c.tag_id=?"
-                params.append(tag_id)
-            if cluster_name:
-                sql += " AND c.cluster_name LIKE ?"
-                params.append(f"%{cluster_name}%")
-            cur.execute(sql, params)
-            clusters = cur.fetchall()
-            return clusters
+        cur = conn.cursor()
+        sql = """
+            SELECT c.cluster_id, m.module_type, m.module_name, t.tag_name, c.cluster_name, c.cluster_intro
+            FROM clusters c
+            LEFT JOIN modules m ON c.module_id = m.module_id
+            LEFT JOIN tags t ON c.tag_id = t.tag_id
+            WHERE 1=1
+        """
+        params = []
+        if module_id:
+            sql += " AND c.module_id=?"
+            params.append(module_id)
+        if tag_id:
+            sql += " AND c.tag_id=?"
+            params.append(tag_id)
+        if cluster_name:
+            sql += " AND c.cluster_name LIKE ?"
+            params.append(f"%{cluster_name}%")
+        cur.execute(sql, params)
+        clusters = cur.fetchall()
+        return clusters
     except Exception as e:
         print("获取题簇异常:", e)
         return []
 
 def get_group_counts(cluster_id):
-    db_path = get_db_path()
+    conn = db.get_conn(show_error=False)
+    if conn is None:
+        return 0, {}
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*), group_level FROM groups WHERE cluster_id=? GROUP BY group_level", (cluster_id,))
-            data = cur.fetchall()
-            total = sum([x[0] for x in data])
-            # 修正统计逻辑，key为level，value为count
-            level_counts = {level: count for count, level in data}
-            return total, level_counts
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*), group_level FROM groups WHERE cluster_id=? GROUP BY group_level", (cluster_id,))
+        data = cur.fetchall()
+        total = sum([x[0] for x in data])
+        # 修正统计逻辑，key为level，value为count
+        level_counts = {level: count for count, level in data}
+        return total, level_counts
     except Exception as e:
         print("统计题组数量异常:", e)
         return 0, {}
@@ -91,9 +77,11 @@ def generate_cluster_id():
     return "{:06d}".format(random.randint(0, 999999))
 
 def insert_cluster(module_id, tag_id, cluster_name, cluster_intro, groups):
-    db_path = get_db_path()
+    conn = db.get_conn()
+    if conn is None:
+        return
     try:
-        with sqlite3.connect(db_path) as conn:
+        with db.transaction(conn):
             cur = conn.cursor()
             # 使用6位数字生成唯一cluster_id
             next_id = generate_cluster_id()
@@ -107,60 +95,63 @@ def insert_cluster(module_id, tag_id, cluster_name, cluster_intro, groups):
                     cur.execute("INSERT INTO group_examples (group_id, item_id) VALUES (?, ?)", (next_gid, item_id))
                 for item_id in g['exercises']:
                     cur.execute("INSERT INTO group_exercises (group_id, item_id) VALUES (?, ?)", (next_gid, item_id))
-            conn.commit()
     except Exception as e:
         print("插入题簇异常:", e)
         messagebox.showerror("错误", f"插入题簇异常: {e}")
 
 def get_cluster_detail(cluster_name):
-    db_path = get_db_path()
+    conn = db.get_conn(show_error=False)
+    if conn is None:
+        return None
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT cluster_id, module_id, tag_id, cluster_name, cluster_intro
-                FROM clusters WHERE cluster_name=?
-            """, (cluster_name,))
-            cluster = cur.fetchone()
-            return cluster
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT cluster_id, module_id, tag_id, cluster_name, cluster_intro
+            FROM clusters WHERE cluster_name=?
+        """, (cluster_name,))
+        cluster = cur.fetchone()
+        return cluster
     except Exception as e:
         print("获取题簇详情异常:", e)
         return None
 
 def get_groups_by_cluster(cluster_id):
-    db_path = get_db_path()
+    conn = db.get_conn(show_error=False)
+    if conn is None:
+        return []
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT group_id, group_name, group_level, group_intro
-                FROM groups WHERE cluster_id=?
-            """, (cluster_id,))
-            groups = []
-            for gid, gname, glevel, gintro in cur.fetchall():
-                # 获取例题
-                cur.execute("SELECT item_id FROM group_examples WHERE group_id=?", (gid,))
-                examples = [row[0] for row in cur.fetchall()]
-                # 获取练习
-                cur.execute("SELECT item_id FROM group_exercises WHERE group_id=?", (gid,))
-                exercises = [row[0] for row in cur.fetchall()]
-                groups.append({
-                    "group_id": gid,
-                    "group_name": gname,
-                    "group_level": glevel,
-                    "group_intro": gintro,
-                    "examples": examples,
-                    "exercises": exercises
-                })
-            return groups
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT group_id, group_name, group_level, group_intro
+            FROM groups WHERE cluster_id=?
+        """, (cluster_id,))
+        groups = []
+        for gid, gname, glevel, gintro in cur.fetchall():
+            # 获取例题
+            cur.execute("SELECT item_id FROM group_examples WHERE group_id=?", (gid,))
+            examples = [row[0] for row in cur.fetchall()]
+            # 获取练习
+            cur.execute("SELECT item_id FROM group_exercises WHERE group_id=?", (gid,))
+            exercises = [row[0] for row in cur.fetchall()]
+            groups.append({
+                "group_id": gid,
+                "group_name": gname,
+                "group_level": glevel,
+                "group_intro": gintro,
+                "examples": examples,
+                "exercises": exercises
+            })
+        return groups
     except Exception as e:
         print("获取题组详情异常:", e)
         return []
 
 def update_cluster(cluster_id, module_id, tag_id, cluster_name, cluster_intro, groups):
-    db_path = get_db_path()
+    conn = db.get_conn()
+    if conn is None:
+        return
     try:
-        with sqlite3.connect(db_path) as conn:
+        with db.transaction(conn):
             cur = conn.cursor()
             cur.execute("UPDATE clusters SET module_id=?, tag_id=?, cluster_name=?, cluster_intro=? WHERE cluster_id=?",
                         (module_id, tag_id, cluster_name, cluster_intro, cluster_id))
@@ -180,44 +171,42 @@ def update_cluster(cluster_id, module_id, tag_id, cluster_name, cluster_intro, g
                     cur.execute("INSERT INTO group_examples (group_id, item_id) VALUES (?, ?)", (next_gid, item_id))
                 for item_id in g['exercises']:
                     cur.execute("INSERT INTO group_exercises (group_id, item_id) VALUES (?, ?)", (next_gid, item_id))
-            conn.commit()
     except Exception as e:
         print("更新题簇异常:", e)
         messagebox.showerror("错误", f"更新题簇异常: {e}")
 
 def load_subject_param():
     # 读取settings.json中的subject_param
-    settings_path = os.path.join(os.path.dirname(__file__), "settings.json")
     try:
-        with open(settings_path, "r", encoding="utf-8") as f:
-            settings = json.load(f)
-            return settings.get("subject_param", "physics")
+        return config.load_settings().get("subject_param", "physics")
     except Exception:
         return "physics"
 
 def get_students():
-    db_path = get_db_path()
+    conn = db.get_conn(show_error=False)
+    if conn is None:
+        return []
     try:
-        with sqlite3.connect(db_path) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT student_id, student_name FROM students")
-            return cur.fetchall()
+        cur = conn.cursor()
+        cur.execute("SELECT student_id, student_name FROM students")
+        return cur.fetchall()
     except Exception as e:
         print("获取学生名单异常:", e)
         return []
 
 def mark_student_item(student_id, item_id):
-    db_path = get_db_path()
+    conn = db.get_conn()
+    if conn is None:
+        return
     import datetime
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     try:
-        with sqlite3.connect(db_path) as conn:
+        with db.transaction(conn):
             cur = conn.cursor()
             cur.execute(
                 "INSERT OR IGNORE INTO student_item_relations (student_id, item_id, date_created) VALUES (?, ?, ?)",
                 (student_id, item_id, now)
             )
-            conn.commit()
     except Exception as e:
         print("标记学生题目关系异常:", e)
         messagebox.showerror("错误", f"标记失败: {e}")
@@ -321,6 +310,21 @@ def cluster_management():
             tag_var.set("")
         module_cb.bind("<<ComboboxSelected>>", update_tags)
 
+        # 其他窗口修改了模块/标签时同步下拉框，保留当前选择
+        def on_catalog_changed(changes):
+            if catalog.MODULES not in changes and catalog.TAGS not in changes:
+                return
+            modules[:] = get_modules()
+            module_id_map.clear()
+            module_id_map.update({f"{m[1]}（{m[2]}）": m[0] for m in modules})
+            module_choices[:] = [""] + list(module_id_map)
+            module_cb["values"] = module_choices
+            sel = module_var.get()
+            if sel in module_id_map:
+                tag_cb["values"] = [""] + [t[1] for t in get_tags_by_module(module_id_map[sel])]
+
+        catalog.subscribe_widget(win, on_catalog_changed)
+
         ttk.Label(query_frame, text="题簇名称:").grid(row=0, column=4, padx=5, pady=5)
         cluster_entry = ttk.Entry(query_frame, textvariable=cluster_name_var, width=18)
         cluster_entry.grid(row=0, column=5, padx=5, pady=5)
@@ -0,0 +1,315 @@
+# image_batch.py
+# 命令行批量处理现有题库图片：多进程重新编码、裁掉四周纯色边框、重建缩略图并校验。
+# 解码和编码在子进程中完成，写入在主进程中逐张进行，每张只短暂占用数据库，程序可以照常使用；
+# 处理结果逐条追加到日志文件，中断后再次运行会跳过已完成的题目
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+import db
+import image_pack
+import image_store
+import images
+
+JOURNAL_NAME = "image_batch_journal.jsonl"
+# 与左上角颜色的差异不超过该值视为边框
+TRIM_TOLERANCE = 8
+# 裁剪后四周保留的留白（像素）
+TRIM_MARGIN = 4
+# 每隔多少秒输出一次进度
+REPORT_INTERVAL = 2.0
+# 日志中视为已完成的状态，"error"、"changed" 下次运行会重试
+DONE_STATUSES = ("ok", "unchanged", "kept")
+# Windows 没有 os.nice，子进程改用 SetPriorityClass 设为“低于正常”
+BELOW_NORMAL_PRIORITY_CLASS = 0x4000
+
+def trim_border(img, tolerance=TRIM_TOLERANCE, margin=TRIM_MARGIN):
+    """裁掉与左上角像素颜色相同（允许少量偏差）的四周边框；带透明通道或整张纯色的图片原样返回。"""
+    from PIL import Image, ImageChops
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        return img
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert("L")
+    if tolerance:
+        diff = diff.point(lambda v: 255 if v > tolerance else 0)
+    box = diff.getbbox()
+    if box is None:
+        return img
+    w, h = img.size
+    left, top, right, bottom = box
+    box = (max(left - margin, 0), max(top - margin, 0), min(right + margin, w), min(bottom + margin, h))
+    if box == (0, 0, w, h):
+        return img
+    return img.crop(box)
+
+def _read_bytes(source):
+    if isinstance(source, image_pack.PackedRef):
+        try:
+            return bytes(image_pack.read_view(source))
+        except OSError:
+            store_dir = os.path.dirname(os.path.dirname(source.pack_path))
+            source = images.store_path(source.content_hash, source.file_ext, store_dir)
+    with open(source, "rb") as f:
+        return f.read()
+
+def _flatten(img):
+    # 统一铺到白底上比较，忽略完全透明像素的颜色差异
+    from PIL import Image
+    img = img.convert("RGBA")
+    return Image.alpha_composite(Image.new("RGBA", img.size, (255, 255, 255, 255)), img)
+
+def _is_lossless(storage):
+    codec = storage["codec"]
+    if codec == "png_palette":
+        return False
+    if codec == "webp":
+        return bool(storage.get("webp_lossless", True))
+    return True
+
+def verify(img, ext, data, storage):
+    """解码编码后的字节，检查尺寸；无损编码时逐像素与原图比较。不通过时抛出 ValueError。"""
+    from PIL import Image, ImageChops
+    decoded = Image.open(io.BytesIO(data))
+    decoded.load()
+    if decoded.size != img.size:
+        raise ValueError(f"尺寸不一致: {decoded.size} != {img.size}")
+    if _is_lossless(storage):
+        expected = img if storage["codec"] == "png" else image_store.normalize(img, storage)
+        if ImageChops.difference(_flatten(expected), _flatten(decoded)).getbbox() is not None:
+            raise ValueError("无损编码后像素不一致")
+
+def _init_worker():
+    # 降低子进程优先级，批量处理时程序界面保持流畅
+    if os.name == "nt":
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), BELOW_NORMAL_PRIORITY_CLASS)
+        except (AttributeError, OSError):
+            pass
+        return
+    try:
+        os.nice(5)
+    except (AttributeError, OSError):
+        pass
+
+def process_one(task):
+    """
+    子进程中处理一张图片（不访问数据库）：读取、裁边、编码、校验并生成缩略图。
+    返回结果字典；data 为 None 表示不需要重写原图。
+    """
+    from PIL import Image
+    started = time.perf_counter()
+    result = {"item_id": task["item_id"], "in_bytes": 0, "out_bytes": 0, "data": None, "thumb": None}
+    try:
+        raw = _read_bytes(task["source"])
+        result["in_bytes"] = len(raw)
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+        trimmed = trim_border(img) if task["trim"] else img
+        storage = task["storage"]
+        ext, data = image_store.encode(trimmed, storage)
+        verify(trimmed, ext, data, storage)
+        if data == raw:
+            status = "unchanged"
+        elif trimmed is img and len(data) >= len(raw) and not task["force"]:
+            # 未裁边且重新编码后不比原来小：保留原文件
+            status = "kept"
+        else:
+            status = "ok"
+            result.update(data=data, ext=ext, out_bytes=len(data))
+        if status != "ok":
+            result["out_bytes"] = len(raw)
+        thumb = images.resize_to_fit(trimmed, task["max_w"], task["max_h"])
+        result.update(
+            status=status,
+            size=trimmed.size,
+            phash=images.dhash(trimmed),
+            thumb=thumb if thumb is not trimmed else None,
+            trimmed=trimmed is not img,
+        )
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+# ---------- 主进程：任务分发、写入与进度日志 ----------
+
+def _job_signature(storage, trim):
+    # 存储配置或裁边选项改变后视为新的任务，日志中旧的完成记录不再跳过
+    text = json.dumps({"storage": storage, "trim": trim}, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def _load_journal(journal_path, signature):
+    done = set()
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 中断时写了一半的行
+                if entry.get("job") != signature:
+                    continue
+                if entry.get("status") in DONE_STATUSES:
+                    done.add(entry["id"])
+                else:
+                    done.discard(entry["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+def _source_token(source):
+    """记录提交时的图片版本，写回前确认期间没有在程序中被修改。"""
+    if isinstance(source, image_pack.PackedRef):
+        return ("hash", source.content_hash)
+    if os.path.basename(os.path.dirname(os.path.dirname(source))) == images.STORE_DIR_NAME:
+        return ("hash", os.path.splitext(os.path.basename(source))[0])
+    return ("mtime", source, os.stat(source).st_mtime_ns)
+
+def _still_current(item_id, token, conn):
+    if token[0] == "hash":
+        if conn is None:
+            return False
+        row = conn.execute("SELECT content_hash FROM item_images WHERE item_id=?", (item_id,)).fetchone()
+        return row is not None and row[0] == token[1]
+    try:
+        return os.stat(token[1]).st_mtime_ns == token[2]
+    except OSError:
+        return False
+
+def _format_mb(n):
+    return f"{n / 1024 / 1024:.1f} MB"
+
+def run(data_path, workers=None, trim=True, force=False, restart=False, progress=print):
+    """
+    批量处理数据路径下的全部题目图片，返回各状态的数量。
+    workers 为子进程数（默认 CPU 核数）；restart=True 时忽略日志从头处理。
+    """
+    img_dir = images.get_img_dir(data_path)
+    if not img_dir:
+        raise RuntimeError("未设置数据路径")
+    storage = config.get_image_storage()
+    signature = _job_signature(storage, trim)
+    journal_path = os.path.join(data_path, JOURNAL_NAME)
+    if restart and os.path.exists(journal_path):
+        os.remove(journal_path)
+    done = _load_journal(journal_path, signature)
+    item_ids = sorted(str(i) for i in images.image_ids(img_dir))
+    pending = [i for i in item_ids if i not in done]
+    progress(f"[批量] 共 {len(item_ids)} 张图片，已完成 {len(item_ids) - len(pending)} 张，本次处理 {len(pending)} 张")
+    counts = {}
+    if not pending:
+        return counts
+
+    conn = db.get_conn(show_error=False)
+    workers = workers or os.cpu_count() or 1
+    # 同时在途的任务数：结果带有编码后的字节，限制数量控制内存
+    window = workers * 2
+    max_w, max_h = images.PREVIEW_SIZE
+    tokens = {}
+    in_bytes = out_bytes = 0
+    started = last_report = time.perf_counter()
+    finished = 0
+
+    def tasks():
+        for item_id in pending:
+            source = images.find_image(item_id, img_dir)
+            if not source:
+                continue
+            try:
+                tokens[item_id] = _source_token(source)
+            except OSError:
+                continue
+            yield {"item_id": item_id, "source": source, "storage": storage, "trim": trim,
+                   "force": force, "max_w": max_w, "max_h": max_h}
+
+    def apply(result):
+        item_id = result["item_id"]
+        status = result["status"]
+        if status == "error":
+            return status, result["error"]
+        source = images.find_image(item_id, img_dir)
+        if not source or not _still_current(item_id, tokens.pop(item_id, None), conn):
+            return "changed", "处理期间图片已被修改，下次运行时重新处理"
+        if result["data"] is not None:
+            # 重新编码不改变图片来源，保留导入时的来源哈希
+            source = image_store.store_encoded(
+                item_id, result["ext"], result["data"], result["size"], result["phash"], img_dir, storage,
+                keep_source_hash=True)
+        if result["thumb"] is not None:
+            images.save_thumbnail(item_id, result["thumb"], source, result["size"], max_w, max_h)
+        return status, None
+
+    with open(journal_path, "a", encoding="utf-8") as journal, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        task_iter = tasks()
+        running = set()
+        while True:
+            for task in task_iter:
+                running.add(pool.submit(process_one, task))
+                if len(running) >= window:
+                    break
+            if not running:
+                break
+            completed, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                result = future.result()
+                try:
+                    status, message = apply(result)
+                except Exception as e:
+                    status, message = "error", f"写入失败: {e}"
+                counts[status] = counts.get(status, 0) + 1
+                if message:
+                    progress(f"[批量] 题目 {result['item_id']}: {message}")
+                entry = {"id": result["item_id"], "status": status, "job": signature,
+                         "in": result["in_bytes"], "out": result["out_bytes"],
+                         "ms": round(result["seconds"] * 1000, 1)}
+                if result.get("trimmed"):
+                    entry["trimmed"] = True
+                if message:
+                    entry["error"] = message
+                journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                journal.flush()
+                finished += 1
+                in_bytes += result["in_bytes"]
+                out_bytes += result["out_bytes"] if status in DONE_STATUSES else result["in_bytes"]
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL:
+                last_report = now
+                rate = finished / (now - started)
+                remaining = (len(pending) - finished) / rate if rate else 0
+                progress(f"[批量] {finished}/{len(pending)}  {rate:.1f} 张/秒  "
+                         f"读入 {_format_mb(in_bytes)} 写出 {_format_mb(out_bytes)}  "
+                         f"预计剩余 {int(remaining // 60)}:{int(remaining % 60):02d}")
+
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    summary = "，".join(f"{k} {v}" for k, v in sorted(counts.items()))
+    progress(f"[批量] 完成 {finished} 张，用时 {elapsed:.1f} 秒，{finished / elapsed:.1f} 张/秒，"
+             f"{in_bytes / 1024 / 1024 / elapsed:.1f} MB/秒；大小 {_format_mb(in_bytes)} -> {_format_mb(out_bytes)}（{summary}）")
+    return counts
+
+if __name__ == "__main__":
+    # 用法：python image_batch.py [--workers N] [--no-trim] [--force] [--restart]
+    # 按当前存储设置重新编码全部图片；中断后再次运行从断点继续，--restart 忽略日志从头处理
+    import argparse
+    import multiprocessing
+    import sys
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="批量重新编码题目图片并重建缩略图")
+    parser.add_argument("--workers", type=int, default=None, help="子进程数，默认 CPU 核数")
+    parser.add_argument("--no-trim", action="store_true", help="不裁剪四周纯色边框")
+    parser.add_argument("--force", action="store_true", help="重新编码后变大也写回")
+    parser.add_argument("--restart", action="store_true", help="忽略进度日志，从头处理")
+    args = parser.parse_args()
+    data_path = config.load_settings().get("data_path", "")
+    if not data_path:
+        sys.exit("未设置数据路径，请先在设置中配置")
+    counts = run(data_path, workers=args.workers, trim=not args.no_trim, force=args.force, restart=args.restart)
+    if counts.get("error") or counts.get("changed"):
+        print("部分图片未处理，可再次运行重试")
@@ -0,0 +1,128 @@
+# image_cache.py
+# 进程内共享的图片缓存：解码后的 PIL 图片（缩略图、原图）和 PhotoImage 按最近使用顺序保存，
+# 总占用超过内存预算时淘汰最久未用的；各窗口的预览从这里借用，不再各自保留副本。
+# PhotoImage 单独缓存且只在主线程访问：后台线程放入缩略图时可能触发淘汰，
+# 若淘汰的是 PhotoImage，其析构会在后台线程调用 Tk，因此不能与 PIL 图片共用一个 LRU
+import threading
+from collections import OrderedDict
+
+import config
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # key -> (value, 字节数)
+_bytes = 0
+_budget = None
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# PhotoImage 缓存：id(PIL 图片) -> (PIL 图片, PhotoImage, 字节数)，只在主线程读写，不加锁
+_photos = OrderedDict()
+_photo_bytes = 0
+# PhotoImage 占用内存预算的比例（另计，不挤占 PIL 图片）
+PHOTO_BUDGET_RATIO = 0.25
+
+def image_bytes(img):
+    """估算解码后图片占用的内存。"""
+    w, h = img.size
+    return w * h * max(len(img.getbands()), 1)
+
+def _get_budget():
+    global _budget
+    if _budget is None:
+        _budget = config.get_image_cache_mb() * 1024 * 1024
+    return _budget
+
+def set_budget(max_mb):
+    """修改内存预算（MB），超出部分立即淘汰（需在主线程调用）。"""
+    global _budget
+    with _lock:
+        _budget = int(max_mb) * 1024 * 1024
+        _evict()
+    _evict_photos()
+
+def _evict():
+    global _bytes
+    budget = _get_budget()
+    while _entries and _bytes > budget:
+        _, (_, size) = _entries.popitem(last=False)
+        _bytes -= size
+        _stats["evictions"] += 1
+
+def get(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+def put(key, value, size):
+    """放入缓存；单个对象超过整个预算时不缓存。返回 value。"""
+    global _bytes
+    with _lock:
+        if size > _get_budget():
+            return value
+        old = _entries.pop(key, None)
+        if old is not None:
+            _bytes -= old[1]
+        _entries[key] = (value, size)
+        _bytes += size
+        _evict()
+    return value
+
+def _evict_photos():
+    global _photo_bytes
+    budget = int(_get_budget() * PHOTO_BUDGET_RATIO)
+    while _photos and _photo_bytes > budget:
+        _, (_, _, size) = _photos.popitem(last=False)
+        _photo_bytes -= size
+
+def photo_for(img):
+    """
+    返回 img 对应的 PhotoImage（需在主线程调用）。
+    同一个 PIL 图片对象只创建一次 PhotoImage，多个窗口显示同一缩略图时共用。
+    """
+    global _photo_bytes
+    from PIL import ImageTk
+    key = id(img)
+    entry = _photos.get(key)
+    # 同时引用 img，保证 id 不被复用
+    if entry is not None and entry[0] is img:
+        _photos.move_to_end(key)
+        return entry[1]
+    photo = ImageTk.PhotoImage(img)
+    w, h = img.size
+    size = w * h * 4
+    if entry is not None:
+        _photo_bytes -= entry[2]
+    _photos[key] = (img, photo, size)
+    _photos.move_to_end(key)
+    _photo_bytes += size
+    _evict_photos()
+    return photo
+
+def clear():
+    """清空 PIL 图片缓存；PhotoImage 缓存只在主线程调用时一并清空。"""
+    global _bytes, _photo_bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+    if threading.current_thread() is threading.main_thread():
+        _photos.clear()
+        _photo_bytes = 0
+
+def stats():
+    """命中/未命中/淘汰次数及当前占用，用于设置窗口展示。"""
+    with _lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "evictions": _stats["evictions"],
+            "hit_rate": _stats["hits"] / total if total else 0.0,
+            "entries": len(_entries),
+            "bytes": _bytes,
+            "budget": _get_budget(),
+            "photos": len(_photos),
+            "photo_bytes": _photo_bytes,
+        }
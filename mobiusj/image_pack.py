@@ -0,0 +1,273 @@
+# image_pack.py
+# 图片打包存储：把按内容哈希存储的图片追加写入少量大文件（item_img_store/packs/pack-NNNNN.pack），
+# 位置记录在 image_packs 表，读取时通过 mmap 直接切片，避免数万个小文件拖慢同步、备份和目录列举
+import collections
+import io
+import mmap
+import os
+import threading
+
+import config
+import db
+
+PACK_DIR_NAME = "packs"
+# 单个打包文件超过该大小后新开一个
+PACK_MAX_BYTES = 512 * 1024 * 1024
+
+# 打包图片的位置：pack_path 为打包文件绝对路径，file_ext 用于打包文件缺失时回退到散文件
+PackedRef = collections.namedtuple("PackedRef", "pack_path offset length content_hash file_ext")
+
+def get_pack_dir(store_dir):
+    return os.path.join(store_dir, PACK_DIR_NAME)
+
+def packs_available(conn):
+    return conn is not None and db.table_exists(conn, "image_packs")
+
+# ---------- 读取 ----------
+
+_map_lock = threading.Lock()
+_maps = {}  # 打包文件路径 -> mmap
+
+def _get_map(pack_path, needed):
+    with _map_lock:
+        mm = _maps.get(pack_path)
+        if mm is not None and len(mm) >= needed:
+            return mm
+        # 首次读取或文件已追加新内容：重新映射整个文件；
+        # 旧映射不主动关闭，仍被切片引用时由垃圾回收释放
+        with open(pack_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < needed:
+            raise OSError(f"打包文件 {pack_path} 长度不足，索引可能已损坏")
+        _maps[pack_path] = mm
+        return mm
+
+def read_view(ref):
+    """返回打包图片字节的 memoryview（直接指向映射内存，不复制）。"""
+    mm = _get_map(ref.pack_path, ref.offset + ref.length)
+    return memoryview(mm)[ref.offset:ref.offset + ref.length]
+
+class ViewReader(io.RawIOBase):
+    """
+    memoryview 上的只读文件对象：PIL 从映射内存按块读取解码，
+    每次只复制请求的那一段，不先把整张图片复制成 bytes。
+    """
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"无效的 whence: {whence}")
+        if pos < 0:
+            raise ValueError("seek 位置不能为负")
+        self._pos = pos
+        return pos
+
+    def read(self, size=-1):
+        start = min(self._pos, len(self._view))
+        end = len(self._view) if size is None or size < 0 else min(start + size, len(self._view))
+        self._pos = max(self._pos, end)
+        return self._view[start:end].tobytes()
+
+    def readinto(self, buffer):
+        # 从映射内存直接复制到调用方的缓冲区，不经过中间 bytes
+        start = min(self._pos, len(self._view))
+        n = min(len(buffer), len(self._view) - start)
+        memoryview(buffer).cast("B")[:n] = self._view[start:start + n]
+        self._pos = start + n
+        return n
+
+def open_view(ref):
+    """打包图片的只读文件对象，直接读取映射内存，可传给 PIL 的 Image.open。"""
+    return ViewReader(read_view(ref))
+
+def close_maps():
+    """关闭所有映射（切换数据路径或重写打包文件前调用）。"""
+    with _map_lock:
+        maps = list(_maps.values())
+        _maps.clear()
+    for mm in maps:
+        try:
+            mm.close()
+        except BufferError:
+            pass  # 仍有切片在使用，交给垃圾回收
+
+# ---------- 写入 ----------
+
+def _current_pack(pack_dir, incoming):
+    os.makedirs(pack_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(pack_dir) if name.startswith("pack-") and name.endswith(".pack"))
+    if names:
+        last = names[-1]
+        if os.path.getsize(os.path.join(pack_dir, last)) + incoming <= PACK_MAX_BYTES:
+            return last
+        number = int(last[len("pack-"):-len(".pack")]) + 1
+    else:
+        number = 1
+    return f"pack-{number:05d}.pack"
+
+def lookup(conn, content_hash, store_dir):
+    row = conn.execute(
+        "SELECT pack_file, offset, length FROM image_packs WHERE content_hash=?", (content_hash,)
+    ).fetchone()
+    if row is None:
+        return None
+    return os.path.join(store_dir, row[0]), row[1], row[2]
+
+def append(conn, content_hash, data, store_dir, file_ext=""):
+    """
+    把图片追加到打包文件并登记位置，已打包的内容直接返回原位置。返回 PackedRef。
+    在 BEGIN IMMEDIATE 事务内完成，程序与命令行同时写入时不会交错。
+    """
+    with db.transaction(conn):
+        found = lookup(conn, content_hash, store_dir)
+        if found is not None:
+            return PackedRef(*found, content_hash, file_ext)
+        pack_dir = get_pack_dir(store_dir)
+        pack_name = _current_pack(pack_dir, len(data))
+        pack_path = os.path.join(pack_dir, pack_name)
+        with open(pack_path, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # 事务回滚时追加的字节成为无引用的空洞，不影响读取
+        conn.execute(
+            "INSERT INTO image_packs (content_hash, pack_file, offset, length) VALUES (?, ?, ?, ?)",
+            (content_hash, os.path.join(PACK_DIR_NAME, pack_name), offset, len(data)),
+        )
+    return PackedRef(pack_path, offset, len(data), content_hash, file_ext)
+
+# ---------- 命令行：把现有图片打包 ----------
+
+def pack_existing(data_path, keep_files=False, progress=print):
+    """
+    把 item_img_path 下的散图片和 item_img_store 下的内容文件写入打包文件，
+    登记 item_images 对应关系，读回校验哈希后逐个删除原文件（keep_files=True 时保留）。
+    内容文件在其打包记录提交后、于写事务内删除；已无题目引用的内容文件直接删除。
+    """
+    import hashlib
+    import images
+    import image_store
+
+    conn = db.get_conn(show_error=False)
+    if not packs_available(conn):
+        raise RuntimeError("数据库不可用或尚未升级到支持打包存储的版本")
+    img_dir = images.get_img_dir(data_path)
+    store_dir = images.get_store_dir(data_path)
+    packed = removed = 0
+
+    def pack_bytes(data, ext):
+        content_hash = hashlib.sha256(data).hexdigest()
+        ref = append(conn, content_hash, data, store_dir, ext)
+        if hashlib.sha256(read_view(ref)).hexdigest() != content_hash:
+            raise RuntimeError(f"打包后读回校验失败: {content_hash}")
+        return content_hash
+
+    # 1. item_img_path 下的散图片：原样打包（不重新编码），并补登 item_images
+    if os.path.isdir(img_dir):
+        for entry in sorted(os.scandir(img_dir), key=lambda e: e.name):
+            item_id, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if not entry.is_file() or ext not in images.IMG_EXTS:
+                continue
+            with open(entry.path, "rb") as f:
+                data = f.read()
+            content_hash = pack_bytes(data, ext)
+            width = height = phash = None
+            try:
+                import io
+                from PIL import Image
+                img = Image.open(io.BytesIO(data))
+                img.load()
+                width, height = img.size
+                phash = image_store._to_signed64(images.dhash(img))
+            except Exception as e:
+                progress(f"[打包] {entry.name} 无法解码，仅打包原始字节: {e}")
+            with db.transaction(conn):
+                conn.execute("""
+                    INSERT INTO item_images (item_id, content_hash, file_ext, width, height, phash)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(item_id) DO UPDATE SET
+                        content_hash = excluded.content_hash, file_ext = excluded.file_ext,
+                        width = excluded.width, height = excluded.height, phash = excluded.phash
+                """, (item_id, content_hash, ext, width, height, phash))
+            packed += 1
+            if not keep_files:
+                os.remove(entry.path)
+                removed += 1
+            if packed % 500 == 0:
+                progress(f"[打包] 已处理 {packed} 张")
+
+    def remove_blob(blob, content_hash):
+        # 与 image_store 相同，删除内容文件只在写事务内进行：仍被引用时必须已有提交的打包记录，
+        # 同时写入同一内容的程序会在自己的事务里发现文件不见并重写
+        with db.transaction(conn):
+            referenced = conn.execute(
+                "SELECT 1 FROM item_images WHERE content_hash=? LIMIT 1", (content_hash,)
+            ).fetchone()
+            if referenced and lookup(conn, content_hash, store_dir) is None:
+                return False
+            try:
+                os.remove(blob)
+            except OSError:
+                return False
+        return True
+
+    # 2. item_img_store 下按内容哈希存储的文件：按目录逐个处理，没有题目引用的也一并清理
+    if os.path.isdir(store_dir):
+        for shard in sorted(os.scandir(store_dir), key=lambda e: e.name):
+            if not shard.is_dir() or shard.name == PACK_DIR_NAME:
+                continue
+            for entry in sorted(os.scandir(shard.path), key=lambda e: e.name):
+                content_hash, ext = os.path.splitext(entry.name)
+                if not entry.is_file() or ext.lower() not in images.IMG_EXTS:
+                    continue
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+                if hashlib.sha256(data).hexdigest() != content_hash:
+                    progress(f"[打包] {entry.path} 内容与哈希不符，跳过")
+                    continue
+                referenced = conn.execute(
+                    "SELECT 1 FROM item_images WHERE content_hash=? LIMIT 1", (content_hash,)
+                ).fetchone()
+                if referenced:
+                    pack_bytes(data, ext)
+                    packed += 1
+                if not keep_files and remove_blob(entry.path, content_hash):
+                    removed += 1
+            if not keep_files:
+                try:
+                    os.rmdir(shard.path)
+                except OSError:
+                    pass  # 目录中还有其他文件
+    return packed, removed
+
+if __name__ == "__main__":
+    # 用法：python image_pack.py [--keep-files]
+    # 打包当前数据路径下的全部图片，并把之后新保存的图片也写入打包文件
+    import sys
+    data_path = config.load_settings().get("data_path", "")
+    if not data_path:
+        sys.exit("未设置数据路径，请先在设置中配置")
+    keep = "--keep-files" in sys.argv[1:]
+    packed, removed = pack_existing(data_path, keep_files=keep)
+    config.set_image_storage(content_store=True, packed=True)
+    print(f"打包完成：{packed} 张图片，删除原文件 {removed} 个；之后保存的图片将写入打包文件")
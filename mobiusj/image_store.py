@@ -0,0 +1,314 @@
+# image_store.py
+# 题目图片的写入：按配置的存储编码压缩后，在后台线程写临时文件再替换，保存题目时界面不等待磁盘；
+# 图片按内容哈希去重存储，并以感知哈希分段索引查找近似重复的题目
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import db
+import image_pack
+import images
+
+# 单线程写入，同一题目连续保存时按提交顺序落盘
+_write_executor = None
+_write_lock = threading.Lock()
+
+def _executor():
+    global _write_executor
+    with _write_lock:
+        if _write_executor is None:
+            _write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-store")
+    return _write_executor
+
+def _is_opaque(img):
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] == 255
+    if img.mode == "P" and "transparency" in img.info:
+        return False
+    return True
+
+def _is_grayscale(img, tolerance=24):
+    # 缩小后比较 R/G/B 三个通道的差异，差异都很小说明是黑白文字截图
+    from PIL import ImageChops
+    small = img.convert("RGB")
+    small.thumbnail((128, 128))
+    r, g, b = small.split()
+    return (ImageChops.difference(r, g).getextrema()[1] <= tolerance
+            and ImageChops.difference(g, b).getextrema()[1] <= tolerance)
+
+def normalize(img, storage):
+    """存储前的规范化：去掉多余的 Alpha 通道，可选地转为灰度。"""
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA")
+    if img.mode in ("RGBA", "LA") and _is_opaque(img):
+        img = img.convert("RGB" if img.mode == "RGBA" else "L")
+    if storage.get("grayscale_text") and img.mode in ("RGB", "RGBA") and _is_grayscale(img):
+        img = img.convert("LA" if img.mode == "RGBA" else "L")
+    return img
+
+def encode(img, storage=None):
+    """按存储配置编码图片，返回 (文件后缀, 字节)。"""
+    from PIL import Image
+    if storage is None:
+        storage = config.get_image_storage()
+    codec = storage["codec"]
+    buf = io.BytesIO()
+    if codec == "png":
+        img.save(buf, format="PNG")
+        return ".png", buf.getvalue()
+    img = normalize(img, storage)
+    if codec == "webp":
+        if img.mode == "LA":
+            img = img.convert("RGBA")
+        img.save(buf, format="WEBP", lossless=bool(storage.get("webp_lossless", True)),
+                 quality=int(storage.get("webp_quality", 90)), method=4)
+        return ".webp", buf.getvalue()
+    if codec == "png_palette" and img.mode in ("RGB", "RGBA"):
+        try:
+            method = Image.Quantize.FASTOCTREE
+        except AttributeError:
+            method = getattr(Image, "FASTOCTREE", 2)
+        img = img.quantize(colors=256, method=method)
+    img.save(buf, format="PNG", optimize=True)
+    return ".png", buf.getvalue()
+
+# 近似重复判定：感知哈希的汉明距离不超过该值（分段索引保证距离 <= 7 时不会漏掉）
+NEAR_DUPLICATE_DISTANCE = 6
+PHASH_BANDS = 8
+
+def _to_signed64(value):
+    # SQLite 的 INTEGER 为有符号 64 位
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _to_unsigned64(value):
+    return value + (1 << 64) if value < 0 else value
+
+def _atomic_write(path, data):
+    target_dir = os.path.dirname(path)
+    os.makedirs(target_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".img-", suffix=".tmp", dir=target_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def _remove_loose(item_id, img_dir, keep_ext=None):
+    for ext in images.IMG_EXTS:
+        if ext == keep_ext:
+            continue
+        old_path = os.path.join(img_dir, f"{item_id}{ext}")
+        try:
+            os.remove(old_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[图片] 删除旧图片 {old_path} 失败: {e}")
+
+def _remove_blob_if_unused(conn, content_hash, file_ext, store_dir):
+    # 需在写事务（BEGIN IMMEDIATE）内调用：引用检查与删除之间，其他写入者不能登记对同一内容的引用。
+    # 打包文件中的内容只追加不删除，不再引用的部分留作空洞
+    row = conn.execute("SELECT 1 FROM item_images WHERE content_hash=? LIMIT 1", (content_hash,)).fetchone()
+    if row is None:
+        try:
+            os.remove(images.store_path(content_hash, file_ext, store_dir))
+        except OSError:
+            pass
+
+def _store_conn():
+    conn = db.get_conn(show_error=False)
+    if conn is None or not db.table_exists(conn, "item_images"):
+        return None
+    return conn
+
+def _write_content(item_id, size, phash, ext, data, img_dir, packed=False, source_hash=None, keep_source_hash=False):
+    """
+    写入内容存储并更新 item_images，返回图片位置（文件路径或 PackedRef）；数据库不可用时返回 None。
+    已打包过的相同内容直接复用，不再写文件。
+    source_hash 为导入时原始图片的哈希（非导入保存时为 None）；keep_source_hash=True 时保留原值（批量重新编码）。
+    """
+    conn = _store_conn()
+    store_dir = images.get_store_dir(os.path.dirname(img_dir))
+    if conn is None or not store_dir:
+        return None
+    content_hash = hashlib.sha256(data).hexdigest()
+    found = image_pack.lookup(conn, content_hash, store_dir) if image_pack.packs_available(conn) else None
+    if found is not None:
+        path = image_pack.PackedRef(*found, content_hash, ext)
+    elif packed and image_pack.packs_available(conn):
+        path = image_pack.append(conn, content_hash, data, store_dir, ext)
+    else:
+        path = images.store_path(content_hash, ext, store_dir)
+        if not os.path.exists(path):
+            _atomic_write(path, data)
+    with db.transaction(conn):
+        # 其他写入者可能在上面的检查之后、本事务开始之前删除了同一内容的文件（不再被引用时），
+        # 在事务内再确认一次；删除也只在写事务内进行，登记引用之后就不会再被删
+        if not isinstance(path, image_pack.PackedRef) and not os.path.exists(path):
+            _atomic_write(path, data)
+        old = conn.execute("SELECT content_hash, file_ext FROM item_images WHERE item_id=?", (item_id,)).fetchone()
+        conn.execute("""
+            INSERT INTO item_images (item_id, content_hash, file_ext, width, height, phash, source_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(item_id) DO UPDATE SET
+                content_hash = excluded.content_hash, file_ext = excluded.file_ext,
+                width = excluded.width, height = excluded.height, phash = excluded.phash,
+                source_hash = CASE WHEN ? THEN item_images.source_hash ELSE excluded.source_hash END
+        """, (item_id, content_hash, ext, size[0], size[1], _to_signed64(phash), source_hash, bool(keep_source_hash)))
+        if old and (old[0], old[1]) != (content_hash, ext):
+            _remove_blob_if_unused(conn, old[0], old[1], store_dir)
+    return path
+
+def _forget_content(item_id, img_dir):
+    conn = _store_conn()
+    if conn is None:
+        return
+    with db.transaction(conn):
+        old = conn.execute("SELECT content_hash, file_ext FROM item_images WHERE item_id=?", (item_id,)).fetchone()
+        conn.execute("DELETE FROM item_images WHERE item_id=?", (item_id,))
+        if old:
+            _remove_blob_if_unused(conn, old[0], old[1], images.get_store_dir(os.path.dirname(img_dir)))
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def _record_loose_source(item_id, img_path, source_hash, keep_source_hash):
+    # 散文件的来源哈希记在 image_sources，文件标记与写入后一致时才算未变化
+    conn = db.get_conn(show_error=False)
+    if conn is None or not db.table_exists(conn, "image_sources"):
+        return
+    with db.transaction(conn):
+        if keep_source_hash:
+            conn.execute("UPDATE image_sources SET image_stamp=? WHERE item_id=?", (_file_stamp(img_path), item_id))
+        elif source_hash:
+            conn.execute("""
+                INSERT INTO image_sources (item_id, source_hash, image_stamp) VALUES (?, ?, ?)
+                ON CONFLICT(item_id) DO UPDATE SET source_hash = excluded.source_hash, image_stamp = excluded.image_stamp
+            """, (item_id, source_hash, _file_stamp(img_path)))
+        else:
+            conn.execute("DELETE FROM image_sources WHERE item_id=?", (item_id,))
+
+def loose_source_hash(item_id, img_path):
+    """散文件存储时导入的来源哈希；没有记录或文件已被改写时返回 None。"""
+    conn = db.get_conn(show_error=False)
+    if conn is None or not db.table_exists(conn, "image_sources"):
+        return None
+    row = conn.execute("SELECT source_hash, image_stamp FROM image_sources WHERE item_id=?", (item_id,)).fetchone()
+    try:
+        if row is None or _file_stamp(img_path) != row[1]:
+            return None
+    except OSError:
+        return None
+    return row[0]
+
+def store_encoded(item_id, ext, data, size, phash, img_dir, storage, source_hash=None, keep_source_hash=False):
+    """
+    写入已编码的图片字节（size 为原图尺寸，phash 为 images.dhash 的结果），返回路径或 PackedRef。
+    默认按内容哈希写入 item_img_store（开启 packed 时追加到打包文件），相同字节只存一份；
+    关闭 content_store 或数据库不可用时，写 item_img_path 下的临时文件再替换，来源哈希记在 image_sources。
+    两种方式都会清理该题目的旧文件并更新图片索引，缩略图由调用方负责。
+    """
+    os.makedirs(img_dir, exist_ok=True)
+    img_path = None
+    if storage.get("content_store", True):
+        img_path = _write_content(item_id, size, phash, ext, data, img_dir, packed=storage.get("packed", False),
+                                  source_hash=source_hash, keep_source_hash=keep_source_hash)
+    if img_path is not None:
+        _remove_loose(item_id, img_dir)
+        _record_loose_source(item_id, None, None, False)
+    else:
+        img_path = os.path.join(img_dir, f"{item_id}{ext}")
+        _atomic_write(img_path, data)
+        _remove_loose(item_id, img_dir, keep_ext=ext)
+        _forget_content(item_id, img_dir)
+        _record_loose_source(item_id, img_path, source_hash, keep_source_hash)
+    images.register_image(item_id, img_path)
+    return img_path
+
+def write_item_image(item_id, img, img_dir=None, storage=None, source_hash=None):
+    """
+    编码并写入题目图片，返回写入的路径（在调用线程中执行），同时生成缩略图。
+    source_hash 为外部导入时原始图片字节的哈希，用于识别重复推送。
+    """
+    if img_dir is None:
+        img_dir = images.get_img_dir()
+    if not img_dir:
+        raise RuntimeError("未设置数据路径")
+    if storage is None:
+        storage = config.get_image_storage()
+    ext, data = encode(img, storage)
+    img_path = store_encoded(item_id, ext, data, img.size, images.dhash(img), img_dir, storage, source_hash=source_hash)
+    images.store_thumbnail(item_id, img, img_path)
+    return img_path
+
+def find_similar(img, exclude_id=None, max_distance=NEAR_DUPLICATE_DISTANCE, phash=None):
+    """
+    查找与 img 近似重复的已存题目，返回 [(题目ID, 汉明距离)]，按距离排序。
+    先按感知哈希分段取出候选，再逐个计算汉明距离。
+    """
+    conn = _store_conn()
+    if conn is None:
+        return []
+    if phash is None:
+        phash = images.dhash(img)
+    phash = _to_unsigned64(phash)
+    bands = [(band, (phash >> (8 * band)) & 255) for band in range(PHASH_BANDS)]
+    placeholders = ", ".join(["(?, ?)"] * len(bands))
+    params = [v for pair in bands for v in pair]
+    cursor = conn.execute(f"""
+        SELECT i.item_id, i.phash
+        FROM item_images i
+        WHERE i.item_id IN (
+            SELECT item_id FROM image_phash_bands
+            WHERE (band, band_value) IN (VALUES {placeholders})
+        )
+    """, params)
+    results = []
+    for item_id, other in cursor.fetchall():
+        if item_id == exclude_id or other is None:
+            continue
+        distance = bin(phash ^ _to_unsigned64(other)).count("1")
+        if distance <= max_distance:
+            results.append((item_id, distance))
+    results.sort(key=lambda r: r[1])
+    return results
+
+def save_item_image(item_id, img, widget=None, on_done=None):
+    """
+    在后台保存题目图片，立即返回 Future。
+    传入 widget 时，结束后在主线程调用 on_done(路径, 异常)；未传 on_done 时失败弹窗提示。
+    """
+    img_dir = images.get_img_dir()
+    storage = config.get_image_storage()
+
+    def report(path, error):
+        if on_done is not None:
+            on_done(path, error)
+        elif error is not None:
+            from tkinter import messagebox
+            messagebox.showerror("错误", f"图片保存失败（题目 {item_id}）: {error}")
+
+    def work():
+        try:
+            path, error = write_item_image(item_id, img, img_dir, storage), None
+        except Exception as e:
+            path, error = None, e
+            print(f"[图片] 保存题目 {item_id} 的图片失败: {e}")
+        if widget is not None:
+            try:
+                widget.after(0, lambda: report(path, error))
+            except Exception:
+                pass  # 窗口已关闭，错误已打印
+        return path
+
+    return _executor().submit(work)
@@ -0,0 +1,404 @@
+# images.py
+# 题目图片的读取与缩略图缓存：预览只解码小尺寸缩略图，原图在需要放大时才加载
+# 缩略图放在 data_path/item_thumb_cache/{宽}x{高}/{题目ID}_{原图版本}.png（散文件为 mtime_ns，打包内容为哈希前缀），
+# 原图被覆盖后版本变化，旧缩略图自然失效并在下次生成时清理
+import glob
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import db
+import image_cache
+import image_pack
+
+IMG_DIR_NAME = "item_img_path"
+THUMB_DIR_NAME = "item_thumb_cache"
+# 按内容哈希存储的图片：item_img_store/{哈希前两位}/{哈希}{后缀}，题目与哈希的对应关系在 item_images 表
+STORE_DIR_NAME = "item_img_store"
+IMG_EXTS = [".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"]
+# 各预览区统一的显示尺寸
+PREVIEW_SIZE = (560, 800)
+
+def get_img_dir(data_path=None):
+    if data_path is None:
+        data_path = config.load_settings().get("data_path", "")
+    return os.path.join(data_path, IMG_DIR_NAME) if data_path else ""
+
+def get_store_dir(data_path=None):
+    if data_path is None:
+        data_path = config.load_settings().get("data_path", "")
+    return os.path.join(data_path, STORE_DIR_NAME) if data_path else ""
+
+def store_path(content_hash, file_ext, store_dir=None):
+    if store_dir is None:
+        store_dir = get_store_dir()
+    return os.path.join(store_dir, content_hash[:2], f"{content_hash}{file_ext}") if store_dir else ""
+
+def get_thumb_dir(max_w, max_h, data_path=None):
+    if data_path is None:
+        data_path = config.load_settings().get("data_path", "")
+    return os.path.join(data_path, THUMB_DIR_NAME, f"{int(max_w)}x{int(max_h)}") if data_path else ""
+
+# 后台解码/缩放线程池（解码耗时且会释放 GIL，两个线程足够）
+DECODE_WORKERS = 2
+_executor = None
+_executor_lock = threading.Lock()
+
+def submit(fn, *args):
+    """在后台线程池中执行 fn，返回 Future。"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="images")
+    return _executor.submit(fn, *args)
+
+# ---------- 预览内存缓存与相邻题目预取 ----------
+# 读取/预取的缩略图放进共享图片缓存（按原图版本区分），切到下一题时无需再读盘解码
+
+# 浏览列表时向前、向后各预取的题目数
+PREFETCH_NEIGHBOURS = 3
+
+_preview_lock = threading.Lock()
+_prefetch_executor = None
+_prefetch_token = 0
+_prefetch_futures = []
+
+def _cache_get(key, stamp):
+    return image_cache.get(("thumb",) + key + (stamp,))
+
+def _cache_put(key, stamp, result):
+    image_cache.put(("thumb",) + key + (stamp,), tuple(result), image_cache.image_bytes(result[0]))
+
+def prefetch(item_ids, max_w=PREVIEW_SIZE[0], max_h=PREVIEW_SIZE[1]):
+    """
+    在单独的后台线程中预读题目缩略图到内存缓存（不占用显示用的解码线程）。
+    每次调用都会作废上一批尚未执行的预取，item_ids 应按优先级排列。
+    """
+    global _prefetch_executor, _prefetch_token
+    with _preview_lock:
+        _prefetch_token += 1
+        token = _prefetch_token
+        for future in _prefetch_futures:
+            future.cancel()
+        _prefetch_futures.clear()
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="images-prefetch")
+
+    def work(item_id):
+        if token != _prefetch_token:
+            return
+        try:
+            load_preview(item_id, max_w, max_h)
+        except Exception:
+            pass
+
+    futures = [_prefetch_executor.submit(work, item_id) for item_id in item_ids]
+    with _preview_lock:
+        if token == _prefetch_token:
+            _prefetch_futures.extend(futures)
+
+# ---------- 图片路径索引 ----------
+# 题目ID -> 图片文件名，扫描一次目录建立；目录 mtime 变化（增删、改名）时重建，
+# 每次查找只需 stat 一次目录，而不是逐个扩展名试探文件是否存在
+
+_index_lock = threading.Lock()
+_index = {}
+_index_dir = None
+_index_dir_mtime = None
+
+def _scan(img_dir):
+    index = {}
+    rank = {ext: i for i, ext in enumerate(IMG_EXTS)}
+    with os.scandir(img_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if ext not in rank:
+                continue
+            # 同一题目有多种格式时按 IMG_EXTS 的顺序优先
+            old = index.get(stem)
+            if old is None or rank[ext] < rank[os.path.splitext(old)[1].lower()]:
+                index[stem] = entry.name
+    return index
+
+def _current_index(img_dir):
+    global _index, _index_dir, _index_dir_mtime
+    try:
+        dir_mtime = os.stat(img_dir).st_mtime_ns
+    except OSError:
+        with _index_lock:
+            _index, _index_dir, _index_dir_mtime = {}, img_dir, None
+        return {}
+    with _index_lock:
+        if _index_dir == img_dir and _index_dir_mtime == dir_mtime:
+            return _index
+    index = _scan(img_dir)
+    with _index_lock:
+        _index, _index_dir, _index_dir_mtime = index, img_dir, dir_mtime
+    return index
+
+# 内容存储中的题目图片：题目ID -> 文件路径，取自 item_images 表，数据路径切换后重新读取
+_stored = {}
+_stored_key = None
+
+def _stored_paths():
+    global _stored, _stored_key
+    store_dir = get_store_dir()
+    # item_img_path 有增删（如命令行打包后删除了散文件）时一并重读
+    key = (db.generation(), store_dir, _index_dir_mtime)
+    with _index_lock:
+        if _stored_key == key:
+            return _stored
+    paths = {}
+    conn = db.get_conn(show_error=False)
+    if conn is not None and store_dir and db.table_exists(conn, "item_images"):
+        if image_pack.packs_available(conn):
+            cursor = conn.execute("""
+                SELECT i.item_id, i.content_hash, i.file_ext, p.pack_file, p.offset, p.length
+                FROM item_images i
+                LEFT JOIN image_packs p ON p.content_hash = i.content_hash
+            """)
+        else:
+            cursor = conn.execute("SELECT item_id, content_hash, file_ext, NULL, NULL, NULL FROM item_images")
+        for item_id, content_hash, file_ext, pack_file, offset, length in cursor.fetchall():
+            if pack_file is not None:
+                paths[item_id] = image_pack.PackedRef(os.path.join(store_dir, pack_file), offset, length, content_hash, file_ext)
+            else:
+                paths[item_id] = store_path(content_hash, file_ext, store_dir)
+    with _index_lock:
+        _stored, _stored_key = paths, key
+    return paths
+
+def refresh_index():
+    """丢弃图片索引，下次查找时重新扫描目录、重新读取内容存储的对应关系。"""
+    global _index_dir_mtime, _stored_key
+    with _index_lock:
+        _index_dir_mtime = None
+        _stored_key = None
+
+def register_image(item_id, img_path):
+    """本程序写入图片后登记到索引（覆盖同名文件时目录 mtime 不一定变化）。"""
+    item_id = str(item_id)
+    with _index_lock:
+        if isinstance(img_path, str) and _index_dir == os.path.dirname(img_path):
+            _index[item_id] = os.path.basename(img_path)
+            _stored.pop(item_id, None)
+        else:
+            _stored[item_id] = img_path
+            _index.pop(item_id, None)
+
+def image_ids(img_dir=None):
+    """返回有图片的题目ID集合。"""
+    if img_dir is None:
+        img_dir = get_img_dir()
+    if not img_dir:
+        return set()
+    return set(_current_index(img_dir)) | set(_stored_paths())
+
+def find_image(item_id, img_dir=None):
+    """
+    返回题目图片的位置，不存在时返回 None。
+    先找 item_img_path 下的散文件，再找内容存储；结果为文件路径或 image_pack.PackedRef，
+    统一用 open_image / source_stamp 读取。
+    """
+    if img_dir is None:
+        img_dir = get_img_dir()
+    if not img_dir:
+        return None
+    name = _current_index(img_dir).get(str(item_id))
+    if name:
+        return os.path.join(img_dir, name)
+    return _stored_paths().get(str(item_id))
+
+def source_stamp(source):
+    """图片位置的版本标记：散文件用 mtime_ns，打包内容用哈希前缀（内容不可变）。"""
+    if isinstance(source, image_pack.PackedRef):
+        return source.content_hash[:16]
+    return os.stat(source).st_mtime_ns
+
+def open_image(source):
+    """打开并解码图片；打包图片直接从映射内存解码，打包文件不可读时回退到同一内容的散文件。"""
+    from PIL import Image
+    if isinstance(source, image_pack.PackedRef):
+        try:
+            img = Image.open(image_pack.open_view(source))
+        except OSError:
+            store_dir = os.path.dirname(os.path.dirname(source.pack_path))
+            img = Image.open(store_path(source.content_hash, source.file_ext, store_dir))
+    else:
+        img = Image.open(source)
+    img.load()
+    return img
+
+def source_key(source):
+    if isinstance(source, image_pack.PackedRef):
+        return f"pack:{source.content_hash}"
+    return source
+
+def load_original(source):
+    """解码原图并放入共享缓存，多个窗口、弹窗共用同一份，调用方不要修改。"""
+    key = ("original", source_key(source), source_stamp(source))
+    img = image_cache.get(key)
+    if img is None:
+        img = open_image(source)
+        image_cache.put(key, img, image_cache.image_bytes(img))
+    return img
+
+def _resample():
+    from PIL import Image
+    try:
+        return Image.Resampling.LANCZOS
+    except AttributeError:
+        return getattr(Image, 'LANCZOS', Image.BICUBIC)
+
+def fit_size(size, max_w, max_h):
+    w, h = size
+    scale = min(max_w / w, max_h / h, 1)
+    return max(int(w * scale), 1), max(int(h * scale), 1)
+
+def resize_to_fit(img, max_w=PREVIEW_SIZE[0], max_h=PREVIEW_SIZE[1]):
+    """等比缩小到不超过 max_w x max_h，小图原样返回。"""
+    new_size = fit_size(img.size, max_w, max_h)
+    if new_size == img.size:
+        return img
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA")
+    return img.resize(new_size, _resample())
+
+def dhash(img, hash_size=8):
+    """
+    64 位差值感知哈希：缩成 9x8 灰度图，比较每行相邻像素的明暗。
+    重新截图、缩放或轻微压缩后哈希几乎不变，汉明距离小即视为近似重复。
+    """
+    from PIL import Image
+    try:
+        box = Image.Resampling.BOX
+    except AttributeError:
+        box = getattr(Image, 'BOX', Image.BILINEAR)
+    if img.mode in ("RGBA", "LA", "P"):
+        # 透明部分按白底处理，与截图的背景一致
+        rgba = img.convert("RGBA")
+        bg = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        bg.alpha_composite(rgba)
+        img = bg
+    small = img.convert("L").resize((hash_size + 1, hash_size), box)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+def _thumb_path(item_id, stamp, max_w, max_h, data_path=None):
+    thumb_dir = get_thumb_dir(max_w, max_h, data_path)
+    return os.path.join(thumb_dir, f"{item_id}_{stamp}.png") if thumb_dir else ""
+
+def _remove_stale(item_id, keep_path):
+    pattern = os.path.join(glob.escape(os.path.dirname(keep_path)), f"{glob.escape(str(item_id))}_*.png")
+    for path in glob.glob(pattern):
+        if path != keep_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _write_thumbnail(thumb, path, source_size):
+    from PIL.PngImagePlugin import PngInfo
+    info = PngInfo()
+    # 原图尺寸写进 PNG 文本块，显示“尺寸”时不必再打开原图
+    info.add_text("source_size", f"{source_size[0]}x{source_size[1]}")
+    thumb_dir = os.path.dirname(path)
+    os.makedirs(thumb_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".thumb-", suffix=".tmp", dir=thumb_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            thumb.save(f, format="PNG", pnginfo=info)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def store_thumbnail(item_id, img, img_path=None, max_w=PREVIEW_SIZE[0], max_h=PREVIEW_SIZE[1]):
+    """
+    保存题目图片后立即生成缩略图（img 为已在内存中的原图）。
+    原图本身不超过预览尺寸时不生成，直接读原图即可。
+    """
+    if img_path is None:
+        img_path = find_image(item_id)
+    if not img_path:
+        return None
+    if fit_size(img.size, max_w, max_h) == img.size:
+        return None
+    return save_thumbnail(item_id, resize_to_fit(img, max_w, max_h), img_path, img.size, max_w, max_h)
+
+def save_thumbnail(item_id, thumb, img_path, source_size, max_w=PREVIEW_SIZE[0], max_h=PREVIEW_SIZE[1]):
+    """写入已缩放好的缩略图（批量处理时缩放在子进程中完成），并清理旧缩略图。"""
+    try:
+        path = _thumb_path(item_id, source_stamp(img_path), max_w, max_h)
+        if not path:
+            return None
+        _write_thumbnail(thumb, path, source_size)
+        _remove_stale(item_id, path)
+        return thumb
+    except Exception as e:
+        print(f"[缩略图] 生成 {item_id} 的缩略图失败: {e}")
+        return None
+
+def load_preview(item_id, max_w=PREVIEW_SIZE[0], max_h=PREVIEW_SIZE[1]):
+    """
+    读取题目预览图，返回 (缩略图, 原图路径, 原图尺寸)；题目没有图片时返回 None。
+    依次查找内存缓存、缩略图文件，都未命中时解码原图一次并写入缓存。
+    返回的缩略图可能被多个窗口共用，调用方不要修改。
+    """
+    from PIL import Image
+    img_path = find_image(item_id)
+    if not img_path:
+        return None
+    try:
+        stamp = source_stamp(img_path)
+    except FileNotFoundError:
+        # 索引建立后文件被删除，或被其他进程（如批量重新编码）替换：重读索引后再试一次
+        refresh_index()
+        img_path = find_image(item_id)
+        if not img_path:
+            return None
+        try:
+            stamp = source_stamp(img_path)
+        except FileNotFoundError:
+            return None
+    key = (str(item_id), max_w, max_h)
+    cached = _cache_get(key, stamp)
+    if cached is not None:
+        return cached
+    path = _thumb_path(item_id, stamp, max_w, max_h)
+    if path:
+        # 直接尝试打开，不先判断文件是否存在，省一次元数据访问
+        try:
+            thumb = Image.open(path)
+            thumb.load()
+            source_size = tuple(int(v) for v in thumb.info["source_size"].split("x"))
+            result = (thumb, img_path, source_size)
+            _cache_put(key, stamp, result)
+            return result
+        except FileNotFoundError:
+            pass
+        except Exception:
+            pass  # 缓存文件损坏则重新生成
+    img = open_image(img_path)
+    thumb = resize_to_fit(img, max_w, max_h)
+    if path and thumb is not img:
+        try:
+            _write_thumbnail(thumb, path, img.size)
+            _remove_stale(item_id, path)
+        except Exception as e:
+            print(f"[缩略图] 写入 {item_id} 的缩略图失败: {e}")
+    result = (thumb, img_path, img.size)
+    _cache_put(key, stamp, result)
+    return result
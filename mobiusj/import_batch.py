@@ -0,0 +1,110 @@
+# import_batch.py
+# 本地导入服务的批量请求解析：一次请求携带多道题目，图片为原始字节，
+# 请求体只读入一次，各图片以 memoryview 切片直接写入导入队列，不经过 base64 和 JSON
+#
+# 支持两种请求体：
+# 1. multipart/form-data：字段 token（可选，也可放在请求头 X-Import-Token），
+#    之后按顺序重复 “id 文本字段 + image 文件字段”；image 前没有 id 时用文件名（去掉后缀）作为题目ID
+# 2. application/x-mobius-import（或 application/octet-stream）：token 放在请求头 X-Import-Token，
+#    请求体为连续的记录，每条为 2 字节ID长度 + ID（UTF-8）+ 4 字节图片长度 + 图片字节，长度均为大端
+import io
+import os
+import re
+import struct
+
+STREAM_CONTENT_TYPES = ("application/x-mobius-import", "application/octet-stream")
+TOKEN_HEADER = "X-Import-Token"
+
+_ID_LEN = struct.Struct(">H")
+_IMAGE_LEN = struct.Struct(">I")
+_PARAM_RE = re.compile(r'(\w+)\s*=\s*(?:"([^"]*)"|([^;\s]+))')
+
+def _params(header_value):
+    return {m.group(1).lower(): m.group(2) if m.group(2) is not None else m.group(3)
+            for m in _PARAM_RE.finditer(header_value)}
+
+def parse_stream(buf):
+    """解析长度前缀格式，返回 [(题目ID, 图片 memoryview)]。"""
+    view = memoryview(buf)
+    items = []
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        if pos + _ID_LEN.size > end:
+            raise ValueError(f"第 {len(items) + 1} 条记录的ID长度不完整")
+        (id_len,) = _ID_LEN.unpack_from(buf, pos)
+        pos += _ID_LEN.size
+        if pos + id_len + _IMAGE_LEN.size > end:
+            raise ValueError(f"第 {len(items) + 1} 条记录的ID不完整")
+        question_id = bytes(view[pos:pos + id_len]).decode("utf-8")
+        pos += id_len
+        (image_len,) = _IMAGE_LEN.unpack_from(buf, pos)
+        pos += _IMAGE_LEN.size
+        if pos + image_len > end:
+            raise ValueError(f"题目 {question_id} 的图片数据不完整")
+        items.append((question_id, view[pos:pos + image_len]))
+        pos += image_len
+    return items
+
+def parse_multipart(buf, boundary):
+    """解析 multipart/form-data，返回 (token, [(题目ID, 图片 memoryview)])。"""
+    view = memoryview(buf)
+    delimiter = b"--" + boundary
+    pos = buf.find(delimiter)
+    if pos < 0:
+        raise ValueError("找不到 multipart 边界")
+    token = None
+    current_id = None
+    items = []
+    while True:
+        pos += len(delimiter)
+        if buf[pos:pos + 2] == b"--":
+            break
+        if buf[pos:pos + 2] != b"\r\n":
+            raise ValueError("multipart 边界格式错误")
+        pos += 2
+        header_end = buf.find(b"\r\n\r\n", pos)
+        if header_end < 0:
+            raise ValueError("multipart 分段头不完整")
+        disposition = {}
+        for line in bytes(view[pos:header_end]).decode("utf-8", "replace").split("\r\n"):
+            key, _, value = line.partition(":")
+            if key.strip().lower() == "content-disposition":
+                disposition = _params(value)
+        body_start = header_end + 4
+        next_pos = buf.find(b"\r\n" + delimiter, body_start)
+        if next_pos < 0:
+            raise ValueError("multipart 缺少结束边界")
+        body = view[body_start:next_pos]
+        name = disposition.get("name", "")
+        if name == "token":
+            token = bytes(body).decode("utf-8").strip()
+        elif name == "id":
+            current_id = bytes(body).decode("utf-8").strip()
+        elif name == "image" or "filename" in disposition:
+            question_id = current_id
+            if not question_id:
+                question_id = os.path.splitext(disposition.get("filename") or "")[0]
+            items.append((question_id, body))
+            current_id = None
+        pos = next_pos + 2
+    return token, items
+
+def parse_batch(buf, content_type):
+    """按 Content-Type 解析批量请求体，返回 (请求体中的 token 或 None, [(题目ID, 图片 memoryview)])。"""
+    media_type, _, rest = (content_type or "").partition(";")
+    media_type = media_type.strip().lower()
+    if media_type == "multipart/form-data":
+        boundary = _params(rest).get("boundary")
+        if not boundary:
+            raise ValueError("multipart 请求缺少 boundary")
+        return parse_multipart(buf, boundary.encode("latin-1"))
+    if media_type in STREAM_CONTENT_TYPES:
+        return None, parse_stream(buf)
+    raise ValueError(f"不支持的 Content-Type: {content_type}")
+
+def probe_image(data):
+    """只解析图片文件头（不解码像素），返回 (格式, 尺寸)；不是可识别的图片时抛出异常。完整解码由导入队列的后台线程完成。"""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        return img.format, img.size
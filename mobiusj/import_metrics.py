@@ -0,0 +1,169 @@
+# import_metrics.py
+# 导入服务的运行指标：按状态码统计请求数、请求体大小与处理耗时分布、
+# 从收到请求到图片入库的端到端耗时、后台各阶段（解码、查重、保存）耗时，以及最近一次错误。
+# 由导入服务的 GET /metrics（Prometheus 文本格式或 JSON）和 GET /health 输出
+import bisect
+import threading
+import time
+
+# 请求体大小分桶（字节）
+SIZE_BUCKETS = (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024)
+# 耗时分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 端到端耗时只跟踪最近这么多条尚未处理完的条目，防止队列积压时无限增长
+MAX_TRACKED = 10000
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """[(上界, 累计数)]，上界 None 表示 +Inf。"""
+        result = []
+        total = 0
+        for bound, n in zip(list(self.buckets) + [None], self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "buckets": {("+Inf" if bound is None else str(bound)): n for bound, n in self.cumulative()},
+        }
+
+_lock = threading.Lock()
+_started = time.time()
+_requests = {}      # (路径, 状态码) -> 次数
+_items = {}         # 结果 -> 条数：queued / stored / failed / rejected / unchanged / duplicate
+_request_bytes = Histogram(SIZE_BUCKETS)
+_request_seconds = Histogram(LATENCY_BUCKETS)
+_end_to_end = Histogram(LATENCY_BUCKETS)
+_stages = {}        # 阶段 -> Histogram
+_enqueued_at = {}   # 队列ID -> 收到请求的时刻（monotonic）
+_last_error = None
+
+def record_request(path, status, size, seconds):
+    with _lock:
+        key = (path, int(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        _request_bytes.observe(size)
+        _request_seconds.observe(seconds)
+
+def count_item(result, n=1):
+    with _lock:
+        _items[result] = _items.get(result, 0) + n
+
+def observe_stage(stage, seconds):
+    with _lock:
+        hist = _stages.get(stage)
+        if hist is None:
+            hist = _stages[stage] = Histogram(LATENCY_BUCKETS)
+        hist.observe(seconds)
+
+def mark_enqueued(queue_id, started=None):
+    """记录一条入队；started 为收到请求头的时刻（time.monotonic()），端到端耗时从这里算起，缺省为当前时刻。"""
+    count_item("queued")
+    with _lock:
+        if len(_enqueued_at) >= MAX_TRACKED:
+            _enqueued_at.pop(next(iter(_enqueued_at)))
+        _enqueued_at[queue_id] = time.monotonic() if started is None else started
+
+def mark_processed(queue_id, ok):
+    """后台线程处理完一条：记录结果，并在知道收到时刻时记录端到端耗时。"""
+    count_item("stored" if ok else "failed")
+    with _lock:
+        started = _enqueued_at.pop(queue_id, None)
+        if started is not None and ok:
+            _end_to_end.observe(time.monotonic() - started)
+
+def record_error(where, message):
+    global _last_error
+    with _lock:
+        _last_error = {"where": where, "message": str(message), "time": time.time()}
+
+def last_error():
+    with _lock:
+        return dict(_last_error) if _last_error else None
+
+def uptime():
+    return time.time() - _started
+
+def snapshot(gauges=None):
+    """当前全部指标（JSON 输出用）；gauges 为调用方提供的即时值，如队列深度。"""
+    with _lock:
+        return {
+            "uptime_seconds": round(uptime(), 3),
+            "requests": [{"path": path, "status": status, "count": n}
+                         for (path, status), n in sorted(_requests.items())],
+            "items": dict(_items),
+            "request_bytes": _request_bytes.to_dict(),
+            "request_seconds": _request_seconds.to_dict(),
+            "end_to_end_seconds": _end_to_end.to_dict(),
+            "stage_seconds": {stage: hist.to_dict() for stage, hist in sorted(_stages.items())},
+            "gauges": dict(gauges or {}),
+            "last_error": dict(_last_error) if _last_error else None,
+        }
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def _render_histograms(lines, name, help_text, series):
+    # series 为 [(标签字典, Histogram)]，同名指标只输出一次 HELP/TYPE
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, hist in series:
+        for bound, n in hist.cumulative():
+            le = "+Inf" if bound is None else repr(float(bound))
+            lines.append(f"{name}_bucket{_labels(**labels, le=le)} {n}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+
+def render_prometheus(gauges=None):
+    """Prometheus 文本格式。"""
+    lines = []
+    with _lock:
+        lines.append("# HELP mobius_import_uptime_seconds 导入服务运行时长")
+        lines.append("# TYPE mobius_import_uptime_seconds gauge")
+        lines.append(f"mobius_import_uptime_seconds {uptime():.3f}")
+        lines.append("# HELP mobius_import_requests_total 按路径和状态码统计的请求数")
+        lines.append("# TYPE mobius_import_requests_total counter")
+        for (path, status), n in sorted(_requests.items()):
+            lines.append(f"mobius_import_requests_total{_labels(path=path, status=status)} {n}")
+        lines.append("# HELP mobius_import_items_total 导入题目按结果统计的条数")
+        lines.append("# TYPE mobius_import_items_total counter")
+        for result, n in sorted(_items.items()):
+            lines.append(f"mobius_import_items_total{_labels(result=result)} {n}")
+        _render_histograms(lines, "mobius_import_request_bytes", "请求体大小（字节）", [({}, _request_bytes)])
+        _render_histograms(lines, "mobius_import_request_seconds", "导入服务处理单个请求的耗时", [({}, _request_seconds)])
+        _render_histograms(lines, "mobius_import_end_to_end_seconds", "从收到题目到图片入库的耗时", [({}, _end_to_end)])
+        if _stages:
+            _render_histograms(lines, "mobius_import_stage_seconds", "各处理阶段耗时",
+                               [({"stage": stage}, hist) for stage, hist in sorted(_stages.items())])
+        for key, value in sorted((gauges or {}).items()):
+            lines.append(f"# TYPE mobius_import_{key} gauge")
+            lines.append(f"mobius_import_{key} {value}")
+        if _last_error:
+            lines.append("# HELP mobius_import_last_error_timestamp_seconds 最近一次错误的时间，标签中为错误信息")
+            lines.append("# TYPE mobius_import_last_error_timestamp_seconds gauge")
+            labels = _labels(where=_last_error["where"], message=_last_error["message"][:200])
+            lines.append(f"mobius_import_last_error_timestamp_seconds{labels} {_last_error['time']:.3f}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,377 @@
+# import_queue.py
+# 外部导入队列：导入服务收到的题目先把原始图片暂存到 import_spool 并登记到 import_queue 表，
+# 由后台线程解码、规范化并保存图片、建立待审阅的题目记录，不再驱动录入窗口；
+# 界面只收到合并后的“N 条新导入”通知，在审阅列表中逐条打开录入。
+# 同一题目重复推送相同图片时按图片哈希直接判定为未变化，不再入队。
+# 程序退出时未处理完的条目，下次启动后继续处理
+import hashlib
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import config
+import db
+import image_store
+import import_metrics
+
+SPOOL_DIR_NAME = "import_spool"
+# 连续导入时合并通知：第一条处理完后等待该时间再刷新界面
+NOTIFY_DELAY_MS = 300
+
+QUEUED = "queued"
+PENDING = "pending"
+FAILED = "failed"
+REVIEWED = "reviewed"
+
+def get_spool_dir(data_path=None):
+    if data_path is None:
+        data_path = config.load_settings().get("data_path", "")
+    return os.path.join(data_path, SPOOL_DIR_NAME) if data_path else ""
+
+def valid_item_id(item_id):
+    """与录入窗口相同的题目ID规则：字母、数字或“-”，不超过 64 个字符。"""
+    return bool(item_id) and len(item_id) <= 64 and all(c.isalnum() or c == "-" for c in item_id)
+
+def _queue_conn():
+    conn = db.get_conn(show_error=False)
+    if conn is None or not db.table_exists(conn, "import_queue"):
+        return None
+    return conn
+
+def database_ready():
+    return _queue_conn() is not None
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+# 待处理的条目数：入队时加一，后台线程每处理一条后按数据库重新统计；导入服务据此判断队列是否已满
+_depth_lock = threading.Lock()
+_depth = 0
+
+def depth():
+    return _depth
+
+def _add_depth(n):
+    global _depth
+    with _depth_lock:
+        _depth += n
+
+def _recount_depth(conn):
+    global _depth
+    n = conn.execute("SELECT COUNT(*) FROM import_queue WHERE status=?", (QUEUED,)).fetchone()[0]
+    with _depth_lock:
+        _depth = n
+
+# ---------- 重复推送检查 ----------
+
+# check_duplicate 的结果
+UNCHANGED = "unchanged"   # 已导入，图片与上次相同
+DUPLICATE = "duplicate"   # 相同图片已在队列中等待处理
+UPDATED = "updated"       # 题目已有图片，本次图片不同
+NEW = "new"
+FULL = "full"             # 队列已满，未入队
+
+# 已通过检查、正在写暂存文件和登记的 (题目ID, 图片哈希)；锁只保护检查与预留，写盘在锁外进行
+_submit_lock = threading.Lock()
+_reserved = set()
+
+def source_hash(data):
+    """导入图片原始字节的哈希，用于识别重复推送。"""
+    return hashlib.sha256(data).hexdigest()
+
+def check_duplicate(item_id, digest):
+    """
+    按 (题目ID, 图片哈希) 判断本次推送是否重复，返回 (结果, 队列ID)。
+    只查索引，不读图片；以该题目最后一条仍在排队的条目为准，没有时再比较已保存图片的来源哈希
+    （内容存储记在 item_images，散文件记在 image_sources）。
+    """
+    conn = _queue_conn()
+    if conn is None:
+        return NEW, None
+    row = conn.execute(
+        "SELECT queue_id, source_hash FROM import_queue WHERE item_id=? AND status=? ORDER BY queue_id DESC LIMIT 1",
+        (item_id, QUEUED),
+    ).fetchone()
+    if row is not None:
+        return (DUPLICATE, row[0]) if row[1] == digest else (UPDATED, None)
+    # 题目被删除时图片记录仍保留，此时需要重新导入以恢复题目记录
+    stored = conn.execute("""
+        SELECT m.source_hash, EXISTS(SELECT 1 FROM items WHERE item_id = m.item_id)
+        FROM item_images m WHERE m.item_id=?
+    """, (item_id,)).fetchone()
+    if stored is None:
+        # 散文件存储：来源哈希记在 image_sources
+        import images
+        img_path = images.find_image(item_id)
+        if not img_path:
+            return NEW, None
+        exists = conn.execute("SELECT 1 FROM items WHERE item_id=?", (item_id,)).fetchone()
+        if exists and image_store.loose_source_hash(item_id, img_path) == digest:
+            return UNCHANGED, None
+        return UPDATED, None
+    if stored[0] == digest and stored[1]:
+        return UNCHANGED, None
+    return UPDATED, None
+
+def submit(item_id, data, digest, max_depth=None, received=None):
+    """
+    检查重复后入队，返回 (结果, 队列ID)；结果为 UNCHANGED、DUPLICATE 或 FULL 时不入队。
+    检查与预留在同一把锁内，同一题目的并发重复推送只会入队一次（后到的返回 DUPLICATE，队列ID 为 None）；
+    max_depth 不为 None 时，待处理条目加上已预留的条目达到该数量则返回 FULL；received 见 enqueue。
+    """
+    key = (item_id, digest)
+    with _submit_lock:
+        if key in _reserved:
+            return DUPLICATE, None
+        result, queue_id = check_duplicate(item_id, digest)
+        if result in (UNCHANGED, DUPLICATE):
+            return result, queue_id
+        if max_depth is not None and depth() + len(_reserved) >= max_depth:
+            return FULL, None
+        _reserved.add(key)
+    try:
+        return result, enqueue(item_id, data, digest, received)
+    finally:
+        # enqueue 已把本条计入 depth，释放预留只会让计数短暂偏大，不会放行超出上限的推送
+        with _submit_lock:
+            _reserved.discard(key)
+
+# ---------- 入队（导入服务线程调用） ----------
+
+def enqueue(item_id, data, digest=None, received=None):
+    """
+    暂存一道导入的题目并唤醒后台线程，返回队列ID。
+    data 为图片原始字节（可以是请求缓冲区的 memoryview，直接写盘不复制），digest 为 source_hash(data)；
+    received 为导入服务收到请求头的时刻（time.monotonic()），用于统计端到端耗时。
+    """
+    conn = _queue_conn()
+    spool_dir = get_spool_dir()
+    if conn is None or not spool_dir:
+        raise RuntimeError("数据库不可用或尚未升级到支持导入队列的版本")
+    spool_file = f"{uuid.uuid4().hex}.img"
+    started = time.perf_counter()
+    image_store._atomic_write(os.path.join(spool_dir, spool_file), data)
+    try:
+        with db.transaction(conn):
+            cursor = conn.execute(
+                "INSERT INTO import_queue (item_id, status, spool_file, received_at, source_hash) VALUES (?, ?, ?, ?, ?)",
+                (item_id, QUEUED, spool_file, _now(), digest),
+            )
+    except BaseException:
+        _remove_spool(spool_dir, spool_file)
+        raise
+    import_metrics.observe_stage("spool", time.perf_counter() - started)
+    import_metrics.mark_enqueued(cursor.lastrowid, started=received)
+    _add_depth(1)
+    _wake()
+    return cursor.lastrowid
+
+def _remove_spool(spool_dir, spool_file):
+    if not spool_file:
+        return
+    try:
+        os.remove(os.path.join(spool_dir, spool_file))
+    except OSError:
+        pass
+
+# ---------- 后台处理 ----------
+
+_cond = threading.Condition()
+_wakeup = False
+_worker = None
+_root = None
+
+def _wake():
+    global _wakeup
+    with _cond:
+        _wakeup = True
+        _cond.notify()
+
+def start(root):
+    """启动后台处理线程（主窗口创建后调用一次），并处理上次未完成的条目。"""
+    global _worker, _root
+    _root = root
+    with _cond:
+        if _worker is None:
+            _worker = threading.Thread(target=_run, name="import-queue", daemon=True)
+            _worker.start()
+    _wake()
+
+def worker_alive():
+    return _worker is not None and _worker.is_alive()
+
+def _run():
+    global _wakeup
+    while True:
+        with _cond:
+            while not _wakeup:
+                _cond.wait()
+            _wakeup = False
+        try:
+            while process_next():
+                pass
+        except Exception as e:
+            print(f"[导入] 处理导入队列时出错: {e}")
+            import_metrics.record_error("queue", e)
+
+def process_next():
+    """处理最早的一条待处理条目，没有待处理条目时返回 False。"""
+    conn = _queue_conn()
+    if conn is None:
+        return False
+    row = conn.execute(
+        "SELECT queue_id, item_id, spool_file, source_hash FROM import_queue WHERE status=? ORDER BY queue_id LIMIT 1",
+        (QUEUED,),
+    ).fetchone()
+    if row is None:
+        _recount_depth(conn)
+        return False
+    queue_id, item_id, spool_file, digest = row
+    spool_dir = get_spool_dir()
+    try:
+        from PIL import Image
+        started = time.perf_counter()
+        img = Image.open(os.path.join(spool_dir, spool_file))
+        img.load()
+        decoded = time.perf_counter()
+        similar = [other for other, _ in image_store.find_similar(img, exclude_id=item_id)]
+        checked = time.perf_counter()
+        image_store.write_item_image(item_id, img, source_hash=digest)
+        stored = time.perf_counter()
+        import_metrics.observe_stage("decode", decoded - started)
+        import_metrics.observe_stage("similar", checked - decoded)
+        import_metrics.observe_stage("store", stored - checked)
+        with db.transaction(conn):
+            # 待审阅的题目：只建立题目记录，难度、标签在审阅时录入
+            conn.execute("INSERT INTO items (item_id) VALUES (?) ON CONFLICT(item_id) DO NOTHING", (item_id,))
+            conn.execute(
+                "UPDATE import_queue SET status=?, spool_file=NULL, processed_at=?, similar=?, error=NULL WHERE queue_id=?",
+                (PENDING, _now(), ",".join(similar[:5]) or None, queue_id),
+            )
+        _remove_spool(spool_dir, spool_file)
+        import_metrics.mark_processed(queue_id, True)
+    except Exception as e:
+        print(f"[导入] 题目 {item_id} 处理失败: {e}")
+        import_metrics.mark_processed(queue_id, False)
+        import_metrics.record_error("queue", f"题目 {item_id}: {e}")
+        with db.transaction(conn):
+            conn.execute(
+                "UPDATE import_queue SET status=?, processed_at=?, error=? WHERE queue_id=?",
+                (FAILED, _now(), str(e), queue_id),
+            )
+    _recount_depth(conn)
+    _queue_notify(item_id)
+    return True
+
+# ---------- 界面通知（合并后在主线程执行） ----------
+
+_notify_lock = threading.Lock()
+_notify_items = []
+_notify_scheduled = False
+_listeners = []
+
+def subscribe(callback):
+    """订阅队列变化，callback(counts) 在主线程调用。返回取消订阅的函数。"""
+    _listeners.append(callback)
+    def unsubscribe():
+        if callback in _listeners:
+            _listeners.remove(callback)
+    return unsubscribe
+
+def _queue_notify(item_id=None):
+    global _notify_scheduled
+    with _notify_lock:
+        if item_id is not None:
+            _notify_items.append(item_id)
+        if _notify_scheduled or _root is None:
+            return
+        _notify_scheduled = True
+    try:
+        _root.after(NOTIFY_DELAY_MS, _flush)
+    except Exception:
+        with _notify_lock:
+            _notify_scheduled = False  # 主窗口已关闭
+
+def _flush():
+    global _notify_scheduled
+    import catalog
+    with _notify_lock:
+        item_ids = list(dict.fromkeys(_notify_items))
+        _notify_items.clear()
+        _notify_scheduled = False
+    # 共享目录缓存只在主线程修改，合并后只通知一次
+    try:
+        catalog.refresh_items(item_ids)
+    except Exception as e:
+        print(f"[导入] 同步题目到目录缓存失败: {e}")
+    current = counts()
+    for callback in list(_listeners):
+        try:
+            callback(current)
+        except Exception as e:
+            print(f"[导入] 刷新导入通知时出错: {e}")
+
+def counts():
+    """各状态的条目数，如 {"queued": 0, "pending": 3, "failed": 1}。"""
+    result = {QUEUED: 0, PENDING: 0, FAILED: 0}
+    conn = _queue_conn()
+    if conn is None:
+        return result
+    for status, n in conn.execute(
+        "SELECT status, COUNT(*) FROM import_queue WHERE status IN (?, ?, ?) GROUP BY status",
+        (QUEUED, PENDING, FAILED),
+    ):
+        result[status] = n
+    return result
+
+# ---------- 审阅列表 ----------
+
+def list_entries(statuses=(PENDING, FAILED, QUEUED)):
+    """返回待审阅的条目 [{"queue_id", "item_id", "status", "received_at", "similar", "error"}]，按接收顺序。"""
+    conn = _queue_conn()
+    if conn is None:
+        return []
+    placeholders = ", ".join("?" * len(statuses))
+    cursor = conn.execute(f"""
+        SELECT queue_id, item_id, status, received_at, similar, error
+        FROM import_queue WHERE status IN ({placeholders}) ORDER BY queue_id
+    """, tuple(statuses))
+    keys = ("queue_id", "item_id", "status", "received_at", "similar", "error")
+    return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+def mark_reviewed(queue_ids):
+    """标记为已审阅，失败条目的暂存图片一并删除。"""
+    conn = _queue_conn()
+    if conn is None or not queue_ids:
+        return
+    placeholders = ", ".join("?" * len(queue_ids))
+    with db.transaction(conn):
+        spool_files = [r[0] for r in conn.execute(
+            f"SELECT spool_file FROM import_queue WHERE queue_id IN ({placeholders}) AND status != ?",
+            (*queue_ids, QUEUED),
+        )]
+        conn.execute(
+            f"UPDATE import_queue SET status=?, spool_file=NULL WHERE queue_id IN ({placeholders}) AND status != ?",
+            (REVIEWED, *queue_ids, QUEUED),
+        )
+    spool_dir = get_spool_dir()
+    for spool_file in spool_files:
+        _remove_spool(spool_dir, spool_file)
+    _queue_notify()
+
+def retry(queue_ids):
+    """把失败的条目重新放回队列。"""
+    conn = _queue_conn()
+    if conn is None or not queue_ids:
+        return
+    placeholders = ", ".join("?" * len(queue_ids))
+    with db.transaction(conn):
+        conn.execute(
+            f"UPDATE import_queue SET status=?, error=NULL WHERE queue_id IN ({placeholders}) AND status=? AND spool_file IS NOT NULL",
+            (QUEUED, *queue_ids, FAILED),
+        )
+    _recount_depth(conn)
+    _wake()
+    _queue_notify()
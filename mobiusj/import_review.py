@@ -0,0 +1,158 @@
+# import_review.py
+# 外部导入的审阅界面：主窗口上的“N 条新导入”提示按钮，
+# 以及待审阅列表（预览图片、打开录入窗口补充标签、标记已审阅、重试失败条目）
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import feature1
+import import_queue
+from widgets.image_frame import ImageFrame, treeview_neighbours
+
+STATUS_TEXT = {
+    import_queue.QUEUED: "处理中",
+    import_queue.PENDING: "待审阅",
+    import_queue.FAILED: "失败",
+}
+
+_review_window = None
+
+def attach_notice(parent, **grid_options):
+    """
+    在 parent 中放一个提示按钮，有待审阅或失败的导入时显示“N 条新导入”，点击打开审阅列表。
+    grid_options 为显示时传给 grid 的参数。
+    """
+    button = ttk.Button(parent, command=open_review_window, style="TButton")
+
+    def update(counts):
+        waiting = counts[import_queue.PENDING] + counts[import_queue.FAILED]
+        if waiting:
+            text = f"{waiting} 条新导入"
+            if counts[import_queue.FAILED]:
+                text += f"（{counts[import_queue.FAILED]} 条失败）"
+            button.config(text=text)
+            button.grid(**grid_options)
+        else:
+            button.grid_remove()
+
+    unsubscribe = import_queue.subscribe(update)
+    button.bind("<Destroy>", lambda event: unsubscribe(), add="+")
+    update(import_queue.counts())
+    return button
+
+def open_review_window():
+    global _review_window
+    if _review_window is not None and _review_window.winfo_exists():
+        _review_window.lift()
+        _review_window.focus_force()
+        return
+
+    win = tk.Toplevel()
+    win.title("导入审阅")
+    win.geometry("1300x860")
+    _review_window = win
+
+    left = tk.Frame(win)
+    left.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=10)
+    img_frame = ImageFrame(win, width=600, height=840)
+    img_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 10), pady=10)
+
+    columns = ("item_id", "status", "received_at", "note")
+    tree = ttk.Treeview(left, columns=columns, show="headings", selectmode="extended")
+    for col, text, width in (("item_id", "题目ID", 160), ("status", "状态", 70),
+                             ("received_at", "接收时间", 150), ("note", "说明", 260)):
+        tree.heading(col, text=text)
+        tree.column(col, width=width, anchor="w")
+    scrollbar = ttk.Scrollbar(left, orient=tk.VERTICAL, command=tree.yview)
+    tree.configure(yscrollcommand=scrollbar.set)
+
+    btn_row = tk.Frame(left)
+    btn_row.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    summary_var = tk.StringVar(value="")
+
+    def selected_rows():
+        return [int(row) for row in tree.selection()]
+
+    def refresh(counts=None):
+        selection = set(tree.selection())
+        tree.delete(*tree.get_children())
+        for entry in import_queue.list_entries():
+            if entry["status"] == import_queue.FAILED:
+                note = entry["error"] or ""
+            elif entry["similar"]:
+                note = f"疑似重复：{entry['similar'].replace(',', '、')}"
+            else:
+                note = ""
+            row = str(entry["queue_id"])
+            tree.insert("", tk.END, iid=row, values=(
+                entry["item_id"], STATUS_TEXT.get(entry["status"], entry["status"]), entry["received_at"], note,
+            ))
+            if row in selection:
+                tree.selection_add(row)
+        if counts is None:
+            counts = import_queue.counts()
+        summary_var.set(f"待审阅 {counts[import_queue.PENDING]} 条，失败 {counts[import_queue.FAILED]} 条，"
+                        f"处理中 {counts[import_queue.QUEUED]} 条")
+
+    def on_select(event=None):
+        rows = tree.selection()
+        if not rows:
+            return
+        values = tree.item(rows[0], "values")
+        if values[1] != STATUS_TEXT[import_queue.PENDING]:
+            img_frame.cancel_preview()
+            img_frame.clear_image(values[3] or "图片尚未保存")
+            return
+        neighbours = [tree.item(row, "values")[0] for row in treeview_neighbours(tree, rows[0])]
+        img_frame.show_item_preview(values[0], prefetch_ids=neighbours)
+
+    def open_in_entry(event=None):
+        rows = tree.selection()
+        if not rows:
+            return
+        values = tree.item(rows[0], "values")
+        if values[1] != STATUS_TEXT[import_queue.PENDING]:
+            messagebox.showwarning("提示", "该条目的图片尚未保存，无法打开录入", parent=win)
+            return
+        feature1.open_question_in_entry(values[0])
+
+    def mark_reviewed():
+        rows = selected_rows()
+        if not rows:
+            return
+        try:
+            import_queue.mark_reviewed(rows)
+        except Exception as e:
+            messagebox.showerror("错误", f"标记已审阅失败: {e}", parent=win)
+        refresh()
+
+    def retry_failed():
+        rows = selected_rows() or [int(row) for row in tree.get_children()]
+        try:
+            import_queue.retry(rows)
+        except Exception as e:
+            messagebox.showerror("错误", f"重试失败: {e}", parent=win)
+        refresh()
+
+    tk.Button(btn_row, text="打开录入", command=open_in_entry, width=10).pack(side=tk.LEFT)
+    tk.Button(btn_row, text="标记已审阅", command=mark_reviewed, width=10).pack(side=tk.LEFT, padx=(10, 0))
+    tk.Button(btn_row, text="重试失败项", command=retry_failed, width=10).pack(side=tk.LEFT, padx=(10, 0))
+    tk.Button(btn_row, text="刷新", command=refresh, width=8).pack(side=tk.LEFT, padx=(10, 0))
+    tk.Label(btn_row, textvariable=summary_var, anchor="e").pack(side=tk.RIGHT)
+
+    tree.bind("<<TreeviewSelect>>", on_select)
+    tree.bind("<Double-1>", open_in_entry)
+
+    unsubscribe = import_queue.subscribe(refresh)
+
+    def on_close():
+        global _review_window
+        unsubscribe()
+        img_frame.cancel_preview()
+        _review_window = None
+        win.destroy()
+
+    win.protocol("WM_DELETE_WINDOW", on_close)
+    refresh()
@@ -0,0 +1,408 @@
+# import_server.py
+# 本地导入服务：基于 asyncio 流在单独线程中运行，供浏览器插件推送题目。
+# 读完请求头后先检查请求体大小（超出返回 413）和导入队列是否已满（返回 429 及 Retry-After），
+# 两者都不读取请求体、回复后直接断开；通过后才读取请求体。
+# 解析 JSON/base64、校验图片、写暂存文件在固定大小的线程池中完成，连接再多也不会无限制地创建线程。
+# 批量导入入队时逐条检查队列上限，超出的题目在结果中标记 queueFull。
+# 配置见 config.DEFAULT_IMPORT_SERVER
+#
+# 接口：
+#   POST /import        JSON {"id", "imageBase64", "token"}，与插件原有协议相同
+#   POST /import/batch  一次多道题目，请求体格式见 import_batch.py
+#   GET  /metrics       运行指标（Prometheus 文本格式；Accept: application/json 时为 JSON），见 import_metrics.py
+#   GET  /health        服务、后台线程与数据库状态
+# 同一题目重复推送相同图片时返回 "Already imported, unchanged"（result 字段为 unchanged），不入队
+import asyncio
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import config
+import import_batch
+import import_metrics
+import import_queue
+
+# 请求头总长度上限
+HEADER_LIMIT = 64 * 1024
+# 空闲连接等待下一个请求、读取请求体的超时（秒）
+HEADER_TIMEOUT = 30
+BODY_TIMEOUT = 120
+# 丢弃不处理的请求体时每次读取的字节数
+DISCARD_CHUNK = 64 * 1024
+# 指标中单独统计的路径，其余归为 other
+KNOWN_PATHS = ("/import", "/import/batch", "/metrics", "/health")
+
+# 各去重结果对应的返回信息
+_RESULT_MESSAGES = {
+    import_queue.UNCHANGED: "Already imported, unchanged",
+    import_queue.DUPLICATE: "Already queued",
+    import_queue.UPDATED: "Updated image",
+    import_queue.NEW: "Queued",
+}
+
+def enqueue_item(question_id, image_data, max_depth=None, received=None):
+    """
+    校验后放入导入队列，由后台线程保存图片；返回该题目的处理结果（失败时可能带 HTTP 状态码 status）。
+    题目ID和图片哈希都与已保存（或正在排队）的相同时直接返回，不再解析图片、不入队。
+    max_depth 为队列上限，达到时该题目返回 queueFull（批量导入逐条检查）；
+    received 为收到请求头的时刻（time.monotonic()），端到端耗时从这里算起。
+    """
+    if not question_id or not len(image_data):
+        return _rejected(question_id, "Missing id or image")
+    if not import_queue.valid_item_id(question_id):
+        return _rejected(question_id, "Invalid id")
+    started = time.perf_counter()
+    digest = import_queue.source_hash(image_data)
+    try:
+        result, queue_id = import_queue.check_duplicate(question_id, digest)
+    except Exception as e:
+        import_metrics.record_error("enqueue", e)
+        return _rejected(question_id, f"Client not ready: {e}", status=503)
+    import_metrics.observe_stage("hash", time.perf_counter() - started)
+    if result not in (import_queue.UNCHANGED, import_queue.DUPLICATE):
+        started = time.perf_counter()
+        try:
+            import_batch.probe_image(image_data)
+        except Exception as e:
+            return _rejected(question_id, f"Invalid image: {e}")
+        import_metrics.observe_stage("probe", time.perf_counter() - started)
+        try:
+            # 入队前在锁内再检查一次，并发的相同推送只入队一次
+            result, queue_id = import_queue.submit(
+                question_id, image_data, digest, max_depth=max_depth, received=received)
+        except Exception as e:
+            import_metrics.record_error("enqueue", e)
+            return _rejected(question_id, f"Client not ready: {e}", status=503)
+        if result == import_queue.FULL:
+            rejected = _rejected(question_id, "Import queue is full", status=429)
+            rejected["queueFull"] = True
+            return rejected
+    if result in (import_queue.UNCHANGED, import_queue.DUPLICATE):
+        import_metrics.count_item(result)
+    reply = {"id": question_id, "ok": True, "message": _RESULT_MESSAGES[result], "result": result}
+    if queue_id is not None:
+        reply["queueId"] = queue_id
+    return reply
+
+def _rejected(question_id, message, status=None):
+    import_metrics.count_item("rejected")
+    result = {"id": question_id, "ok": False, "message": message}
+    if status is not None:
+        result["status"] = status
+    return result
+
+def _parse_head(head):
+    # 返回 (方法, 路径, 协议版本, 小写的请求头字典)，格式错误时返回 None
+    try:
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, version = lines[0].split(" ", 2)
+    except ValueError:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            return None
+        headers[key.strip().lower()] = value.strip()
+    return method.upper(), path.split("?", 1)[0], version.strip().upper(), headers
+
+def _keep_alive(version, headers):
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+class ImportServer:
+    def __init__(self, token, options=None):
+        self.token = token
+        self.options = options or config.get_import_server()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._pool = None
+        # 已读取请求头、尚未完成入队的请求数（只在事件循环线程中修改）
+        self._inflight = 0
+
+    @property
+    def url(self):
+        return f"http://{self.options['host']}:{self.options['port']}"
+
+    def start(self):
+        """在后台线程中启动服务；端口被占用等启动失败时抛出异常。"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                self._server = loop.run_until_complete(asyncio.start_server(
+                    self._handle_connection, self.options["host"], self.options["port"], limit=HEADER_LIMIT))
+            except Exception as e:
+                errors.append(e)
+                loop.close()
+                started.set()
+                return
+            self._loop = loop
+            started.set()
+            try:
+                loop.run_forever()
+            finally:
+                # 停止时关闭监听并结束仍在等待的连接
+                self._server.close()
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                loop.run_until_complete(self._server.wait_closed())
+                loop.close()
+
+        self._pool = ThreadPoolExecutor(max_workers=self.options["decode_workers"], thread_name_prefix="import-decode")
+        self._thread = threading.Thread(target=run, name="import-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._pool.shutdown(wait=False)
+            raise errors[0]
+
+    def stop(self):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._pool.shutdown(wait=False)
+        self._loop = None
+
+    # ---------- 连接与请求 ----------
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 431, {"ok": False, "message": "Headers too large"})
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                request = _parse_head(head)
+                if request is None:
+                    await self._respond(writer, 400, {"ok": False, "message": "Bad request"})
+                    break
+                if not await self._handle_request(reader, writer, *request):
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # 客户端断开，或服务停止时取消
+        except Exception as e:
+            print(f"[导入服务] 处理连接时出错: {e}")
+            import_metrics.record_error("connection", e)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _handle_request(self, reader, writer, method, path, version, headers):
+        """处理一个请求，返回连接是否可以继续复用。"""
+        keep_alive = _keep_alive(version, headers)
+        started = time.perf_counter()
+        # 端到端耗时的起点，随题目一直传到入队
+        received = time.monotonic()
+        label = path if path in KNOWN_PATHS else "other"
+        length = 0
+
+        async def reply(status, payload, keep=False, **kwargs):
+            await self._respond(writer, status, payload, keep, **kwargs)
+            import_metrics.record_request(label, status, length, time.perf_counter() - started)
+            return keep
+
+        if method == "OPTIONS":
+            return await reply(204, None, keep_alive, cors=True)
+        if "transfer-encoding" in headers:
+            return await reply(411, {"ok": False, "message": "Content-Length required"})
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0:
+            length = 0
+            return await reply(400, {"ok": False, "message": "Invalid Content-Length"})
+        if length > self.options["max_body_mb"] * 1024 * 1024:
+            # 不读取过大的请求体，直接断开
+            return await reply(413, {"ok": False, "message": "Request body too large"})
+
+        if method == "GET" and path in ("/metrics", "/health"):
+            if not await self._discard(reader, length):
+                return False
+            handler = self._metrics if path == "/metrics" else self._health
+            status, payload = await self._run_handler(handler, path, headers)
+            return await reply(status, payload, keep_alive)
+
+        if method != "POST" or path not in ("/import", "/import/batch"):
+            if not await self._discard(reader, length):
+                return False
+            status, message = (404, "Not Found") if method in ("GET", "POST") else (405, "Method Not Allowed")
+            return await reply(status, {"ok": False, "message": message}, keep_alive)
+
+        if import_queue.depth() + self._inflight >= self.options["max_queue"]:
+            # 队列已满：与 413 相同，不读取请求体，告知客户端稍后重试后断开
+            retry_after = self.options["retry_after"]
+            return await reply(429, {"ok": False, "message": "Import queue is full", "retryAfter": retry_after},
+                               extra_headers={"Retry-After": str(retry_after)})
+
+        self._inflight += 1
+        try:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return False
+            handler = self._import_batch if path == "/import/batch" else self._import_single
+            status, payload = await self._run_handler(handler, path, body, headers, received)
+        finally:
+            self._inflight -= 1
+        return await reply(status, payload, keep_alive)
+
+    async def _run_handler(self, handler, path, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, handler, *args)
+        except Exception as e:
+            print(f"[导入服务] 处理 {path} 时出错: {e}")
+            import_metrics.record_error(path, e)
+            return 500, {"ok": False, "message": f"Internal error: {e}"}
+
+    async def _discard(self, reader, length):
+        # 读掉不处理的请求体，连接才能继续用于下一个请求
+        try:
+            while length > 0:
+                chunk = await asyncio.wait_for(reader.read(min(length, DISCARD_CHUNK)), BODY_TIMEOUT)
+                if not chunk:
+                    return False
+                length -= len(chunk)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _respond(self, writer, status, payload, keep_alive=False, cors=False, extra_headers=None):
+        if payload is None:
+            body, content_type = b"", None
+        elif isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        lines = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Access-Control-Allow-Origin: *",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        if cors:
+            lines.append("Access-Control-Allow-Methods: GET, POST, OPTIONS")
+            lines.append(f"Access-Control-Allow-Headers: Content-Type, {import_batch.TOKEN_HEADER}")
+        for key, value in (extra_headers or {}).items():
+            lines.append(f"{key}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    # ---------- 接口（在线程池中执行） ----------
+
+    def _gauges(self):
+        gauges = {"queue_depth": import_queue.depth(), "inflight_requests": self._inflight}
+        try:
+            counts = import_queue.counts()
+            gauges["review_pending"] = counts[import_queue.PENDING]
+            gauges["review_failed"] = counts[import_queue.FAILED]
+        except Exception as e:
+            import_metrics.record_error("metrics", e)
+        return gauges
+
+    def _metrics(self, headers):
+        # 默认输出 Prometheus 文本格式，Accept 为 JSON 时输出 JSON
+        if "application/json" in headers.get("accept", ""):
+            return 200, import_metrics.snapshot(self._gauges())
+        return 200, import_metrics.render_prometheus(self._gauges())
+
+    def _health(self, headers):
+        worker_alive = import_queue.worker_alive()
+        try:
+            counts = import_queue.counts()
+            database_ok = import_queue.database_ready()
+        except Exception as e:
+            counts, database_ok = None, False
+            import_metrics.record_error("health", e)
+        ok = worker_alive and database_ok
+        return (200 if ok else 503), {
+            "ok": ok,
+            "uptimeSeconds": round(import_metrics.uptime(), 3),
+            "workerAlive": worker_alive,
+            "database": database_ok,
+            "queueDepth": import_queue.depth(),
+            "inflightRequests": self._inflight,
+            "queue": counts,
+            "lastError": import_metrics.last_error(),
+        }
+
+    def _check_token(self, token):
+        return not self.token or token == self.token
+
+    def _import_single(self, body, headers, received=None):
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            return 400, {"ok": False, "message": "Invalid JSON"}
+        if not self._check_token(data.get("token")):
+            return 403, {"ok": False, "message": "Invalid token"}
+
+        question_id = data.get("id") or ""
+        image_base64 = data.get("imageBase64") or ""
+        if not isinstance(question_id, str) or not isinstance(image_base64, str):
+            return 400, {"ok": False, "message": "Invalid id or image"}
+        question_id = question_id.strip()
+        if not question_id or not image_base64:
+            return 400, {"ok": False, "message": "Missing id or image"}
+        if image_base64.startswith("data:"):
+            image_base64 = image_base64.partition(",")[2]
+        try:
+            image_bytes = base64.b64decode(image_base64)
+        except ValueError:
+            return 400, {"ok": False, "message": "Invalid base64"}
+
+        result = enqueue_item(question_id, image_bytes, received=received)
+        return result.pop("status", 200 if result["ok"] else 400), result
+
+    def _import_batch(self, body, headers, received=None):
+        # 批量导入：一次请求多道题目，逐条返回结果
+        try:
+            body_token, items = import_batch.parse_batch(body, headers.get("content-type"))
+        except Exception as e:
+            return 400, {"ok": False, "message": f"Invalid batch body: {e}"}
+        if not self._check_token(headers.get(import_batch.TOKEN_HEADER.lower()) or body_token):
+            return 403, {"ok": False, "message": "Invalid token"}
+
+        # 一个请求只占一个并发名额，逐条检查队列上限，超出的条目返回 queueFull，不越过 max_queue
+        results = []
+        for question_id, image_data in items:
+            result = enqueue_item((question_id or "").strip(), image_data,
+                                  max_depth=self.options["max_queue"], received=received)
+            result.pop("status", None)
+            results.append(result)
+        queued = sum(1 for r in results if r["ok"])
+        payload = {
+            "ok": queued == len(results),
+            "imported": queued,
+            "failed": len(results) - queued,
+            "results": results,
+        }
+        if any(r.get("queueFull") for r in results):
+            payload["retryAfter"] = self.options["retry_after"]
+        return 200, payload
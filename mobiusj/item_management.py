@@ -1,28 +1,21 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
 import config
-import os
+import db
+import catalog
+import images
 import webbrowser
-from widgets.image_frame import ImageFrame
+from widgets.image_frame import ImageFrame, treeview_neighbours
 from widgets.view_item import open_question_url
 
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    if not data_path:
-        messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
-        return None
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    if not os.path.exists(db_path):
-        messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
-        return None
-    return db_path
-
-def table_exists(conn, table_name):
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
-    return cursor.fetchone() is not None
+# 加载所有模块和标签（取自共享目录缓存）
+def load_modules_tags():
+    try:
+        modules = [(m['module_id'], m['module_name'], m['module_type']) for m in catalog.modules()]
+        tags = [(t['tag_id'], t['tag_name'], t['module_id']) for t in catalog.tags()]
+        return modules, tags
+    except Exception:
+        return [], []
 
 def item_management():
     win = tk.Toplevel()
@@ -44,35 +37,12 @@ def item_management():
     search_entry = tk.Entry(search_top_frame, textvariable=search_id_var, width=36)
     search_entry.pack(side=tk.LEFT, padx=4)
     def search_by_id():
-        tree.delete(*tree.get_children())
-        db_path = get_db_path()
-        if not db_path:
+        iid = search_id_var.get().strip()
+        if not iid:
+            clear_table()
+            table_query["conditions"] = None
             return
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            iid = search_id_var.get().strip()
-            if not iid:
-                return
-            sql = """
-            SELECT i.item_id, i.item_level, i.item_usage, i.item_intro,
-                   m.module_type, m.module_name, t.tag_name
-            FROM items i
-            LEFT JOIN item_tag_relations r ON i.item_id = r.item_id
-            LEFT JOIN tags t ON r.tag_id = t.tag_id
-            LEFT JOIN modules m ON t.module_id = m.module_id
-            WHERE i.item_id LIKE ?
-            ORDER BY i.item_id DESC
-            """
-            cursor.execute(sql, (f"%{iid}%",))
-            rows = cursor.fetchall()
-            for row in rows:
-                tree.insert("", "end", values=(row[4], row[5], row[6], row[0], row[1], row[2], row[3]), tags=(row[0],))
-        except Exception as e:
-            messagebox.showerror("错误", f"数据库查询失败: {e}", parent=win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
+        fill_table(["i.item_id LIKE ?"], [f"%{iid}%"])
     tk.Button(search_top_frame, text="检索", command=search_by_id).pack(side=tk.LEFT, padx=8)
 
     # 筛选区
@@ -122,23 +92,6 @@ def item_management():
     tag_cb.grid(row=1, column=5, padx=4, sticky="w")
 
     # 加载所有模块和标签
-    def load_modules_tags():
-        db_path = get_db_path()
-        if not db_path:
-            return [], []
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT module_id, module_name, module_type FROM modules")
-            modules = cursor.fetchall()
-            cursor.execute("SELECT tag_id, tag_name, module_id FROM tags")
-            tags = cursor.fetchall()
-            return modules, tags
-        except Exception:
-            return [], []
-        finally:
-            if 'conn' in locals():
-                conn.close()
     modules, tags = load_modules_tags()
 
     # 联动逻辑
@@ -175,11 +128,10 @@ def item_management():
         tid, tname = tval.split(":", 1)
         # 如果模块类型或模块名称为空，则根据标签查数据库补全
         if not (mval and mtype):
-            db_path = get_db_path()
-            if not db_path:
+            conn = db.get_conn()
+            if conn is None:
                 return
             try:
-                conn = sqlite3.connect(db_path)
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT m.module_id, m.module_name, m.module_type
@@ -196,9 +148,6 @@ def item_management():
                     return
             except Exception:
                 return
-            finally:
-                if 'conn' in locals():
-                    conn.close()
         else:
             mid, mname = mval.split(":", 1)
         # 防止重复
@@ -242,64 +191,124 @@ def item_management():
             tree.column(col, width=60, anchor="center")
     tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-    # 查询按钮逻辑
-    def refresh_table():
+    # 表格当前显示的查询条件；其他窗口修改题目后按同样的条件只重查变化的题目
+    table_query = {"conditions": None, "params": []}
+    # 行 -> 题目ID（Treeview 会把纯数字的 tags 转成整数，不能从行上读回原始ID）
+    row_items = {}
+
+    def query_rows(conditions, params, item_ids=None):
+        conn = db.get_conn()
+        if conn is None:
+            return None
+        conditions = list(conditions)
+        params = list(params)
+        if item_ids is not None:
+            conditions.append("i.item_id IN ({})".format(",".join("?" for _ in item_ids)))
+            params.extend(item_ids)
+        sql = """
+        SELECT i.item_id, i.item_level, i.item_usage, i.item_intro,
+               m.module_type, m.module_name, t.tag_name
+        FROM items i
+        LEFT JOIN item_tag_relations r ON i.item_id = r.item_id
+        LEFT JOIN tags t ON r.tag_id = t.tag_id
+        LEFT JOIN modules m ON t.module_id = m.module_id
+        """
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY i.item_id DESC"
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def insert_row(row, index="end"):
+        iid = tree.insert("", index, values=(row[4], row[5], row[6], row[0], row[1], row[2], row[3]), tags=(row[0],))
+        row_items[iid] = str(row[0])
+
+    def clear_table():
         tree.delete(*tree.get_children())
-        db_path = get_db_path()
-        if not db_path:
-            return
+        row_items.clear()
+
+    def fill_table(conditions, params):
+        clear_table()
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            # 标签筛选
-            tag_ids = [tag['tag_id'] for tag in selected_tags]
-            if tag_ids:
-                # 查询每个标签关联的题目ID
-                item_sets = []
-                for tid in tag_ids:
-                    cursor.execute("SELECT item_id FROM item_tag_relations WHERE tag_id=?", (tid,))
-                    item_ids = set(row[0] for row in cursor.fetchall())
-                    item_sets.append(item_ids)
-                # 取交集
-                if item_sets:
-                    filtered_item_ids = set.intersection(*item_sets)
-                else:
-                    filtered_item_ids = set()
-            else:
-                # 未选标签则查所有题目ID
-                cursor.execute("SELECT item_id FROM items")
-                filtered_item_ids = set(row[0] for row in cursor.fetchall())
-            # 其他筛选
-            params = []
-            sql = """
-            SELECT i.item_id, i.item_level, i.item_usage, i.item_intro,
-                   m.module_type, m.module_name, t.tag_name
-            FROM items i
-            LEFT JOIN item_tag_relations r ON i.item_id = r.item_id
-            LEFT JOIN tags t ON r.tag_id = t.tag_id
-            LEFT JOIN modules m ON t.module_id = m.module_id
-            WHERE i.item_id IN ({})
-            """.format(",".join("?" for _ in filtered_item_ids) if filtered_item_ids else "'-'")
-            params.extend(filtered_item_ids)
-            if level_var.get():
-                sql += " AND i.item_level=?"
-                params.append(int(level_var.get()))
-            if usage_var.get():
-                sql += " AND i.item_usage=?"
-                params.append(usage_var.get())
-            sql += " ORDER BY i.item_id DESC"
-            if filtered_item_ids:
-                cursor.execute(sql, params)
-                rows = cursor.fetchall()
-            else:
-                rows = []
-            for row in rows:
-                tree.insert("", "end", values=(row[4], row[5], row[6], row[0], row[1], row[2], row[3]), tags=(row[0],))
+            rows = query_rows(conditions, params)
         except Exception as e:
             messagebox.showerror("错误", f"数据库查询失败: {e}", parent=win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            return
+        if rows is None:
+            return
+        table_query["conditions"], table_query["params"] = conditions, params
+        for row in rows:
+            insert_row(row)
+
+    def sorted_position(item_id):
+        # 表格按题目ID倒序，二分查找新题目的插入位置
+        children = tree.get_children()
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if row_items[children[mid]] > item_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def update_table_items(item_ids):
+        """只替换变化题目所在的行，其余行不动。"""
+        if table_query["conditions"] is None or not item_ids:
+            return
+        item_ids = [str(item_id) for item_id in item_ids]
+        try:
+            rows = query_rows(table_query["conditions"], table_query["params"], item_ids)
+        except Exception as e:
+            print(f"[题目管理] 刷新题目 {', '.join(item_ids)} 失败: {e}")
+            return
+        if rows is None:
+            return
+        new_rows = {}
+        for row in rows:
+            new_rows.setdefault(str(row[0]), []).append(row)
+        selected = {row_items[row] for row in tree.selection()}
+        for item_id in item_ids:
+            old_rows = tree.tag_has(item_id)
+            index = tree.index(old_rows[0]) if old_rows else None
+            if old_rows:
+                tree.delete(*old_rows)
+                for row in old_rows:
+                    row_items.pop(row, None)
+            if item_id not in new_rows:
+                continue
+            if index is None:
+                index = sorted_position(item_id)
+            for offset, row in enumerate(new_rows[item_id]):
+                insert_row(row, index + offset)
+            if item_id in selected:
+                tree.selection_add(tree.tag_has(item_id)[0])
+
+    # 查询按钮逻辑
+    def refresh_table():
+        # 标签筛选、难度、用途及排序在同一条 SQL 中完成
+        params = []
+        conditions = []
+        tag_ids = list(dict.fromkeys(tag['tag_id'] for tag in selected_tags))
+        if tag_ids:
+            # 同时标记了所有选中标签的题目：按题目分组，命中标签数等于选中标签数
+            # （item_tag_relations 主键为 (item_id, tag_id)，同一题目同一标签不会重复计数）
+            conditions.append("""i.item_id IN (
+                SELECT item_id FROM item_tag_relations
+                WHERE tag_id IN ({})
+                GROUP BY item_id
+                HAVING COUNT(*) = ?
+            )""".format(",".join("?" for _ in tag_ids)))
+            params.extend(tag_ids)
+            params.append(len(tag_ids))
+        if level_var.get():
+            conditions.append("i.item_level=?")
+            params.append(int(level_var.get()))
+        if usage_var.get():
+            conditions.append("i.item_usage=?")
+            params.append(usage_var.get())
+        fill_table(conditions, params)
 
     tk.Button(filter_frame, text="查询", command=refresh_table).grid(row=2, column=4, padx=8)
 
@@ -323,6 +332,33 @@ def item_management():
     module_cb['values'] = [""] + [f"{mid}:{mname}" for mid, mname, _ in modules]
     tag_cb['values'] = [""] + [f"{tid}:{tname}" for tid, tname, _ in tags]
 
+    # 其他窗口修改了模块/标签/题目时同步：下拉框按当前选择更新可选项，表格只替换变化的题目
+    def reload_choices():
+        nonlocal modules, tags
+        modules, tags = load_modules_tags()
+        mtype = module_type_var.get()
+        module_cb['values'] = [""] + [f"{mid}:{mname}" for mid, mname, mt in modules if not mtype or mt == mtype]
+        mval = module_var.get()
+        if mval:
+            mid = mval.split(":")[0]
+            tag_cb['values'] = [""] + [f"{tid}:{tname}" for tid, tname, tmid in tags if tmid == mid]
+        else:
+            tag_cb['values'] = [""] + [f"{tid}:{tname}" for tid, tname, _ in tags]
+
+    def on_catalog_changed(changes):
+        if catalog.MODULES in changes or catalog.TAGS in changes:
+            reload_choices()
+        item_ids = changes.get(catalog.ITEMS, set())
+        if item_ids is None or (catalog.ITEMS not in changes
+                                and (catalog.MODULES in changes or catalog.TAGS in changes)):
+            # 重新加载或模块、标签改名：按当前条件重查整张表
+            if table_query["conditions"] is not None:
+                fill_table(table_query["conditions"], table_query["params"])
+        else:
+            update_table_items(item_ids)
+
+    catalog.subscribe_widget(win, on_catalog_changed)
+
     # 表格双击事件
     def on_row_double(event):
         item = tree.selection()
@@ -337,46 +373,15 @@ def item_management():
         if not item:
             return
         item_id = tree.item(item, "tags")[0]
-        # 检查图片是否存在
-        settings = config.load_settings()
-        data_path = settings.get("data_path", "")
-        img_dir = os.path.join(data_path, "item_img_path")
-        if not os.path.isdir(img_dir):
-            return
-        exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
-        img_path = None
-        for ext in exts:
-            candidate = os.path.join(img_dir, f"{item_id}{ext}")
-            if os.path.isfile(candidate):
-                img_path = candidate
-                break
-        if img_path:
-            # 加载图片到img_frame
-            try:
-                from PIL import Image
-                img = Image.open(img_path)
-                # 限制图片最大宽高
-                max_w, max_h = 560, 800
-                w, h = img.size
-                scale = min(max_w/w, max_h/h, 1)
-                if scale < 1:
-                    try:
-                        resample = Image.Resampling.LANCZOS
-                    except AttributeError:
-                        resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                    img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                else:
-                    img_disp = img
-                from PIL import ImageTk
-                tk_img = ImageTk.PhotoImage(img_disp)
-                img_frame.img_label.config(image=tk_img, text="")
-                img_frame.img_label.image = tk_img
-                img_frame.img_label._original_image = img.copy()
-                img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
+        try:
+            # 加载缩略图到img_frame，原图在弹窗时再解码
+            preview = images.load_preview(item_id)
+            if preview:
+                img_frame.show_preview(*preview)
                 # 调用预览
                 img_frame.show_image_popup()
-            except Exception as e:
-                pass
+        except Exception as e:
+            pass
 
     tree.bind("<Button-3>", on_right_click)
 
@@ -384,61 +389,12 @@ def item_management():
     def on_tree_select(event):
         item = tree.selection()
         if not item:
-            img_frame.img_label.config(image='', text='此处为图片粘贴区域')
-            img_frame.img_label.image = None
-            img_frame.img_label._original_image = None
-            img_frame.img_size_var.set("尺寸: -")
+            img_frame.clear_image()
             return
         item_id = tree.item(item, "tags")[0]
-        # 获取图片路径
-        settings = config.load_settings()
-        data_path = settings.get("data_path", "")
-        img_dir = os.path.join(data_path, "item_img_path")
-        if not os.path.isdir(img_dir):
-            img_frame.img_label.config(image='', text='此处为图片粘贴区域')
-            img_frame.img_label.image = None
-            img_frame.img_label._original_image = None
-            img_frame.img_size_var.set("尺寸: -")
-            return
-        exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
-        img_path = None
-        for ext in exts:
-            candidate = os.path.join(img_dir, f"{item_id}{ext}")
-            if os.path.isfile(candidate):
-                img_path = candidate
-                break
-        if img_path:
-            try:
-                from PIL import Image
-                img = Image.open(img_path)
-                # 限制图片最大宽高
-                max_w, max_h = 560, 800
-                w, h = img.size
-                scale = min(max_w/w, max_h/h, 1)
-                if scale < 1:
-                    try:
-                        resample = Image.Resampling.LANCZOS
-                    except AttributeError:
-                        resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                    img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                else:
-                    img_disp = img
-                from PIL import ImageTk
-                tk_img = ImageTk.PhotoImage(img_disp)
-                img_frame.img_label.config(image=tk_img, text="")
-                img_frame.img_label.image = tk_img
-                img_frame.img_label._original_image = img.copy()
-                img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
-            except Exception as e:
-                img_frame.img_label.config(image='', text=f"图片加载失败\n{e}")
-                img_frame.img_label.image = None
-                img_frame.img_label._original_image = None
-                img_frame.img_size_var.set("尺寸: -")
-        else:
-            img_frame.img_label.config(image='', text='此处为图片粘贴区域')
-            img_frame.img_label.image = None
-            img_frame.img_label._original_image = None
-            img_frame.img_size_var.set("尺寸: -")
+        # 后台读取缩略图，快速切换选中行时只显示最后一行的图片；同时预取上下几行
+        neighbours = [tree.item(row, "tags")[0] for row in treeview_neighbours(tree, item[0])]
+        img_frame.show_item_preview(item_id, prefetch_ids=neighbours)
     tree.bind("<<TreeviewSelect>>", on_tree_select)
 
     # 默认刷新
@@ -446,11 +402,10 @@ def item_management():
 
 def show_item_detail(parent, item_id):
     import webbrowser
-    db_path = get_db_path()
-    if not db_path:
+    conn = db.get_conn()
+    if conn is None:
         return
     try:
-        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         # 获取题目主信息
         cursor.execute("SELECT item_id, item_level, item_usage, item_intro FROM items WHERE item_id=?", (item_id,))
@@ -470,9 +425,6 @@ def show_item_detail(parent, item_id):
     except Exception as e:
         messagebox.showerror("错误", f"数据库查询失败: {e}", parent=parent)
         return
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
     detail_win = tk.Toplevel(parent)
     detail_win.title(f"题目详情：{item_id}")
@@ -494,11 +446,10 @@ def show_item_detail(parent, item_id):
         for widget in tag_info_frame.winfo_children():
             widget.destroy()
         # 重新获取标签
-        db_path2 = get_db_path()
-        if not db_path2:
+        conn2 = db.get_conn()
+        if conn2 is None:
             return
         try:
-            conn2 = sqlite3.connect(db_path2)
             cursor2 = conn2.cursor()
             cursor2.execute("""
                 SELECT t.tag_id, t.tag_name, m.module_id, m.module_name, m.module_type
@@ -510,9 +461,6 @@ def show_item_detail(parent, item_id):
             rows = cursor2.fetchall()
         except Exception:
             rows = []
-        finally:
-            if 'conn2' in locals():
-                conn2.close()
         # 展示标签及删除按钮
         for row in rows:
             info_str = f"{row[4]}-{row[3]}-{row[1]}"
@@ -524,19 +472,15 @@ def show_item_detail(parent, item_id):
                 def delete_tag():
                     if not messagebox.askyesno("确认", f"确定要删除标签 {info_str} 吗？", parent=detail_win):
                         return
-                    db_path3 = get_db_path()
-                    if not db_path3:
+                    conn3 = db.get_conn()
+                    if conn3 is None:
                         return
                     try:
-                        conn3 = sqlite3.connect(db_path3)
-                        cursor3 = conn3.cursor()
-                        cursor3.execute("DELETE FROM item_tag_relations WHERE item_id=? AND tag_id=?", (item_id, tag_id))
-                        conn3.commit()
+                        with db.transaction(conn3):
+                            conn3.execute("DELETE FROM item_tag_relations WHERE item_id=? AND tag_id=?", (item_id, tag_id))
+                        catalog.refresh_item(item_id)
                     except Exception as e:
                         messagebox.showerror("错误", f"删除标签失败: {e}", parent=detail_win)
-                    finally:
-                        if 'conn3' in locals():
-                            conn3.close()
                     # 如果删除的是当前编辑标签，则关闭详情弹层，否则刷新标签展示
                     if current_tag_id and tag_id == current_tag_id:
                         detail_win.destroy()
@@ -598,24 +542,7 @@ def show_item_detail(parent, item_id):
     intro_text.insert("1.0", item_row[3] if item_row[3] else "")
 
     # 加载所有模块和标签
-    def load_all_modules_tags():
-        db_path = get_db_path()
-        if not db_path:
-            return [], []
-        try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT module_id, module_name, module_type FROM modules")
-            modules = cursor.fetchall()
-            cursor.execute("SELECT tag_id, tag_name, module_id FROM tags")
-            tags = cursor.fetchall()
-            return modules, tags
-        except Exception:
-            return [], []
-        finally:
-            if 'conn' in locals():
-                conn.close()
-    modules, tags = load_all_modules_tags()
+    modules, tags = load_modules_tags()
 
     # 联动：模块类型限制模块名称
     def on_module_type_change(event):
@@ -683,54 +610,48 @@ def show_item_detail(parent, item_id):
     btn_frame.grid(row=8, column=0, columnspan=2, pady=18)
 
     def save_item():
-        db_path = get_db_path()
-        if not db_path:
+        conn = db.get_conn()
+        if conn is None:
             return
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
             # 用途校验：空字符串转为None
             usage_value = usage_var.get()
             if usage_value == "":
              usage_value = None
-            # 更新items表
-            cursor.execute("UPDATE items SET item_level=?, item_usage=?, item_intro=? WHERE item_id=?",
-                           (int(level_var.get()), usage_value, intro_text.get("1.0", "end").strip(), item_id))
-            # 更新标签关系
-            tval = tag_var.get()
-            if tval:
-                tid = tval.split(":")[0]
-                # 删除原有关系，插入新关系
-                cursor.execute("DELETE FROM item_tag_relations WHERE item_id=? AND tag_id=?", (item_id, current_tag_id))
-                cursor.execute("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)", (item_id, tid))
-            conn.commit()
+            with db.transaction(conn):
+                cursor = conn.cursor()
+                # 更新items表
+                cursor.execute("UPDATE items SET item_level=?, item_usage=?, item_intro=? WHERE item_id=?",
+                               (int(level_var.get()), usage_value, intro_text.get("1.0", "end").strip(), item_id))
+                # 更新标签关系
+                tval = tag_var.get()
+                if tval:
+                    tid = tval.split(":")[0]
+                    # 删除原有关系，插入新关系
+                    cursor.execute("DELETE FROM item_tag_relations WHERE item_id=? AND tag_id=?", (item_id, current_tag_id))
+                    cursor.execute("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)", (item_id, tid))
+            catalog.refresh_item(item_id)
             messagebox.showinfo("成功", "保存成功", parent=detail_win)
             detail_win.destroy()
         except Exception as e:
             messagebox.showerror("错误", f"保存失败: {e}", parent=detail_win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     def delete_item():
         if not messagebox.askyesno("确认", "确定要删除该题目吗？（仅删除items和item_tag_relations表）", parent=detail_win):
             return
-        db_path = get_db_path()
-        if not db_path:
+        conn = db.get_conn()
+        if conn is None:
             return
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM items WHERE item_id=?", (item_id,))
-            cursor.execute("DELETE FROM item_tag_relations WHERE item_id=?", (item_id,))
-            conn.commit()
+            with db.transaction(conn):
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM items WHERE item_id=?", (item_id,))
+                cursor.execute("DELETE FROM item_tag_relations WHERE item_id=?", (item_id,))
+            catalog.drop_item(item_id)
             messagebox.showinfo("成功", "题目已删除", parent=detail_win)
             detail_win.destroy()
         except Exception as e:
             messagebox.showerror("错误", f"删除失败: {e}", parent=detail_win)
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     tk.Button(btn_frame, text="保存", command=save_item, width=10).pack(side=tk.LEFT, padx=12)
     tk.Button(btn_frame, text="取消", command=detail_win.destroy, width=10).pack(side=tk.LEFT, padx=12)
@@ -1,87 +1,60 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
-import os
-import config
-from widgets.image_frame import ImageFrame
+import db
+import catalog
+import images
+from widgets.image_frame import ImageFrame, treeview_neighbours
 from widgets.view_item import open_question_url
 
-# 获取数据库路径
-def get_db_path():
-    settings = config.load_settings()
-    data_path = settings.get("data_path", "")
-    if not data_path:
-        messagebox.showerror("错误", "未设置数据路径，请在设置中配置数据路径")
-        return None
-    db_path = os.path.join(data_path, "mobius_data.sqlite3")
-    if not os.path.exists(db_path):
-        messagebox.showerror("错误", f"数据库文件 {db_path} 不存在")
-        return None
-    return db_path
-
 # 查询所有标签
 def load_tags():
-    db_path = get_db_path()
-    if not db_path:
-        return []
+    # 取自共享目录缓存
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT tag_id, tag_name, module_id FROM tags")
-        tags = cursor.fetchall()
-        conn.close()
-        return tags
+        return [(t['tag_id'], t['tag_name'], t['module_id']) for t in catalog.tags()]
     except Exception:
         return []
 
 def load_modules():
-    db_path = get_db_path()
-    if not db_path:
-        return []
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT module_id, module_name, module_type FROM modules")
-        modules = cursor.fetchall()
-        conn.close()
-        return modules
+        return [(m['module_id'], m['module_name'], m['module_type']) for m in catalog.modules()]
     except Exception:
         return []
 
 # 查询题目标签分布
-# 返回：只标记该标签、标记2个标签、标记3个标签的题目数量
-# 以及标记2个标签的分组统计
+# 一次分组查询得到标记该标签的每道题目的标签总数，以及只有两个标签时的另一个标签
+# 返回 dict：
+#   only_one      只标记该标签的题目ID
+#   two_tag_group 标记2个标签的题目，按另一个标签分组 {tag_id: [item_id, ...]}
+#   three_tags    恰好标记3个标签的题目ID
+#   more_tags     标记3个及以上标签的题目ID
 
 def query_tag_distribution(tag_id):
-    db_path = get_db_path()
-    if not db_path:
-        return 0, 0, 0, {}
+    result = {"only_one": [], "two_tag_group": {}, "three_tags": [], "more_tags": []}
+    conn = db.get_conn()
+    if conn is None:
+        return result
     try:
-        conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
-        # 查询所有标记该标签的题目ID
-        cursor.execute("SELECT item_id FROM item_tag_relations WHERE tag_id=?", (tag_id,))
-        item_ids = [row[0] for row in cursor.fetchall()]
-        only_one = 0
-        two_tags = 0
-        three_tags = 0
-        two_tag_group = {}
-        for item_id in item_ids:
-            cursor.execute("SELECT tag_id FROM item_tag_relations WHERE item_id=?", (item_id,))
-            tags = [row[0] for row in cursor.fetchall()]
-            if len(tags) == 1:
-                only_one += 1
-            elif len(tags) == 2:
-                two_tags += 1
-                # 统计另一个标签
-                other_tag = [t for t in tags if t != tag_id][0]
-                two_tag_group.setdefault(other_tag, []).append(item_id)
-            elif len(tags) == 3:
-                three_tags += 1
-        conn.close()
-        return only_one, two_tags, three_tags, two_tag_group
+        cursor.execute("""
+            SELECT r.item_id, COUNT(*), MAX(CASE WHEN o.tag_id <> r.tag_id THEN o.tag_id END)
+            FROM item_tag_relations r
+            JOIN item_tag_relations o ON o.item_id = r.item_id
+            WHERE r.tag_id = ?
+            GROUP BY r.item_id
+            ORDER BY r.item_id
+        """, (tag_id,))
+        for item_id, tag_count, other_tag in cursor.fetchall():
+            if tag_count == 1:
+                result["only_one"].append(item_id)
+            elif tag_count == 2:
+                result["two_tag_group"].setdefault(other_tag, []).append(item_id)
+            else:
+                if tag_count == 3:
+                    result["three_tags"].append(item_id)
+                result["more_tags"].append(item_id)
+        return result
     except Exception:
-        return 0, 0, 0, {}
+        return result
 
 # 查询标签名称
 
@@ -91,6 +64,190 @@ def get_tag_name(tag_id, tags):
             return tname
     return ""
 
+# 读取标签共现计数表（由数据库触发器维护，无需逐题统计）
+# 返回 [(tag_a, tag_b, 共现题数, tag_a题量, tag_b题量), ...]
+def load_tag_pairs():
+    conn = db.get_conn()
+    if conn is None:
+        return []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.tag_a, p.tag_b, p.pair_count, COALESCE(ca.item_count, 0), COALESCE(cb.item_count, 0)
+            FROM tag_pair_counts p
+            LEFT JOIN tag_item_counts ca ON ca.tag_id = p.tag_a
+            LEFT JOIN tag_item_counts cb ON cb.tag_id = p.tag_b
+            WHERE p.pair_count > 0
+        """)
+        return cursor.fetchall()
+    except Exception as e:
+        messagebox.showerror("错误", f"读取标签共现数据失败: {e}")
+        return []
+
+# 颜色插值：0 为白色，1 为深红
+def heat_color(ratio):
+    ratio = max(0.0, min(1.0, ratio))
+    g = int(255 - 200 * ratio)
+    b = int(255 - 215 * ratio)
+    return f"#ff{g:02x}{b:02x}"
+
+# 标签共现矩阵：列表（可按任意列排序）+ 热力图（共现最多的前若干个标签）
+def show_tag_cooccurrence(parent, tags, modules):
+    tag_map = {t[0]: t for t in tags}
+    module_map = {m[0]: m for m in modules}
+
+    def tag_title(tag_id):
+        t = tag_map.get(tag_id)
+        if not t:
+            return tag_id
+        m = module_map.get(t[2])
+        return f"{m[1]}-{t[1]}" if m else t[1]
+
+    win = tk.Toplevel(parent)
+    win.title("标签共现矩阵")
+    win.geometry("1200x800")
+
+    ctrl_frame = tk.Frame(win)
+    ctrl_frame.pack(fill=tk.X, padx=10, pady=6)
+    tk.Label(ctrl_frame, text="模块类型:", font=("微软雅黑", 10)).pack(side=tk.LEFT)
+    type_var = tk.StringVar(value="全部")
+    type_cb = ttk.Combobox(ctrl_frame, textvariable=type_var, values=["全部"] + sorted(set(m[2] for m in modules if m[2])), state="readonly", width=8)
+    type_cb.pack(side=tk.LEFT, padx=4)
+    tk.Label(ctrl_frame, text="最少共现题数:", font=("微软雅黑", 10)).pack(side=tk.LEFT, padx=(12, 0))
+    min_var = tk.IntVar(value=1)
+    tk.Spinbox(ctrl_frame, from_=1, to=9999, textvariable=min_var, width=6).pack(side=tk.LEFT, padx=4)
+    tk.Label(ctrl_frame, text="热力图标签数:", font=("微软雅黑", 10)).pack(side=tk.LEFT, padx=(12, 0))
+    top_var = tk.IntVar(value=30)
+    tk.Spinbox(ctrl_frame, from_=2, to=80, textvariable=top_var, width=4).pack(side=tk.LEFT, padx=4)
+    refresh_btn = tk.Button(ctrl_frame, text="刷新", width=8)
+    refresh_btn.pack(side=tk.LEFT, padx=12)
+    hint_var = tk.StringVar()
+    tk.Label(ctrl_frame, textvariable=hint_var, font=("微软雅黑", 10), fg="#555").pack(side=tk.LEFT, padx=8)
+
+    notebook = ttk.Notebook(win)
+    notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=6)
+
+    # 列表页
+    list_frame = tk.Frame(notebook)
+    notebook.add(list_frame, text="共现列表")
+    columns = ("标签A", "标签B", "共现题数", "占A比例", "占B比例", "相似度")
+    pair_table = ttk.Treeview(list_frame, columns=columns, show="headings")
+    for col, width in zip(columns, (300, 300, 90, 90, 90, 90)):
+        pair_table.heading(col, text=col)
+        pair_table.column(col, width=width, anchor="w" if col.startswith("标签") else "center")
+    scroll = ttk.Scrollbar(list_frame, orient="vertical", command=pair_table.yview)
+    pair_table.configure(yscrollcommand=scroll.set)
+    pair_table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scroll.pack(side=tk.LEFT, fill=tk.Y)
+
+    # 热力图页
+    heat_frame = tk.Frame(notebook)
+    notebook.add(heat_frame, text="热力图")
+    heat_canvas = tk.Canvas(heat_frame, bg="white")
+    heat_x = ttk.Scrollbar(heat_frame, orient="horizontal", command=heat_canvas.xview)
+    heat_y = ttk.Scrollbar(heat_frame, orient="vertical", command=heat_canvas.yview)
+    heat_canvas.configure(xscrollcommand=heat_x.set, yscrollcommand=heat_y.set)
+    heat_y.pack(side=tk.RIGHT, fill=tk.Y)
+    heat_x.pack(side=tk.BOTTOM, fill=tk.X)
+    heat_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    state = {"rows": [], "sort_col": "共现题数", "sort_desc": True}
+
+    def build_rows():
+        mtype = type_var.get()
+        try:
+            min_count = max(1, int(min_var.get()))
+        except (tk.TclError, ValueError):
+            min_count = 1
+        def type_ok(tag_id):
+            if mtype == "全部":
+                return True
+            t = tag_map.get(tag_id)
+            m = module_map.get(t[2]) if t else None
+            return bool(m) and m[2] == mtype
+        rows = []
+        for tag_a, tag_b, count, count_a, count_b in load_tag_pairs():
+            if count < min_count or not (type_ok(tag_a) or type_ok(tag_b)):
+                continue
+            ratio_a = count / count_a if count_a else 0
+            ratio_b = count / count_b if count_b else 0
+            union = count_a + count_b - count
+            jaccard = count / union if union > 0 else 0
+            rows.append((tag_a, tag_b, count, ratio_a, ratio_b, jaccard))
+        return rows
+
+    def fill_table():
+        index = columns.index(state["sort_col"])
+        if index < 2:
+            key = lambda r: tag_title(r[index])
+        else:
+            key = lambda r: r[index]
+        rows = sorted(state["rows"], key=key, reverse=state["sort_desc"])
+        pair_table.delete(*pair_table.get_children())
+        for tag_a, tag_b, count, ratio_a, ratio_b, jaccard in rows:
+            pair_table.insert('', 'end', values=(tag_title(tag_a), tag_title(tag_b), count,
+                                                 f"{ratio_a:.0%}", f"{ratio_b:.0%}", f"{jaccard:.2f}"))
+        for col in columns:
+            arrow = (" ▼" if state["sort_desc"] else " ▲") if col == state["sort_col"] else ""
+            pair_table.heading(col, text=col + arrow, command=lambda c=col: sort_by(c))
+
+    def sort_by(col):
+        if state["sort_col"] == col:
+            state["sort_desc"] = not state["sort_desc"]
+        else:
+            state["sort_col"] = col
+            state["sort_desc"] = col not in ("标签A", "标签B")
+        fill_table()
+
+    def draw_heatmap():
+        heat_canvas.delete("all")
+        # 取共现总数最多的前 N 个标签
+        totals = {}
+        for tag_a, tag_b, count, *_ in state["rows"]:
+            totals[tag_a] = totals.get(tag_a, 0) + count
+            totals[tag_b] = totals.get(tag_b, 0) + count
+        try:
+            top_n = max(2, int(top_var.get()))
+        except (tk.TclError, ValueError):
+            top_n = 30
+        top_tags = sorted(totals, key=lambda t: (-totals[t], t))[:top_n]
+        if not top_tags:
+            heat_canvas.create_text(20, 20, text="暂无共现数据", anchor="nw", font=("微软雅黑", 10))
+            return
+        pos = {tag_id: i for i, tag_id in enumerate(top_tags)}
+        matrix = {}
+        for tag_a, tag_b, count, *_ in state["rows"]:
+            if tag_a in pos and tag_b in pos:
+                matrix[(pos[tag_a], pos[tag_b])] = count
+                matrix[(pos[tag_b], pos[tag_a])] = count
+        max_count = max(matrix.values()) if matrix else 1
+        cell = 22
+        left, top = 220, 160
+        for i, tag_id in enumerate(top_tags):
+            name = tag_title(tag_id)
+            heat_canvas.create_text(left - 6, top + i * cell + cell / 2, text=name, anchor="e", font=("微软雅黑", 9))
+            heat_canvas.create_text(left + i * cell + cell / 2, top - 6, text=name, anchor="w", angle=90, font=("微软雅黑", 9))
+        for i in range(len(top_tags)):
+            for j in range(len(top_tags)):
+                count = matrix.get((i, j), 0)
+                fill = "#e8e8e8" if i == j else heat_color(count / max_count if count else 0)
+                x0, y0 = left + j * cell, top + i * cell
+                rect = heat_canvas.create_rectangle(x0, y0, x0 + cell, y0 + cell, fill=fill, outline="#dddddd")
+                if i != j:
+                    heat_canvas.tag_bind(rect, "<Enter>", lambda e, a=top_tags[i], b=top_tags[j], n=count:
+                                         hint_var.set(f"{tag_title(a)} × {tag_title(b)}：{n} 题"))
+        heat_canvas.configure(scrollregion=heat_canvas.bbox("all"))
+
+    def refresh():
+        state["rows"] = build_rows()
+        hint_var.set(f"共 {len(state['rows'])} 对标签")
+        fill_table()
+        draw_heatmap()
+
+    refresh_btn.config(command=refresh)
+    type_cb.bind("<<ComboboxSelected>>", lambda e: refresh())
+    refresh()
+
 def item_query():
     tags = load_tags()
     modules = load_modules()
@@ -124,6 +281,10 @@ def item_query():
     query_btn = tk.Button(select_frame, text="查询", width=12, font=("微软雅黑", 10))
     query_btn.grid(row=0, column=6, padx=8, sticky="w")
 
+    matrix_btn = tk.Button(select_frame, text="标签共现矩阵", width=12, font=("微软雅黑", 10),
+                           command=lambda: show_tag_cooccurrence(root, load_tags(), load_modules()))
+    matrix_btn.grid(row=0, column=7, padx=8, sticky="w")
+
     # 联动逻辑
     def on_module_type_change(event=None):
         mtype = module_type_var.get()
@@ -191,6 +352,9 @@ def item_query():
     img_frame = ImageFrame(root, width=600, height=1000)
     img_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=False)
 
+    # 最近一次查询的标签分布
+    current_dist = {"tag_id": None, "dist": None}
+
     # 查询逻辑
     def do_query():
         mtype = module_type_var.get()
@@ -204,7 +368,17 @@ def item_query():
         if not tag_id:
             messagebox.showwarning("警告", "请选择标签")
             return
-        only_one, two_tags, three_tags, two_tag_group = query_tag_distribution(tag_id)
+        show_distribution(tag_id)
+
+    def show_distribution(tag_id):
+        dist = query_tag_distribution(tag_id)
+        # 缓存本次结果，分布表格选中时直接复用
+        current_dist["tag_id"] = tag_id
+        current_dist["dist"] = dist
+        only_one = len(dist["only_one"])
+        two_tags = sum(len(ids) for ids in dist["two_tag_group"].values())
+        three_tags = len(dist["three_tags"])
+        two_tag_group = dist["two_tag_group"]
         # 统计结果文案
         stat_text.config(text=f"1个标签：{only_one}    2个标签：{two_tags}    3个标签：{three_tags}")
         # 分布表格填充
@@ -227,31 +401,55 @@ def item_query():
         for _, _, mtype, mname, tname, count, other_tag_id in group_rows:
             table.insert('', 'end', values=(mtype, mname, tname, count), tags=(other_tag_id,))
         # 新增一行：3个及以上标签
-        db_path = get_db_path()
-        more_ids = []
-        if db_path:
-            try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT item_id FROM item_tag_relations WHERE tag_id=?", (tag_id,))
-                for row in cursor.fetchall():
-                    cursor.execute("SELECT COUNT(*) FROM item_tag_relations WHERE item_id=?", (row[0],))
-                    cnt = cursor.fetchone()[0]
-                    if cnt >= 3:
-                        more_ids.append(row[0])
-                conn.close()
-            except Exception:
-                pass
-        table.insert('', 'end', values=("-", "-", "3个及以上标签", len(more_ids)), tags=("more_tags",))
+        table.insert('', 'end', values=("-", "-", "3个及以上标签", len(dist["more_tags"])), tags=("more_tags",))
         # 清空题目清单
         for i in id_table.get_children():
             id_table.delete(i)
-        img_frame.img_label.config(image='', text='此处为图片粘贴区域')
-        img_frame.img_label.image = None
-        img_frame.img_label._original_image = None
-        img_frame.img_size_var.set("尺寸: -")
+        img_frame.clear_image()
     query_btn.config(command=do_query)
 
+    # 其他窗口修改了模块/标签/题目时同步：下拉框保留当前选择；
+    # 变化的题目涉及当前查询的标签时重新统计分布，并恢复分布表格的选中行
+    def reload_choices():
+        tags[:] = load_tags()
+        modules[:] = load_modules()
+        module_type_cb['values'] = list(sorted(set(m[2] for m in modules)))
+        mtype = module_type_var.get()
+        if mtype:
+            module_cb['values'] = [m[1] for m in modules if m[2] == mtype]
+        mname = module_names_var.get()
+        if mname:
+            tag_cb['values'] = [t[1] for t in tags if any(m[0] == t[2] and m[1] == mname for m in modules)]
+
+    def distribution_affected(item_ids):
+        tag_id = current_dist["tag_id"]
+        if tag_id is None:
+            return False
+        if item_ids is None:
+            return True
+        dist = current_dist["dist"]
+        shown = set(dist["only_one"]) | set(dist["three_tags"]) | set(dist["more_tags"])
+        for ids in dist["two_tag_group"].values():
+            shown.update(ids)
+        for item_id in item_ids:
+            data = catalog.get_item(item_id)
+            if item_id in shown or (data and tag_id in data["tags"]):
+                return True
+        return False
+
+    def on_catalog_changed(changes):
+        if catalog.MODULES in changes or catalog.TAGS in changes:
+            reload_choices()
+        if catalog.ITEMS in changes and distribution_affected(changes[catalog.ITEMS]):
+            selected = [table.item(row, 'tags')[0] for row in table.selection()]
+            show_distribution(current_dist["tag_id"])
+            for row in table.get_children():
+                if table.item(row, 'tags')[0] in selected:
+                    table.selection_set(row)
+                    break
+
+    catalog.subscribe_widget(root, on_catalog_changed)
+
     # 分布表格选中事件，展示对应题目ID
     def on_table_select(event):
         sel = table.selection()
@@ -260,48 +458,13 @@ def item_query():
                 id_table.delete(i)
             return
         tag_key = table.item(sel[0], 'tags')[0]
-        mtype = module_type_var.get()
-        mname = module_names_var.get()
-        tname = tag_names_var.get()
-        tag_id = None
-        for t in tags:
-            if t[1] == tname:
-                tag_id = t[0]
-                break
-        only_one, two_tags, three_tags, two_tag_group = query_tag_distribution(tag_id)
-        item_ids = []
-        if tag_key == "only_one":
-            db_path = get_db_path()
-            if db_path:
-                try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT item_id FROM item_tag_relations WHERE tag_id=?", (tag_id,))
-                    for row in cursor.fetchall():
-                        cursor.execute("SELECT COUNT(*) FROM item_tag_relations WHERE item_id=?", (row[0],))
-                        cnt = cursor.fetchone()[0]
-                        if cnt == 1:
-                            item_ids.append(row[0])
-                    conn.close()
-                except Exception:
-                    pass
-        elif tag_key == "more_tags":
-            db_path = get_db_path()
-            if db_path:
-                try:
-                    conn = sqlite3.connect(db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT item_id FROM item_tag_relations WHERE tag_id=?", (tag_id,))
-                    for row in cursor.fetchall():
-                        cursor.execute("SELECT COUNT(*) FROM item_tag_relations WHERE item_id=?", (row[0],))
-                        cnt = cursor.fetchone()[0]
-                        if cnt >= 3:
-                            item_ids.append(row[0])
-                    conn.close()
-                except Exception:
-                    pass
+        dist = current_dist.get("dist")
+        if dist is None:
+            return
+        if tag_key in ("only_one", "more_tags"):
+            item_ids = dist[tag_key]
         else:
-            item_ids = two_tag_group.get(tag_key, [])
+            item_ids = dist["two_tag_group"].get(tag_key, [])
         for i in id_table.get_children():
             id_table.delete(i)
         for iid in item_ids:
@@ -317,17 +480,16 @@ def item_query():
                 widget.destroy()
             return
         item_id = id_table.item(sel[0], 'values')[0]
-        preview_image(item_id, show_popup=False)
+        neighbours = [id_table.item(row, 'values')[0] for row in treeview_neighbours(id_table, sel[0])]
+        preview_image(item_id, show_popup=False, prefetch_ids=neighbours)
         # 查询该题目标记的所有标签
-        db_path = get_db_path()
+        conn = db.get_conn()
         tag_rows = []
-        if db_path:
+        if conn is not None:
             try:
-                conn = sqlite3.connect(db_path)
                 cursor = conn.cursor()
                 cursor.execute("SELECT t.tag_id, t.tag_name, m.module_type, m.module_name FROM item_tag_relations r LEFT JOIN tags t ON r.tag_id = t.tag_id LEFT JOIN modules m ON t.module_id = m.module_id WHERE r.item_id=?", (item_id,))
                 tag_rows = cursor.fetchall()
-                conn.close()
             except Exception:
                 tag_rows = []
         # 在右侧标签展示区一行一个展示
@@ -370,49 +532,26 @@ def item_query():
     id_table.bind("<Button-3>", on_id_right)
 
     # 图片预览复用，show_popup参数控制是否弹窗
-    def preview_image(item_id, show_popup=True):
-        settings = config.load_settings()
-        data_path = settings.get("data_path", "")
-        img_dir = os.path.join(data_path, "item_img_path") if data_path else ""
-        if not img_dir:
+    def preview_image(item_id, show_popup=True, prefetch_ids=()):
+        if not images.get_img_dir():
             return
-        exts = [".png", ".jpg", ".jpeg", ".gif", ".bmp"]
-        img_path = None
-        for ext in exts:
-            candidate = os.path.join(img_dir, f"{item_id}{ext}")
-            if os.path.isfile(candidate):
-                img_path = candidate
-                break
-        if img_path:
+        if not show_popup:
+            # 选中行预览在后台读取，切换选中行时旧请求自动作废
+            img_frame.show_item_preview(item_id, prefetch_ids=prefetch_ids)
+            return
+        try:
+            # 列表预览只解码缩略图，原图在弹窗时再加载
+            preview = images.load_preview(item_id)
+        except Exception:
+            return
+        if preview:
             try:
-                from PIL import Image, ImageTk
-                img = Image.open(img_path)
-                max_w, max_h = 560, 800
-                w, h = img.size
-                scale = min(max_w/w, max_h/h, 1)
-                try:
-                    if scale < 1:
-                        resample = Image.Resampling.LANCZOS
-                        img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                    else:
-                        img_disp = img
-                except AttributeError:
-                    resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                    img_disp = img.resize((int(w*scale), int(h*scale)), resample)
-                tk_img = ImageTk.PhotoImage(img_disp)
-                img_frame.img_label.config(image=tk_img, text="")
-                img_frame.img_label.image = tk_img
-                img_frame.img_label._original_image = img.copy()
-                img_frame.img_size_var.set(f"尺寸: {img.size[0]}x{img.size[1]}")
-                if show_popup:
-                    img_frame.show_image_popup()
+                img_frame.show_preview(*preview)
+                img_frame.show_image_popup()
             except Exception:
                 pass
         else:
-            img_frame.img_label.config(image='', text='此处为图片粘贴区域')
-            img_frame.img_label.image = None
-            img_frame.img_label._original_image = None
-            img_frame.img_size_var.set("尺寸: -")
+            img_frame.clear_image()
 
 if __name__ == "__main__":
     item_query()
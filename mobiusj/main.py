@@ -5,12 +5,11 @@ import tkinter as tk
 from tkinter import ttk  # 新增
 import sys
 import os
-import json
-import base64
-import threading
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tkinter import font
 import feature1
+import import_queue
+import import_server
+import import_review
 import feature2
 import feature3
 import feature4
@@ -23,83 +22,6 @@ import config  # 显式导入 config，确保打包工具识别
 _import_server = None
 _import_token = None
 
-def _build_import_handler(main_root, expected_token):
-    class ImportHandler(BaseHTTPRequestHandler):
-        def _send_json(self, status_code, payload):
-            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-            self.send_response(status_code)
-            self.send_header("Content-Type", "application/json; charset=utf-8")
-            self.send_header("Content-Length", str(len(body)))
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(body)
-
-        def _send_cors_headers(self):
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
-            self.send_header("Access-Control-Allow-Headers", "Content-Type")
-
-        def do_OPTIONS(self):
-            self.send_response(204)
-            self._send_cors_headers()
-            self.end_headers()
-
-        def do_POST(self):
-            if self.path != "/import":
-                self._send_json(404, {"ok": False, "message": "Not Found"})
-                return
-
-            try:
-                content_length = int(self.headers.get("Content-Length", "0"))
-                raw_body = self.rfile.read(content_length)
-                data = json.loads(raw_body.decode("utf-8"))
-            except Exception:
-                self._send_json(400, {"ok": False, "message": "Invalid JSON"})
-                return
-
-            token = data.get("token")
-            if expected_token and token != expected_token:
-                self._send_json(403, {"ok": False, "message": "Invalid token"})
-                return
-
-            question_id = (data.get("id") or "").strip()
-            image_base64 = data.get("imageBase64") or ""
-            if not question_id or not image_base64:
-                self._send_json(400, {"ok": False, "message": "Missing id or image"})
-                return
-
-            if image_base64.startswith("data:"):
-                try:
-                    image_base64 = image_base64.split(",", 1)[1]
-                except Exception:
-                    self._send_json(400, {"ok": False, "message": "Invalid image data"})
-                    return
-
-            try:
-                image_bytes = base64.b64decode(image_base64)
-            except Exception:
-                self._send_json(400, {"ok": False, "message": "Invalid base64"})
-                return
-
-            def _import_on_ui_thread():
-                try:
-                    feature1.import_question_from_external(question_id, image_bytes)
-                except Exception:
-                    pass
-
-            try:
-                main_root.after(0, _import_on_ui_thread)
-            except Exception:
-                self._send_json(500, {"ok": False, "message": "Client not ready"})
-                return
-
-            self._send_json(200, {"ok": True, "message": "Imported"})
-
-        def log_message(self, format, *args):
-            return
-
-    return ImportHandler
-
 def start_import_server(main_root):
     global _import_server, _import_token
     if _import_server is not None:
@@ -107,17 +29,15 @@ def start_import_server(main_root):
 
     token = config.get_or_create_token()
     _import_token = token
-    handler_cls = _build_import_handler(main_root, token)
+    server = import_server.ImportServer(token)
     try:
-        server = ThreadingHTTPServer(("127.0.0.1", 27777), handler_cls)
+        server.start()
     except Exception as e:
         print(f"导入服务启动失败: {e}")
         return None
 
-    thread = threading.Thread(target=server.serve_forever, daemon=True)
-    thread.start()
     _import_server = server
-    print("导入服务已启动: http://127.0.0.1:27777/import")
+    print(f"导入服务已启动: {server.url}/import（批量: /import/batch）")
     return server
 def on_item_query():
     item_query.item_query()
@@ -164,6 +84,7 @@ except Exception as e:
     print(f"无法加载窗口图标: {e}")
 
 feature1.set_main_root(root)
+import_queue.start(root)
 start_import_server(root)
 
 # 创建顶部框架用于LOGO和标题
@@ -287,6 +208,9 @@ button4 = ttk.Button(frame, text="设置", command=on_feature4, style="TButton")
 button4.grid(row=1, column=1, padx=10, pady=10, ipadx=button_width, ipady=button_height, columnspan=4, sticky="w")
 create_hover_effect(button4)
 
+# 外部导入在后台入库，有待审阅的题目时显示提示按钮
+import_notice = import_review.attach_notice(frame, row=1, column=5, padx=10, pady=10, ipadx=button_width, ipady=button_height, sticky="e")
+
 # 底部 token 展示与复制
 token_frame = tk.Frame(root)
 token_frame.pack(side=tk.BOTTOM, pady=(0, 10))
@@ -0,0 +1,310 @@
+# migrations.py
+# 数据库结构迁移：以 PRAGMA user_version 记录已应用的版本，打开数据库时就地升级
+import sqlite3
+
+# 迁移列表：(版本号, 说明, 依赖的表, SQL脚本)，版本号只增不改
+MIGRATIONS = [
+    (1, "标签题量计数表及维护触发器", ("tags", "item_tag_relations"), """
+        CREATE TABLE IF NOT EXISTS tag_item_counts (
+            tag_id TEXT PRIMARY KEY,
+            item_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_insert
+        AFTER INSERT ON item_tag_relations
+        BEGIN
+            INSERT INTO tag_item_counts (tag_id, item_count) VALUES (NEW.tag_id, 1)
+            ON CONFLICT(tag_id) DO UPDATE SET item_count = item_count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_delete
+        AFTER DELETE ON item_tag_relations
+        BEGIN
+            UPDATE tag_item_counts SET item_count = item_count - 1 WHERE tag_id = OLD.tag_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_update
+        AFTER UPDATE OF tag_id ON item_tag_relations
+        WHEN OLD.tag_id IS NOT NEW.tag_id
+        BEGIN
+            UPDATE tag_item_counts SET item_count = item_count - 1 WHERE tag_id = OLD.tag_id;
+            INSERT INTO tag_item_counts (tag_id, item_count) VALUES (NEW.tag_id, 1)
+            ON CONFLICT(tag_id) DO UPDATE SET item_count = item_count + 1;
+        END;
+        INSERT OR REPLACE INTO tag_item_counts (tag_id, item_count)
+        SELECT tag_id, COUNT(*) FROM item_tag_relations GROUP BY tag_id;
+    """),
+    (2, "常用查询的二级索引与覆盖索引", (
+        "modules", "tags", "items", "item_tag_relations", "student_item_relations",
+        "groups", "group_examples", "group_exercises", "TF_tag_relations",
+    ), """
+        -- 按标签查题目（标签筛选、标签题量、删除标签）
+        CREATE INDEX IF NOT EXISTS idx_item_tag_relations_tag ON item_tag_relations (tag_id, item_id);
+        -- 按题目查学生标记
+        CREATE INDEX IF NOT EXISTS idx_student_item_relations_item ON student_item_relations (item_id);
+        -- 题簇下的题组、题组中的例题/练习反查
+        CREATE INDEX IF NOT EXISTS idx_groups_cluster ON groups (cluster_id, group_level);
+        CREATE INDEX IF NOT EXISTS idx_group_examples_item ON group_examples (item_id);
+        CREATE INDEX IF NOT EXISTS idx_group_exercises_item ON group_exercises (item_id);
+        -- 判断题反查标签
+        CREATE INDEX IF NOT EXISTS idx_TF_tag_relations_question ON TF_tag_relations (TF_question_id);
+        -- 题目管理列表：items -> item_tag_relations -> tags -> modules，
+        -- tags/modules 的连接列与输出列都放进索引，连接时不再回表
+        CREATE INDEX IF NOT EXISTS idx_tags_listing ON tags (tag_id, module_id, tag_name);
+        CREATE INDEX IF NOT EXISTS idx_modules_listing ON modules (module_id, module_type, module_name);
+        CREATE INDEX IF NOT EXISTS idx_tags_module ON tags (module_id);
+        CREATE INDEX IF NOT EXISTS idx_items_level ON items (item_level);
+        -- 收集统计信息，否则查询规划器会优先选主键索引而不是覆盖索引
+        ANALYZE;
+    """),
+    (3, "标签共现计数表及维护触发器", ("item_tag_relations",), """
+        -- 每对标签（tag_a < tag_b）同时标记的题目数量
+        CREATE TABLE IF NOT EXISTS tag_pair_counts (
+            tag_a TEXT NOT NULL,
+            tag_b TEXT NOT NULL,
+            pair_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tag_a, tag_b)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_tag_pair_counts_b ON tag_pair_counts (tag_b, tag_a);
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_pair_insert
+        AFTER INSERT ON item_tag_relations
+        BEGIN
+            INSERT INTO tag_pair_counts (tag_a, tag_b, pair_count)
+            SELECT min(NEW.tag_id, o.tag_id), max(NEW.tag_id, o.tag_id), 1
+            FROM item_tag_relations o
+            WHERE o.item_id = NEW.item_id AND o.rowid <> NEW.rowid
+            ON CONFLICT(tag_a, tag_b) DO UPDATE SET pair_count = pair_count + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_pair_delete
+        AFTER DELETE ON item_tag_relations
+        BEGIN
+            UPDATE tag_pair_counts SET pair_count = pair_count - 1
+            WHERE (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id
+            );
+            DELETE FROM tag_pair_counts WHERE pair_count <= 0;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_tag_relations_pair_update
+        AFTER UPDATE OF item_id, tag_id ON item_tag_relations
+        WHEN OLD.item_id IS NOT NEW.item_id OR OLD.tag_id IS NOT NEW.tag_id
+        BEGIN
+            UPDATE tag_pair_counts SET pair_count = pair_count - 1
+            WHERE (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id AND o.rowid <> NEW.rowid
+            );
+            DELETE FROM tag_pair_counts WHERE pair_count <= 0;
+            INSERT INTO tag_pair_counts (tag_a, tag_b, pair_count)
+            SELECT min(NEW.tag_id, o.tag_id), max(NEW.tag_id, o.tag_id), 1
+            FROM item_tag_relations o
+            WHERE o.item_id = NEW.item_id AND o.rowid <> NEW.rowid
+            ON CONFLICT(tag_a, tag_b) DO UPDATE SET pair_count = pair_count + 1;
+        END;
+        INSERT OR REPLACE INTO tag_pair_counts (tag_a, tag_b, pair_count)
+        SELECT a.tag_id, b.tag_id, COUNT(*)
+        FROM item_tag_relations a
+        JOIN item_tag_relations b ON a.item_id = b.item_id AND a.tag_id < b.tag_id
+        GROUP BY a.tag_id, b.tag_id;
+    """),
+    (4, "按内容哈希存储的题目图片及感知哈希分段索引", (), """
+        -- 题目ID -> 图片内容（编码后字节的 SHA-256），相同内容只存一份
+        CREATE TABLE IF NOT EXISTS item_images (
+            item_id TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            file_ext TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            phash INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_item_images_hash ON item_images (content_hash);
+        -- 64 位感知哈希拆成 8 段，每段 8 位；汉明距离不超过 7 的两张图至少有一段完全相同，
+        -- 查近似重复时只需比对共享某一段的候选，而不是逐一两两比较
+        CREATE TABLE IF NOT EXISTS image_phash_bands (
+            band INTEGER NOT NULL,
+            band_value INTEGER NOT NULL,
+            item_id TEXT NOT NULL,
+            PRIMARY KEY (band, band_value, item_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_image_phash_bands_item ON image_phash_bands (item_id);
+        CREATE TRIGGER IF NOT EXISTS trg_item_images_insert
+        AFTER INSERT ON item_images
+        WHEN NEW.phash IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO image_phash_bands (band, band_value, item_id)
+            SELECT b.band, (NEW.phash >> (8 * b.band)) & 255, NEW.item_id
+            FROM (SELECT 0 AS band UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3
+                  UNION ALL SELECT 4 UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7) b;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_images_delete
+        AFTER DELETE ON item_images
+        BEGIN
+            DELETE FROM image_phash_bands WHERE item_id = OLD.item_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_item_images_update
+        AFTER UPDATE OF item_id, phash ON item_images
+        BEGIN
+            DELETE FROM image_phash_bands WHERE item_id = OLD.item_id;
+            INSERT OR IGNORE INTO image_phash_bands (band, band_value, item_id)
+            SELECT b.band, (NEW.phash >> (8 * b.band)) & 255, NEW.item_id
+            FROM (SELECT 0 AS band UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3
+                  UNION ALL SELECT 4 UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7) b
+            WHERE NEW.phash IS NOT NULL;
+        END;
+    """),
+    (5, "图片打包存储的偏移索引", ("item_images",), """
+        -- 内容哈希 -> 打包文件中的位置（pack_file 为相对 item_img_store 的路径）
+        CREATE TABLE IF NOT EXISTS image_packs (
+            content_hash TEXT PRIMARY KEY,
+            pack_file TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """),
+    (6, "外部导入队列", ("items",), """
+        -- 导入服务收到的题目：queued 待后台处理，pending 图片已保存待审阅，failed 处理失败，reviewed 已审阅
+        -- spool_file 为 import_spool 下暂存原始图片的文件名，处理成功后清空
+        CREATE TABLE IF NOT EXISTS import_queue (
+            queue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'pending', 'failed', 'reviewed')),
+            spool_file TEXT,
+            received_at TEXT NOT NULL,
+            processed_at TEXT,
+            similar TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_import_queue_status ON import_queue(status, queue_id);
+    """),
+    (7, "导入图片的来源哈希", ("item_images", "import_queue"), """
+        -- source_hash 为导入时收到的原始图片字节的 SHA-256，重复推送同一题目同一图片时直接返回“未变化”；
+        -- 在程序中重新保存图片时清空
+        ALTER TABLE item_images ADD COLUMN source_hash TEXT;
+        ALTER TABLE import_queue ADD COLUMN source_hash TEXT;
+        CREATE INDEX IF NOT EXISTS idx_import_queue_item ON import_queue(item_id, status, queue_id);
+    """),
+    (8, "散文件存储的导入来源哈希", (), """
+        -- 关闭内容存储时图片保存为散文件，没有 item_images 记录；
+        -- 在这里记录导入时的来源哈希及写入后文件的 mtime/大小，文件被其他方式改写后标记随之失效
+        CREATE TABLE IF NOT EXISTS image_sources (
+            item_id TEXT PRIMARY KEY,
+            source_hash TEXT NOT NULL,
+            image_stamp TEXT NOT NULL
+        );
+    """),
+    (9, "标签共现触发器只清理本次减到 0 的标签对", ("tag_pair_counts",), """
+        -- 版本 3 的触发器每次删除关联后都执行 DELETE ... WHERE pair_count <= 0，扫描整张计数表；
+        -- 改为只在本次递减过的 (tag_a, tag_b) 上按主键检查
+        DROP TRIGGER IF EXISTS trg_item_tag_relations_pair_delete;
+        DROP TRIGGER IF EXISTS trg_item_tag_relations_pair_update;
+        CREATE TRIGGER trg_item_tag_relations_pair_delete
+        AFTER DELETE ON item_tag_relations
+        BEGIN
+            UPDATE tag_pair_counts SET pair_count = pair_count - 1
+            WHERE (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id
+            );
+            DELETE FROM tag_pair_counts
+            WHERE pair_count <= 0 AND (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id
+            );
+        END;
+        CREATE TRIGGER trg_item_tag_relations_pair_update
+        AFTER UPDATE OF item_id, tag_id ON item_tag_relations
+        WHEN OLD.item_id IS NOT NEW.item_id OR OLD.tag_id IS NOT NEW.tag_id
+        BEGIN
+            UPDATE tag_pair_counts SET pair_count = pair_count - 1
+            WHERE (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id AND o.rowid <> NEW.rowid
+            );
+            DELETE FROM tag_pair_counts
+            WHERE pair_count <= 0 AND (tag_a, tag_b) IN (
+                SELECT min(OLD.tag_id, o.tag_id), max(OLD.tag_id, o.tag_id)
+                FROM item_tag_relations o
+                WHERE o.item_id = OLD.item_id AND o.rowid <> NEW.rowid
+            );
+            INSERT INTO tag_pair_counts (tag_a, tag_b, pair_count)
+            SELECT min(NEW.tag_id, o.tag_id), max(NEW.tag_id, o.tag_id), 1
+            FROM item_tag_relations o
+            WHERE o.item_id = NEW.item_id AND o.rowid <> NEW.rowid
+            ON CONFLICT(tag_a, tag_b) DO UPDATE SET pair_count = pair_count + 1;
+        END;
+        DELETE FROM tag_pair_counts WHERE pair_count <= 0;
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _existing_tables(conn):
+    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return set(row[0] for row in cursor.fetchall())
+
+def _split_script(script):
+    # 按完整语句切分脚本（触发器体内的分号不会被拆开），以便在同一事务中逐条执行
+    statements = []
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        if line.strip().startswith("--"):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ""
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+def migrate(conn):
+    """
+    将数据库升级到最新版本，返回升级后的版本号。
+    某个迁移依赖的表尚不存在时（空库或缺表），停在该版本，待补全表后下次打开再继续。
+    """
+    version = get_version(conn)
+    if version >= LATEST_VERSION:
+        return version
+    tables = _existing_tables(conn)
+    for target, desc, required, script in MIGRATIONS:
+        if target <= version:
+            continue
+        if not set(required) <= tables:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 其他连接可能已抢先完成该迁移
+            if get_version(conn) >= target:
+                conn.execute("COMMIT")
+                version = target
+                continue
+            for statement in _split_script(script):
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        print(f"[迁移] 数据库已升级到版本 {target}：{desc}")
+        version = target
+        # 后续迁移可能依赖本次新建的表
+        tables = _existing_tables(conn)
+    return version
+
+if __name__ == "__main__":
+    # 命令行手动升级：python migrations.py [数据库文件路径]
+    import sys
+    import db
+    if len(sys.argv) > 1:
+        conn = sqlite3.connect(sys.argv[1], isolation_level=None)
+    else:
+        conn = db.get_conn(show_error=False)
+        if conn is None:
+            sys.exit("数据库不可用，请先在设置中配置数据路径")
+    print(f"当前版本: {get_version(conn)}，升级后版本: {migrate(conn)}")
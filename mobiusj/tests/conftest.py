@@ -0,0 +1,30 @@
+# 测试公共夹具：每个测试使用临时目录中的 settings.json 和新建的空数据库
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import db
+import feature4
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """临时数据路径（含已升级到最新版本的空数据库），返回数据路径。"""
+    monkeypatch.setattr(config, "APP_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "SETTINGS_FILE", str(tmp_path / "settings.json"))
+    monkeypatch.setattr(config, "_settings_cache", None)
+    monkeypatch.setattr(config, "_settings_stamp", None)
+    data = tmp_path / "data"
+    data.mkdir()
+    feature4.create_empty_db(str(data / db.DB_FILENAME))
+    config.save_settings({"data_path": str(data)})
+    db.reset()
+    yield data
+    db.reset()
+
+@pytest.fixture
+def conn(data_dir):
+    return db.get_conn(show_error=False)
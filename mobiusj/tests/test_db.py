@@ -0,0 +1,55 @@
+import threading
+
+import config
+import db
+
+def _journal_mode(conn):
+    return conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+def _hold_connection_in_thread():
+    """在另一个线程中打开连接后保持空闲，模拟后台线程缓存的连接。"""
+    opened = threading.Event()
+    stop = threading.Event()
+
+    def run():
+        db.get_conn(show_error=False).execute("SELECT 1").fetchall()
+        opened.set()
+        stop.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert opened.wait(5)
+    return stop, thread
+
+def test_default_profile_is_network_safe(conn):
+    assert config.DEFAULT_DB_PROFILE == "network"
+    assert _journal_mode(conn) == "delete"
+
+def test_profile_switch_closes_other_threads_connections(data_dir):
+    config.set_db_profile("local")
+    db.reset()
+    assert _journal_mode(db.get_conn(show_error=False)) == "wal"
+    stop, thread = _hold_connection_in_thread()
+    try:
+        # 离开 WAL 需要独占数据库：其他线程空闲的连接也必须先关闭
+        config.set_db_profile("network")
+        db.reset()
+        conn = db.get_conn(show_error=False)
+        assert db.pragma_failures() == []
+        assert _journal_mode(conn) == "delete"
+    finally:
+        stop.set()
+        thread.join(5)
+
+def test_journal_mode_failure_is_reported(data_dir):
+    config.set_db_profile("local")
+    db.reset()
+    conn = db.get_conn(show_error=False)
+    assert _journal_mode(conn) == "wal"
+    # 另一个连接仍打开时切不出 WAL，SQLite 只返回原模式而不报错
+    other = db.sqlite3.connect(str(data_dir / db.DB_FILENAME))
+    try:
+        failures = db.apply_pragmas(other, {"journal_mode": "DELETE"})
+    finally:
+        other.close()
+    assert len(failures) == 1 and failures[0].startswith("journal_mode=DELETE")
@@ -0,0 +1,42 @@
+import hashlib
+import os
+
+import image_pack
+import image_store
+import images
+
+def test_view_reader_reads_into_buffer():
+    reader = image_pack.ViewReader(memoryview(b"0123456789"))
+    buffer = bytearray(4)
+    assert reader.readinto(buffer) == 4 and buffer == b"0123"
+    reader.seek(8)
+    assert reader.readinto(buffer) == 2 and buffer[:2] == b"89"
+    assert reader.readinto(buffer) == 0
+    reader.seek(2)
+    assert reader.read(3) == b"234" and reader.tell() == 5
+
+def test_pack_existing_removes_each_store_blob(data_dir, conn):
+    img_dir = images.get_img_dir(str(data_dir))
+    store_dir = images.get_store_dir(str(data_dir))
+    storage = {"content_store": True, "packed": False}
+    blobs = {}
+    for item_id, data in (("Q1", b"\x89PNG one"), ("Q2", b"\x89PNG two")):
+        blobs[item_id] = image_store.store_encoded(item_id, ".png", data, (1, 1), 0, img_dir, storage)
+        assert os.path.isfile(blobs[item_id])
+    # 没有题目引用的内容文件也一并清理
+    orphan = images.store_path(hashlib.sha256(b"orphan").hexdigest(), ".png", store_dir)
+    image_store._atomic_write(orphan, b"orphan")
+
+    assert image_pack.pack_existing(str(data_dir), progress=lambda msg: None) == (2, 3)
+    assert sorted(os.listdir(store_dir)) == [image_pack.PACK_DIR_NAME]
+    images.refresh_index()
+    for item_id, data in (("Q1", b"\x89PNG one"), ("Q2", b"\x89PNG two")):
+        ref = images.find_image(item_id)
+        assert isinstance(ref, image_pack.PackedRef)
+        assert bytes(image_pack.read_view(ref)) == data
+
+def test_pack_existing_keep_files(data_dir, conn):
+    img_dir = images.get_img_dir(str(data_dir))
+    blob = image_store.store_encoded("Q1", ".png", b"\x89PNG keep", (1, 1), 0, img_dir, {"content_store": True})
+    assert image_pack.pack_existing(str(data_dir), keep_files=True, progress=lambda msg: None) == (1, 0)
+    assert os.path.isfile(blob)
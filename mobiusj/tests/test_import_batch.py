@@ -0,0 +1,87 @@
+import struct
+
+import pytest
+
+import import_batch
+
+BOUNDARY = "----mobius"
+
+def _record(question_id, data, image_len=None):
+    encoded = question_id.encode("utf-8")
+    if image_len is None:
+        image_len = len(data)
+    return struct.pack(">H", len(encoded)) + encoded + struct.pack(">I", image_len) + data
+
+def _part(name, body, filename=None):
+    disposition = f'form-data; name="{name}"'
+    if filename:
+        disposition += f'; filename="{filename}"'
+    return (f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n").encode() + body + b"\r\n"
+
+def _multipart(*parts):
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+def _items(items):
+    return [(question_id, bytes(data)) for question_id, data in items]
+
+def test_parse_stream_records():
+    buf = _record("Q1", b"\x89PNG-1") + _record("题目-2", b"") + _record("Q3", b"abc")
+    assert _items(import_batch.parse_stream(buf)) == [("Q1", b"\x89PNG-1"), ("题目-2", b""), ("Q3", b"abc")]
+
+def test_parse_stream_returns_views_into_the_buffer():
+    buf = bytearray(_record("Q1", b"abc"))
+    (_, view), = import_batch.parse_stream(buf)
+    buf[-1:] = b"z"
+    assert bytes(view) == b"abz"
+
+@pytest.mark.parametrize("buf, message", [
+    (b"\x00", "ID长度不完整"),
+    (struct.pack(">H", 10) + b"Q1", "ID不完整"),
+    (_record("Q1", b"abc")[:-1], "图片数据不完整"),
+])
+def test_parse_stream_rejects_truncated_records(buf, message):
+    with pytest.raises(ValueError, match=message):
+        import_batch.parse_stream(buf)
+
+def test_parse_stream_rejects_oversized_image_length():
+    # 声明的图片长度超过请求体剩余部分
+    buf = _record("Q1", b"abc", image_len=1 << 30) + _record("Q2", b"def")
+    with pytest.raises(ValueError, match="Q1"):
+        import_batch.parse_stream(buf)
+
+def test_parse_multipart_pairs_ids_with_images():
+    body = _multipart(
+        _part("token", b"secret"),
+        _part("id", b"Q1"),
+        _part("image", b"img-1", filename="ignored.png"),
+        _part("image", b"img-2", filename="Q2.png"),
+    )
+    token, items = import_batch.parse_multipart(body, BOUNDARY.encode())
+    assert token == "secret"
+    # 第二张图片前没有 id 字段，使用文件名
+    assert _items(items) == [("Q1", b"img-1"), ("Q2", b"img-2")]
+
+def test_parse_multipart_image_without_id_or_filename():
+    body = _multipart(_part("image", b"img"))
+    token, items = import_batch.parse_multipart(body, BOUNDARY.encode())
+    assert token is None
+    assert _items(items) == [("", b"img")]
+
+def test_parse_multipart_id_without_image():
+    body = _multipart(_part("id", b"Q1"))
+    assert import_batch.parse_multipart(body, BOUNDARY.encode()) == (None, [])
+
+def test_parse_multipart_rejects_missing_end_boundary():
+    body = _part("id", b"Q1")
+    with pytest.raises(ValueError):
+        import_batch.parse_multipart(body, BOUNDARY.encode())
+
+def test_parse_batch_dispatches_on_content_type():
+    assert _items(import_batch.parse_batch(_record("Q1", b"a"), "application/x-mobius-import")[1]) == [("Q1", b"a")]
+    body = _multipart(_part("id", b"Q1"), _part("image", b"a"))
+    token, items = import_batch.parse_batch(body, f'multipart/form-data; boundary="{BOUNDARY}"')
+    assert _items(items) == [("Q1", b"a")]
+    with pytest.raises(ValueError, match="boundary"):
+        import_batch.parse_batch(body, "multipart/form-data")
+    with pytest.raises(ValueError, match="Content-Type"):
+        import_batch.parse_batch(body, "application/json")
@@ -0,0 +1,133 @@
+import io
+import os
+
+import pytest
+
+import import_queue
+
+Image = pytest.importorskip("PIL.Image")
+
+@pytest.fixture(autouse=True)
+def queue_depth(conn):
+    # 队列深度计数是进程内状态，按本测试的数据库重新统计
+    import_queue._recount_depth(conn)
+
+def _png(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+def _status(conn, queue_id):
+    return conn.execute("SELECT status, spool_file, error FROM import_queue WHERE queue_id=?", (queue_id,)).fetchone()
+
+def _spool_files(data_dir):
+    spool_dir = data_dir / import_queue.SPOOL_DIR_NAME
+    return sorted(os.listdir(spool_dir)) if spool_dir.exists() else []
+
+def _drain():
+    while import_queue.process_next():
+        pass
+
+def test_enqueue_then_process(data_dir, conn):
+    good = import_queue.enqueue("Q1", memoryview(_png((200, 0, 0))))
+    bad = import_queue.enqueue("Q2", b"not an image")
+    assert import_queue.counts() == {import_queue.QUEUED: 2, import_queue.PENDING: 0, import_queue.FAILED: 0}
+    assert len(_spool_files(data_dir)) == 2
+
+    _drain()
+    assert import_queue.depth() == 0
+    assert _status(conn, good)[:2] == (import_queue.PENDING, None)
+    status, spool_file, error = _status(conn, bad)
+    assert status == import_queue.FAILED and error
+    # 失败条目保留暂存图片以便重试
+    assert _spool_files(data_dir) == [spool_file]
+    # 成功条目建立待审阅的题目记录（难度待审阅时录入）
+    assert conn.execute("SELECT item_id, item_level FROM items").fetchall() == [("Q1", None)]
+    assert [e["item_id"] for e in import_queue.list_entries()] == ["Q1", "Q2"]
+
+def test_retry_requeues_only_failed_entries(data_dir, conn):
+    good = import_queue.enqueue("Q1", _png((0, 200, 0)))
+    bad = import_queue.enqueue("Q2", b"broken")
+    _drain()
+
+    import_queue.retry([good, bad])
+    assert _status(conn, good)[0] == import_queue.PENDING
+    status, _, error = _status(conn, bad)
+    assert (status, error) == (import_queue.QUEUED, None)
+    assert import_queue.depth() == 1
+
+    _drain()
+    assert _status(conn, bad)[0] == import_queue.FAILED
+
+def test_mark_reviewed_clears_spool_but_skips_queued(data_dir, conn):
+    good = import_queue.enqueue("Q1", _png((0, 0, 200)))
+    bad = import_queue.enqueue("Q2", b"broken")
+    _drain()
+    waiting = import_queue.enqueue("Q3", _png((9, 9, 9)))
+
+    import_queue.mark_reviewed([good, bad, waiting])
+    assert _status(conn, good)[0] == import_queue.REVIEWED
+    assert _status(conn, bad)[:2] == (import_queue.REVIEWED, None)
+    assert _status(conn, waiting)[0] == import_queue.QUEUED
+    assert _spool_files(data_dir) == [_status(conn, waiting)[1]]
+    assert [e["item_id"] for e in import_queue.list_entries()] == ["Q3"]
+
+def test_check_duplicate_by_source_hash(data_dir):
+    first, second = _png((1, 2, 3)), _png((4, 5, 6))
+    digest = import_queue.source_hash(first)
+    assert import_queue.check_duplicate("Q1", digest) == (import_queue.NEW, None)
+
+    result, queue_id = import_queue.submit("Q1", first, digest)
+    assert result == import_queue.NEW
+    assert import_queue.submit("Q1", first, digest) == (import_queue.DUPLICATE, queue_id)
+
+    _drain()
+    assert import_queue.check_duplicate("Q1", digest) == (import_queue.UNCHANGED, None)
+    assert import_queue.check_duplicate("Q1", import_queue.source_hash(second)) == (import_queue.UPDATED, None)
+
+def test_submit_respects_max_depth(data_dir):
+    data = _png((7, 7, 7))
+    import_queue.submit("Q1", data, import_queue.source_hash(data), max_depth=1)
+    other = _png((8, 8, 8))
+    assert import_queue.submit("Q2", other, import_queue.source_hash(other), max_depth=1) == (import_queue.FULL, None)
+
+def test_submit_does_not_hold_lock_while_spooling(data_dir, monkeypatch):
+    import threading
+    release = threading.Event()
+    writing = threading.Event()
+    atomic_write = import_queue.image_store._atomic_write
+
+    def slow_write(path, data):
+        if bytes(data) == first:
+            writing.set()
+            assert release.wait(5)
+        atomic_write(path, data)
+
+    monkeypatch.setattr(import_queue.image_store, "_atomic_write", slow_write)
+    first, second, third = _png((10, 0, 0)), _png((0, 10, 0)), _png((0, 0, 10))
+    digest = import_queue.source_hash(first)
+    results = []
+    worker = threading.Thread(target=lambda: results.append(import_queue.submit("Q1", first, digest, max_depth=2)))
+    worker.start()
+    assert writing.wait(5)
+    try:
+        # 第一条还在写暂存文件：相同推送直接判为重复，其他题目照常入队，预留的条目计入上限
+        assert import_queue.submit("Q1", first, digest) == (import_queue.DUPLICATE, None)
+        assert import_queue.submit("Q2", second, import_queue.source_hash(second), max_depth=2)[0] == import_queue.NEW
+        assert import_queue.submit("Q3", third, import_queue.source_hash(third), max_depth=2) == (import_queue.FULL, None)
+    finally:
+        release.set()
+        worker.join(5)
+    assert results[0][0] == import_queue.NEW
+    assert import_queue.submit("Q1", first, digest) == (import_queue.DUPLICATE, results[0][1])
+
+def test_end_to_end_latency_starts_at_received(data_dir, monkeypatch):
+    import time
+    import import_metrics
+    monkeypatch.setattr(import_metrics, "_end_to_end", import_metrics.Histogram(import_metrics.LATENCY_BUCKETS))
+    data = _png((5, 5, 5))
+    # 模拟请求头在 10 秒前到达：读请求体、解析等耗时都计入端到端耗时
+    import_queue.submit("Q1", data, import_queue.source_hash(data), received=time.monotonic() - 10)
+    _drain()
+    assert import_metrics._end_to_end.count == 1
+    assert import_metrics._end_to_end.sum >= 10
@@ -0,0 +1,72 @@
+import sqlite3
+
+import db
+import feature4
+import migrations
+
+def _seed(conn):
+    conn.execute("INSERT INTO modules (module_id, module_name, module_type) VALUES ('0001', '函数', '知识')")
+    conn.executemany("INSERT INTO tags (tag_id, module_id, tag_name) VALUES (?, '0001', ?)",
+                     [("00001", "单调性"), ("00002", "奇偶性"), ("00003", "周期性")])
+    conn.executemany("INSERT INTO items (item_id, item_level) VALUES (?, 1)", [("Q1",), ("Q2",)])
+
+def _tag_counts(conn):
+    return dict(conn.execute("SELECT tag_id, item_count FROM tag_item_counts WHERE item_count > 0"))
+
+def _pair_counts(conn):
+    return {(a, b): n for a, b, n in conn.execute("SELECT tag_a, tag_b, pair_count FROM tag_pair_counts")}
+
+def test_new_database_is_at_latest_version(conn):
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+
+def test_migration_stops_when_required_tables_are_missing(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "empty.sqlite3"), isolation_level=None)
+    # 迁移 1 依赖 tags 表，空库停在版本 0
+    assert migrations.migrate(conn) == 0
+    conn.close()
+
+def test_counter_triggers_follow_insert_update_delete(conn):
+    with db.transaction(conn):
+        _seed(conn)
+        conn.executemany("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)",
+                         [("Q1", "00001"), ("Q1", "00002"), ("Q2", "00001")])
+    assert _tag_counts(conn) == {"00001": 2, "00002": 1}
+    assert _pair_counts(conn) == {("00001", "00002"): 1}
+
+    with db.transaction(conn):
+        conn.execute("UPDATE item_tag_relations SET tag_id='00003' WHERE item_id='Q1' AND tag_id='00002'")
+    assert _tag_counts(conn) == {"00001": 2, "00003": 1}
+    assert _pair_counts(conn) == {("00001", "00003"): 1}
+
+    with db.transaction(conn):
+        conn.execute("DELETE FROM item_tag_relations WHERE item_id='Q1' AND tag_id='00001'")
+    assert _tag_counts(conn) == {"00001": 1, "00003": 1}
+    assert _pair_counts(conn) == {}
+
+def test_migrating_existing_data_backfills_counters(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.sqlite3")
+    # 只建原始表，模拟升级前的旧库
+    monkeypatch.setattr(feature4.migrations, "migrate", lambda conn: 0)
+    feature4.create_empty_db(path)
+    monkeypatch.undo()
+    conn = sqlite3.connect(path, isolation_level=None)
+    _seed(conn)
+    conn.executemany("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)",
+                     [("Q1", "00001"), ("Q1", "00002"), ("Q1", "00003"), ("Q2", "00002")])
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    assert _tag_counts(conn) == {"00001": 1, "00002": 2, "00003": 1}
+    assert _pair_counts(conn) == {("00001", "00002"): 1, ("00001", "00003"): 1, ("00002", "00003"): 1}
+    # 重复执行不再改动
+    assert migrations.migrate(conn) == migrations.LATEST_VERSION
+    conn.close()
+
+def test_pair_cleanup_only_touches_decremented_pairs(conn):
+    with db.transaction(conn):
+        _seed(conn)
+        conn.executemany("INSERT INTO item_tag_relations (item_id, tag_id) VALUES (?, ?)",
+                         [("Q1", "00001"), ("Q1", "00002"), ("Q2", "00001"), ("Q2", "00003")])
+        # 与本次删除无关的 0 计数行不会被顺带清理
+        conn.execute("UPDATE tag_pair_counts SET pair_count = 0 WHERE tag_a='00001' AND tag_b='00003'")
+    with db.transaction(conn):
+        conn.execute("DELETE FROM item_tag_relations WHERE item_id='Q1' AND tag_id='00002'")
+    assert _pair_counts(conn) == {("00001", "00003"): 0}
@@ -1,6 +1,29 @@
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import messagebox
 from PIL import Image, ImageTk, ImageGrab
+import image_cache
+import images
+
+# 预览弹窗：每次滚轮缩放的倍率、停止操作后高质量重绘的延迟（毫秒）、缓存的渲染结果数、
+# 可见区域外多渲染的边距（像素，拖动时在边距内只移动画布上的图片，不重新缩放）
+ZOOM_STEP = 1.15
+HQ_RENDER_DELAY = 150
+RENDER_CACHE_SIZE = 6
+RENDER_MARGIN = 256
+
+def treeview_neighbours(tree, row, count=images.PREFETCH_NEIGHBOURS):
+    """返回 row 前后各 count 行，按与 row 的距离由近到远排列（下一行优先）。"""
+    rows = []
+    after = before = row
+    for _ in range(count):
+        after = tree.next(after) if after else ""
+        before = tree.prev(before) if before else ""
+        if after:
+            rows.append(after)
+        if before:
+            rows.append(before)
+    return rows
 
 class ImageFrame(tk.Frame):
     """
@@ -28,8 +51,89 @@ class ImageFrame(tk.Frame):
         self.img_label = tk.Label(self, text="此处为图片粘贴区域", bg="#f0f0f0", width=70, height=35, relief=tk.RIDGE, anchor="n", justify="center")
         self.img_label.pack(expand=True, fill=tk.BOTH, padx=10, pady=(10,10))
         self.img_label._original_image = None
+        # 从题库加载的预览只持有缩略图，原图路径留待放大时再解码
+        self.img_label._original_path = None
+        # 后台预览请求的序号，只有最新一次请求的结果会被显示
+        self._preview_token = 0
+        self._preview_future = None
         self.img_label.bind("<Double-1>", self.show_image_popup)
 
+    def cancel_preview(self):
+        """作废尚未显示的后台预览请求。"""
+        self._preview_token += 1
+        if self._preview_future is not None:
+            self._preview_future.cancel()
+            self._preview_future = None
+
+    def show_item_preview(self, item_id, on_done=None, prefetch_ids=()):
+        """
+        在后台线程读取并缩放题目图片，完成后回到主线程显示。
+        连续切换选中行时，旧请求未开始的直接取消，已完成的结果被丢弃。
+        prefetch_ids 为接下来可能浏览的题目，在后台预读到内存缓存。
+        """
+        self.cancel_preview()
+        token = self._preview_token
+
+        def work():
+            if token != self._preview_token:
+                return
+            try:
+                result, error = images.load_preview(item_id), None
+            except Exception as e:
+                result, error = None, e
+            if token != self._preview_token:
+                return
+            try:
+                self.after(0, lambda: finish(result, error))
+            except (RuntimeError, tk.TclError):
+                pass  # 窗口已关闭
+
+        def finish(result, error):
+            if token != self._preview_token or not self.winfo_exists():
+                return
+            self._preview_future = None
+            if error is not None:
+                self.clear_image(f"图片加载失败\n{error}")
+            elif result:
+                self.show_preview(*result)
+            else:
+                self.clear_image()
+            if on_done:
+                on_done(result)
+
+        self._preview_future = images.submit(work)
+        if prefetch_ids:
+            images.prefetch(prefetch_ids)
+
+    def show_preview(self, thumb, source_path=None, source_size=None):
+        """显示题库图片的缩略图，原图在打开预览弹窗时才加载。"""
+        self.cancel_preview()
+        # PhotoImage 取自共享缓存，同一缩略图在各窗口间只创建一次
+        tk_img = image_cache.photo_for(thumb)
+        self.img_label.config(image=tk_img, text="")
+        self.img_label.image = tk_img
+        self.img_label._original_image = None
+        self.img_label._original_path = source_path
+        size = source_size or thumb.size
+        self.img_size_var.set(f"尺寸: {size[0]}x{size[1]}")
+
+    def clear_image(self, text="此处为图片粘贴区域"):
+        self.cancel_preview()
+        self.img_label.config(image="", text=text)
+        self.img_label.image = None
+        self.img_label._original_image = None
+        self.img_label._original_path = None
+        self.img_size_var.set("尺寸: -")
+
+    def get_original_image(self):
+        """返回原图：粘贴的图片直接返回，题库图片借用共享缓存中的解码结果。"""
+        if self.img_label._original_image is not None:
+            return self.img_label._original_image
+        path = getattr(self.img_label, '_original_path', None)
+        if not path:
+            return None
+        return images.load_original(path)
+
     def paste_image(self):
         try:
             image = ImageGrab.grabclipboard()
@@ -39,7 +143,10 @@ class ImageFrame(tk.Frame):
         if image is not None:
             try:
                 # 保留原图
-                self.img_label._original_image = image.copy()
+                self.cancel_preview()
+                # grabclipboard 每次返回新图片，无需再复制一份
+                self.img_label._original_image = image
+                self.img_label._original_path = None
                 # 适应显示区宽度（如600px），高度等比缩放
                 display_w = self.img_label.winfo_width() or 600
                 w, h = image.size
@@ -63,53 +170,140 @@ class ImageFrame(tk.Frame):
             messagebox.showinfo("提示", "剪贴板中没有图片或格式不支持")
 
     def show_image_popup(self, event=None):
-        if not hasattr(self.img_label, 'image') or self.img_label._original_image is None:
+        if not getattr(self.img_label, 'image', None):
+            return
+        try:
+            orig_img = self.get_original_image()
+        except Exception as e:
+            messagebox.showerror("错误", f"图片加载失败: {str(e)}")
+            return
+        if orig_img is None:
             return
         popup = tk.Toplevel(self)
         popup.title("图片预览")
         popup.geometry("1200x900")
         popup.resizable(True, True)
-        orig_img = self.img_label._original_image
         canvas = tk.Canvas(popup, bg="#222")
         canvas.pack(fill=tk.BOTH, expand=True)
         popup._tk_img = None
-        drag_data = {'x': 0, 'y': 0, 'img_x': 0, 'img_y': 0}
+        drag_data = {'x': 0, 'y': 0}
         canvas._img_id = None
         # 初始缩放比例设为 1.0，实际缩放在窗口显示后计算
         img_w, img_h = orig_img.size
         scale_var = [1.0]
         initial_scale_done = [False]
-        
-        def render_img(reset_position=False):
-            w, h = orig_img.size
+        # 缩放比例 = base_scale * ZOOM_STEP ** level，用整数级别保证缩回上一级时比例完全一致；
+        # cx/cy 为图片中心在画布上的位置，缩放时保持不变；drawn 为已渲染部分在画布上的范围
+        view = {'base_scale': 1.0, 'level': 0, 'cx': None, 'cy': None, 'drawn': None}
+        pyramid = {1: orig_img}      # 缩小倍数 -> 预先缩小的原图
+        rendered = OrderedDict()     # 最近几次高质量渲染结果
+        hq_job = [None]
+        try:
+            hq_resample = Image.Resampling.LANCZOS
+            fast_resample = Image.Resampling.NEAREST
+        except AttributeError:
+            hq_resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
+            fast_resample = Image.NEAREST
+
+        def image_origin():
             scale = scale_var[0]
-            new_w, new_h = int(w*scale), int(h*scale)
-            try:
-                try:
-                    resample = Image.Resampling.LANCZOS
-                except AttributeError:
-                    resample = getattr(Image, 'LANCZOS', Image.BICUBIC)
-                img = orig_img.resize((new_w, new_h), resample)
-            except Exception:
-                img = orig_img
-            tk_img = ImageTk.PhotoImage(img)
-            canvas.delete("all")
+            return view['cx'] - img_w * scale / 2, view['cy'] - img_h * scale / 2
+
+        def pyramid_source(scale):
+            # 缩小到一半以下时从预缩小的图上取像素，重采样要处理的像素量随之减少
+            factor = 1
+            while scale * factor * 2 <= 1 and min(img_w, img_h) >= factor * 2:
+                factor *= 2
+                if factor not in pyramid:
+                    prev = pyramid[factor // 2]
+                    if prev.mode not in ("RGB", "RGBA", "L", "LA"):
+                        prev = prev.convert("RGBA")
+                    pyramid[factor] = prev.resize((max(prev.size[0] // 2, 1), max(prev.size[1] // 2, 1)), hq_resample)
+            return pyramid[factor], factor
+
+        def visible_box():
+            """图片与画布可见区域的交集（画布坐标），无交集时返回 None。"""
+            scale = scale_var[0]
+            img_x, img_y = image_origin()
+            vx0, vy0 = max(int(img_x), 0), max(int(img_y), 0)
+            vx1 = min(int(img_x + img_w * scale), canvas.winfo_width())
+            vy1 = min(int(img_y + img_h * scale), canvas.winfo_height())
+            if vx1 <= vx0 or vy1 <= vy0:
+                return None
+            return vx0, vy0, vx1, vy1
+
+        def render_img(reset_position=False, hq=True):
+            """只渲染可见区域外加 RENDER_MARGIN 边距的部分；返回是否为高质量结果。"""
+            scale = scale_var[0]
+            new_w, new_h = int(img_w*scale), int(img_h*scale)
             c_w = canvas.winfo_width()
             c_h = canvas.winfo_height()
-            
             # 如果需要重置位置或第一次渲染，则居中显示
-            if reset_position or 'img_x' not in drag_data:
+            if reset_position or view['cx'] is None:
                 x = max((c_w - new_w) // 2, 0)
                 y = max((c_h - new_h) // 2, 0)
-                drag_data['img_x'] = x
-                drag_data['img_y'] = y
+                view['cx'] = x + new_w / 2
+                view['cy'] = y + new_h / 2
+            img_x, img_y = image_origin()
+            vx0 = max(int(img_x), -RENDER_MARGIN)
+            vy0 = max(int(img_y), -RENDER_MARGIN)
+            vx1 = min(int(img_x + new_w), c_w + RENDER_MARGIN)
+            vy1 = min(int(img_y + new_h), c_h + RENDER_MARGIN)
+            canvas.delete("all")
+            canvas._img_id = None
+            view['drawn'] = None
+            if visible_box() is None:
+                return True
+            key = (view['level'], round(view['cx']), round(view['cy']), c_w, c_h)
+            tk_img = rendered.get(key)
+            if tk_img is not None:
+                rendered.move_to_end(key)
+                hq = True
             else:
-                x = drag_data['img_x']
-                y = drag_data['img_y']
-            
-            canvas._img_id = canvas.create_image(x, y, anchor="nw", image=tk_img)
+                src, factor = pyramid_source(scale)
+                s = scale * factor
+                box = (
+                    max((vx0 - img_x) / s, 0), max((vy0 - img_y) / s, 0),
+                    min((vx1 - img_x) / s, src.size[0]), min((vy1 - img_y) / s, src.size[1]),
+                )
+                try:
+                    img = src.resize((vx1 - vx0, vy1 - vy0), hq_resample if hq else fast_resample, box=box)
+                except Exception:
+                    img = src
+                tk_img = ImageTk.PhotoImage(img)
+                if hq:
+                    rendered[key] = tk_img
+                    while len(rendered) > RENDER_CACHE_SIZE:
+                        rendered.popitem(last=False)
+            canvas._img_id = canvas.create_image(vx0, vy0, anchor="nw", image=tk_img)
             popup._tk_img = tk_img
-            popup._current_pil_img = img
+            view['drawn'] = (vx0, vy0, vx1, vy1)
+            return hq
+
+        def render_hq():
+            hq_job[0] = None
+            if popup.winfo_exists():
+                render_img()
+
+        def cancel_hq():
+            if hq_job[0] is not None:
+                popup.after_cancel(hq_job[0])
+                hq_job[0] = None
+
+        def render_interactive():
+            # 滚轮/拖动/改变窗口大小时先快速出图，停顿 HQ_RENDER_DELAY 毫秒后再高质量重绘
+            cancel_hq()
+            if not render_img(hq=False):
+                hq_job[0] = popup.after(HQ_RENDER_DELAY, render_hq)
+
+        def zoom(step):
+            level = view['level'] + step
+            scale = view['base_scale'] * ZOOM_STEP ** level
+            if not 0.1 <= scale <= 10.0:
+                return
+            view['level'] = level
+            scale_var[0] = scale
+            render_interactive()
         # 其余代码保持不变
         def close_on_double_click(event):
             popup.destroy()
@@ -152,8 +346,7 @@ class ImageFrame(tk.Frame):
             x_min, y_min = min(x0, x1), min(y0, y1)
             x_max, y_max = max(x0, x1), max(y0, y1)
             # 获取当前图片在画布上的位置和缩放
-            coords = canvas.coords(canvas._img_id)
-            img_x, img_y = int(coords[0]), int(coords[1])
+            img_x, img_y = image_origin()
             scale = scale_var[0]
             # 计算选区在原图上的像素坐标
             sel_left = int((x_min - img_x) / scale)
@@ -217,38 +410,20 @@ class ImageFrame(tk.Frame):
             delta = event.delta
             if abs(delta) < 10:
                 delta = delta * 120
-            
-            old_scale = scale_var[0]
-            if delta > 0:
-                scale_var[0] = min(scale_var[0]*1.15, 10.0)
-            else:
-                scale_var[0] = max(scale_var[0]/1.15, 0.1)
-            
             # 保持图片中心点位置不变
-            if canvas._img_id is not None:
-                coords = canvas.coords(canvas._img_id)
-                old_x, old_y = coords[0], coords[1]
-                old_w, old_h = int(img_w * old_scale), int(img_h * old_scale)
-                new_w, new_h = int(img_w * scale_var[0]), int(img_h * scale_var[0])
-                
-                # 计算图片中心点在画布上的位置，并保持不变
-                center_x = old_x + old_w / 2
-                center_y = old_y + old_h / 2
-                
-                drag_data['img_x'] = int(center_x - new_w / 2)
-                drag_data['img_y'] = int(center_y - new_h / 2)
-            
-            render_img()
+            zoom(1 if delta > 0 else -1)
         def on_resize(event):
             # 首次渲染时，计算初始缩放使图片宽度等于窗口宽度
             if not initial_scale_done[0]:
                 c_w = canvas.winfo_width()
                 if c_w > 1:  # 确保窗口已正确初始化
-                    scale_var[0] = c_w / img_w
+                    view['base_scale'] = c_w / img_w
+                    view['level'] = 0
+                    scale_var[0] = view['base_scale']
                     initial_scale_done[0] = True
                     render_img(reset_position=True)
                     return
-            render_img()
+            render_interactive()
         def on_press(event):
             drag_data['x'] = event.x
             drag_data['y'] = event.y
@@ -257,17 +432,34 @@ class ImageFrame(tk.Frame):
             dy = event.y - drag_data['y']
             drag_data['x'] = event.x
             drag_data['y'] = event.y
-            if canvas._img_id is not None:
-                coords = canvas.coords(canvas._img_id)
-                new_x = coords[0] + dx
-                new_y = coords[1] + dy
-                canvas.coords(canvas._img_id, new_x, new_y)
-                drag_data['img_x'] = new_x
-                drag_data['img_y'] = new_y
+            if view['cx'] is None:
+                return
+            view['cx'] += dx
+            view['cy'] += dy
+            drawn = view['drawn']
+            if canvas._img_id is None or drawn is None:
+                render_interactive()
+                return
+            # 已渲染部分仍覆盖可见区域时只平移画布上的图片，停顿或松开后再按新位置重绘
+            canvas.move(canvas._img_id, dx, dy)
+            drawn = (drawn[0] + dx, drawn[1] + dy, drawn[2] + dx, drawn[3] + dy)
+            view['drawn'] = drawn
+            visible = visible_box()
+            if visible is None or not (drawn[0] <= visible[0] and drawn[1] <= visible[1]
+                                       and drawn[2] >= visible[2] and drawn[3] >= visible[3]):
+                render_interactive()
+                return
+            cancel_hq()
+            hq_job[0] = popup.after(HQ_RENDER_DELAY, render_hq)
+        def on_release(event):
+            if hq_job[0] is not None:
+                cancel_hq()
+                render_img()
         canvas.bind("<Configure>", on_resize)
         canvas.bind_all("<MouseWheel>", on_mousewheel)
-        canvas.bind_all("<Button-4>", lambda e: (scale_var.__setitem__(0, min(scale_var[0]*1.15, 10.0)), render_img()))
-        canvas.bind_all("<Button-5>", lambda e: (scale_var.__setitem__(0, max(scale_var[0]/1.15, 0.1)), render_img()))
+        canvas.bind_all("<Button-4>", lambda e: zoom(1))
+        canvas.bind_all("<Button-5>", lambda e: zoom(-1))
         canvas.bind("<ButtonPress-1>", on_press)
         canvas.bind("<B1-Motion>", on_drag)
+        canvas.bind("<ButtonRelease-1>", on_release)
         render_img()